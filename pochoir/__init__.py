@@ -1,19 +1,17 @@
-
-from . import persist
-from . import examples
-from . import main
-from . import geom
-from . import gen
-from . import domain
-from . import units
-from . import util
-from . import lar
-from . import plots
-from . import drift
-from . import vtkexport
-from . import srdot
-from . import schema
+import importlib
 
 from .version import version
 
 __version__ = version
+
+
+# Submodules (eg pochoir.plots needing matplotlib or pochoir.vtkexport
+# needing pyevtk) are imported when first used so a command pays only
+# for what it uses.
+def __getattr__(name):
+    try:
+        return importlib.import_module('.' + name, __name__)
+    except ModuleNotFoundError as err:
+        if err.name != f'{__name__}.{name}':
+            raise
+        raise AttributeError(f'module {__name__} has no attribute {name}') from None
@@ -58,10 +58,18 @@ Additional metadata may be stored such as:
 
 import sys
 import json
+import logging
 import click
 import pochoir
 # no others than click and pochoir!
 
+class Echo(logging.Handler):
+    '''
+    Echo the messages logged by pochoir to stderr.
+    '''
+    def emit(self, record):
+        click.echo(self.format(record), err=True)
+
 @click.group()
 @click.option("-s","--store",type=click.Path(),
               envvar="POCHOIR_STORE",
@@ -76,6 +84,11 @@ def cli(ctx, store, outstore):
     if not store:
         store = "."
     ctx.obj = pochoir.main.Main(store, outstore)
+    ctx.call_on_close(ctx.obj.close)
+    log = logging.getLogger("pochoir")
+    log.setLevel(logging.INFO)
+    if not any(isinstance(one, Echo) for one in log.handlers):
+        log.addHandler(Echo())
 
 @cli.command()
 def version():
@@ -113,10 +126,14 @@ def gencfg(ctx, multi, output, filename):
               help="The spatial location of zero index grid point (def=0's)")
 @click.option("-S","--spacing", default=None, type=str,
               help="The grid spacing as scalar or vector (def=1's)")
+@click.option("-a","--graded-axis", default=None, type=int,
+              help="The axis given explicit coordinates (def=none)")
+@click.option("-c","--coords", default=None, type=str,
+              help="The increasing coordinates of grid points along the graded axis")
 @click.option("-D", "--domain", type=str,
               help="Generated domain name") 
 @click.pass_context
-def domain(ctx, shape, origin, spacing, domain):
+def domain(ctx, shape, origin, spacing, graded_axis, coords, domain):
     '''
     Produce a "domain" and store it to the named dataset.
 
@@ -135,6 +152,11 @@ def domain(ctx, shape, origin, spacing, domain):
           spacing between neighboring grid points.  This may use
           spatial units.
 
+        - coords :: with graded-axis, a vector of increasing
+          coordinates of the grid points along that axis, eg fine
+          near electrodes and coarse in the bulk.  This replaces the
+          origin and spacing along that axis.
+
     A vector is given as a comma-separated list of numbers.
 
     Spatial units are applied by multiplying a unit symbol such as
@@ -165,7 +187,14 @@ def domain(ctx, shape, origin, spacing, domain):
     else:
         origin = pochoir.arrays.zeros(ndim)
 
-    dom = pochoir.domain.Domain(shape, spacing, origin)
+    if coords is None and graded_axis is None:
+        dom = pochoir.domain.Domain(shape, spacing, origin)
+    elif coords is None or graded_axis is None:
+        click.echo('a graded domain needs both --graded-axis and --coords')
+        sys.exit(-1)
+    else:
+        dom = pochoir.domain.GradedDomain(shape, spacing, origin, graded_axis,
+                                          pochoir.arrays.fromstr1(coords))
     ctx.obj.put_domain(domain, dom)
 
 
@@ -277,7 +306,7 @@ def init(ctx, initial, boundary, ambient, domain, filenames):
 @click.option("-b","--boundary", type=str,
               help="Input the boundary array")
 @click.option("-e","--edges", type=str,
-              help="Comma separated list of 'fixed' or 'periodic' giving domain edge conditions")
+              help="Comma separated list of 'fixed', 'periodic' or 'mirror' giving domain edge conditions")
 @click.option("--precision", type=float, default=0.0,
               help="Finish when no changes larger than precision")
 @click.option("--epoch", type=int, default=1000,
@@ -285,32 +314,123 @@ def init(ctx, initial, boundary, ambient, domain, filenames):
 @click.option("-n", "--nepochs", type=int, default=1,
               help="Limit number of epochs (def: one epoch)")
 @click.option("--engine",
-              type=click.Choice(["numpy", "numba", "torch", "cupy", "cumba"]),
+              type=click.Choice(["auto", "numpy", "numpy-mp", "numpy-threads", "memmap", "numba",
+                                 "torch", "torch-conv",
+                                 "cupy", "cumba",
+                                 "numba-fused", "numba-tiled", "numba-blocked",
+                                 "multigrid", "sor",
+                                 "krylov", "spectral"]),
               default="numpy",
-              help="The FDM engine to use")
+              help="The FDM engine to use, 'auto' for the fastest calibrated on this host")
+@click.option("--cycle", type=click.Choice(["V", "W", "FMG"]), default=None,
+              help="Multigrid cycle type (multigrid engine, def: V)")
+@click.option("--omega", type=float, default=None,
+              help="Fixed over-relaxation factor (sor engine, def: automatic)")
+@click.option("--precond", type=click.Choice(["amg", "ilu", "jacobi", "none"]),
+              default=None,
+              help="Preconditioner (krylov engine, def: amg)")
+@click.option("--accelerate", type=click.Choice(["chebyshev"]), default=None,
+              help="Accelerate Jacobi steps (numpy, numpy-threads and numba engines)")
+@click.option("--threads", type=int, default=None,
+              help="Number of threads (numpy-threads, numba-fused, numba-blocked and torch-conv engines, def: all cores)")
+@click.option("--tile", type=int, default=None,
+              help="Number of cells along a tile side (numba-tiled and numba-blocked engines, def: 32)")
+@click.option("--tile-fraction", type=float, default=None,
+              help="Fraction of precision below which a tile is skipped (numba-tiled engine, def: 0.1)")
+@click.option("--time-block", type=int, default=None,
+              help="Number of steps per tile or pass before it is written back (numba-blocked and memmap engines, def: 4)")
+@click.option("--max-memory", type=str, default=None,
+              help="Bound on memory holding planes, eg 4G (memmap engine)")
+@click.option("--scratch", type=click.Path(file_okay=False), default=None,
+              help="Directory of scratch files (memmap engine, def: system temporary)")
+@click.option("--dtype", type=click.Choice(["float32", "float64", "mixed"]),
+              default=None,
+              help="Precision of the solve (def: that of initial array)")
+@click.option("--procs", type=int, default=None,
+              help="Number of processes (numpy-mp engine, def: all cores)")
+@click.option("--refine", type=int, default=None,
+              help="Refine patches around electrodes by this ratio")
+@click.option("--refine-margin", type=int, default=2,
+              help="Number of cells around electrode surfaces in a patch (def: 2)")
+@click.option("--warm-start", type=str, default=None,
+              help="Input potential on a coarser domain to start from")
+@click.option("--checkpoint", type=str, default=None,
+              help="Output array holding a checkpoint of the potential")
+@click.option("--checkpoint-every", type=int, default=1,
+              help="Number of epochs between checkpoints (def: 1)")
+@click.option("--resume", is_flag=True, default=False,
+              help="Restart from the checkpoint if it exists")
 @click.option("-P", "--potential", type=str,
               help="Output array holding solution for potential")
 @click.option("-I", "--increment", type=str,
               help="Output array holding increment (error) on the solution")
+@click.option("--criterion",
+              type=click.Choice(["increment", "residual", "relative"]),
+              default=None,
+              help="Value compared to precision at each epoch (def: increment)")
+@click.option("-H", "--history", type=str, default=None,
+              help="Output array holding per-epoch convergence history")
+@click.option("--telemetry", type=click.File("w"), default=None,
+              help="Output file of JSON lines with a record per epoch ('-' for stdout)")
+@click.option("--quiet", is_flag=True, default=False,
+              help="Log only warnings of the engine, not its progress")
 @click.pass_context
 def fdm(ctx, initial, boundary,
-        edges, precision, epoch, nepochs, engine,
-        potential, increment):
+        edges, precision, epoch, nepochs, engine, cycle, omega, precond,
+        dtype, accelerate, threads, tile, tile_fraction, time_block,
+        max_memory, scratch, procs,
+        refine, refine_margin, warm_start,
+        checkpoint, checkpoint_every, resume,
+        potential, increment, criterion, history, telemetry, quiet):
     '''
     Apply finite-difference method.
 
     Solve Laplace equation given initial/boundary value arrays to
-    produce a scalar potential array.
+    produce a scalar potential array.  The --engine selects the solver
+    (auto for the fastest installed one) and its progress goes to
+    stderr.  See "FDM engines and options" in manual.org for the
+    engines and the options they support.
     '''
+    import numpy
     import pochoir.fdm
-    try:
-        solve = getattr(pochoir.fdm, f'solve_{engine}')
-    except AttributeError as err:
-        click.echo(f'no fdm solver engine {engine}')
-        click.echo(err)
-        sys.exit(-1)
-
-    iarr, imd = ctx.obj.get(initial, True)
+    import pochoir.fdm_generic
+    if quiet:
+        logging.getLogger("pochoir").setLevel(logging.WARNING)
+    initials = initial.split(",")
+    batch = len(initials) > 1
+
+    # engine specific options
+    kwds = dict()
+    if cycle:
+        kwds["cycle_type"] = cycle
+    if omega:
+        kwds["omega"] = omega
+    if precond:
+        kwds["precond"] = precond
+    if accelerate:
+        kwds["accelerate"] = accelerate
+    if threads:
+        kwds["threads"] = threads
+    if tile:
+        kwds["tile"] = tile
+    if tile_fraction is not None:
+        kwds["fraction"] = tile_fraction
+    if time_block:
+        kwds["time_block"] = time_block
+    if max_memory:
+        import pochoir.fdm_memmap
+        kwds["max_memory"] = pochoir.fdm_memmap.parse_size(max_memory)
+    if scratch:
+        kwds["workdir"] = scratch
+    if procs:
+        kwds["procs"] = procs
+
+    specific = list(kwds)
+
+    if batch:
+        iarr = numpy.stack([numpy.array(ctx.obj.get(one)) for one in initials])
+    else:
+        iarr, imd = ctx.obj.get(initial, True)
     barr, bmd = ctx.obj.get(boundary, True)
     if not "domain" in bmd:
         click.echo(f'failed to get domain for {boundary}')
@@ -319,18 +439,242 @@ def fdm(ctx, initial, boundary,
     domain = bmd['domain']
 
     bool_edges = [e.startswith("per") for e in edges.split(",")]
-    if len(bool_edges) != iarr.ndim:
+    if len(bool_edges) != barr.ndim:
         raise ValueError("the number of periodic condition do not match problem dimensions")
+    # features of the problem which not all engines support, see
+    # pochoir.fdm.unsupported
+    features = list()
+    mirror = [e == "mirror" for e in edges.split(",")]
+    if any(mirror):
+        kwds["mirror"] = mirror
+        features.append("mirror")
+
+    # unequal or graded spacing weights the neighbors along each dimension
+    dom = ctx.obj.get_domain(domain)
+    gaps = dom.gaps
+    if pochoir.fdm_generic.is_graded(gaps):
+        if any([per and numpy.ndim(gap) for per, gap in zip(bool_edges, gaps)]):
+            click.echo('a graded axis must have fixed edges')
+            sys.exit(-1)
+        kwds["spacing"] = [numpy.asarray(gap).tolist() for gap in gaps]
+        features.append("graded")
+    elif numpy.any(dom.spacing != dom.spacing[0]):
+        kwds["spacing"] = dom.spacing.tolist()
+
+    if engine == "auto":
+        import pochoir.calibrate
+        try:
+            engine = pochoir.calibrate.choose(
+                barr.shape, dtype or ("float32" if iarr.dtype == numpy.float32 else "float64"),
+                specific + features, "_batch" if batch else "", threads=threads)
+        except ValueError as err:
+            click.echo(f'no automatic fdm engine: {err}')
+            sys.exit(-1)
+        click.echo(f'fdm: automatic engine {engine}')
+    name = 'solve_' + engine.replace('-', '_')
+    if dtype == "mixed":
+        name += '_mixed'
+    if batch:
+        name += '_batch'
+    try:
+        solve = getattr(pochoir.fdm, name)
+    except AttributeError as err:
+        click.echo(f'no fdm solver engine {engine} for dtype {dtype}'
+                   + (' in batch' if batch else ''))
+        click.echo(err)
+        sys.exit(-1)
 
-    arr, err = solve(iarr, barr, bool_edges,
-                     precision, epoch, nepochs)
+    flags = dict(cycle_type="--cycle", fraction="--tile-fraction",
+                 workdir="--scratch")
+    for key in specific:
+        if engine not in pochoir.fdm.options[key]:
+            flag = flags.get(key, "--" + key.replace("_", "-"))
+            click.echo(f'option {flag} not supported by engine {engine}, only by: '
+                       + ", ".join(pochoir.fdm.options[key]))
+            sys.exit(-1)
+    described = dict(mirror="mirror edges", graded="graded spacing")
+    for feature in features:
+        if engine in pochoir.fdm.unsupported[feature]:
+            click.echo(f'{described[feature]} not supported by engine {engine}')
+            sys.exit(-1)
+    if accelerate and (dtype == "mixed" or batch):
+        click.echo(f'acceleration {accelerate} not supported with '
+                   + ('batch' if batch else 'dtype mixed'))
+        sys.exit(-1)
+
+    if engine == "memmap":
+        # arrays read whole, eg from an npz store, defeat the engine
+        for key, arr in ((initial, iarr), (boundary, barr)):
+            if type(arr) is numpy.ndarray:
+                click.echo(f'engine memmap needs arrays read by planes, eg from an HDF5 store, {key} is read whole')
+                sys.exit(-1)
+        if warm_start:
+            click.echo('warm start reads arrays whole, not supported by engine memmap')
+            sys.exit(-1)
+        if dtype:
+            kwds["dtype"] = dtype
+    else:
+        # eg, datasets of an HDF5 store are read whole
+        iarr = numpy.array(iarr, dtype=dtype if dtype in ("float32", "float64") else None)
+        barr = numpy.asarray(barr)
 
     params = dict(operation="fdm", domain=domain,
                   initial=initial, boundary=boundary,
                   edges=edges, epoch=epoch, nepochs=nepochs,
-                  precision=precision, command="fdm")
-    ctx.obj.put(potential, arr, taxon="potential", **params)
+                  precision=precision, command="fdm",
+                  engine=engine)
+    # the spacing and mirror edges are held by the domain and edges
+    params.update({key: kwds[key] for key in specific})
+    if dtype:
+        params["dtype"] = dtype
+
+    if batch:
+        potentials = potential.split(",")
+        increments = increment.split(",")
+        if len(potentials) != len(initials) or len(increments) != len(initials):
+            click.echo('batch needs as many potentials and increments as initials')
+            sys.exit(-1)
+        if warm_start or checkpoint or criterion or history or refine or telemetry:
+            click.echo('batch does not support warm start, checkpoint, convergence history, refine or telemetry')
+            sys.exit(-1)
+        arrs, errs = solve(iarr, barr, bool_edges,
+                           precision, epoch, nepochs, **kwds)
+        for one, pkey, ikey, arr, err in zip(initials, potentials, increments,
+                                             arrs, errs):
+            params["initial"] = one
+            ctx.obj.put(pkey, arr, taxon="potential", **params)
+            ctx.obj.put(ikey, err, taxon="increment", **params)
+        return
+
+    if warm_start:
+        warr, wmd = ctx.obj.get(warm_start, True)
+        if not "domain" in wmd:
+            click.echo(f'failed to get domain for {warm_start}')
+            click.echo(wmd)
+            sys.exit(-1)
+        wdom = ctx.obj.get_domain(wmd['domain'])
+        dom = ctx.obj.get_domain(domain)
+        guess = pochoir.arrays.resample(warr, wdom.linspaces, dom.linspaces)
+        iarr = numpy.where(barr, iarr, guess).astype(iarr.dtype)
+        params["warm_start"] = warm_start
+
+    convergence = None
+    if criterion or history:
+        convergence = pochoir.fdm_generic.Convergence(
+            numpy.asarray(iarr), numpy.asarray(barr), bool_edges,
+            criterion or "increment",
+            kwds.get("spacing"), kwds.get("mirror"))
+        kwds["convergence"] = convergence
+        params["criterion"] = criterion or "increment"
+
+    recorder = None
+    if telemetry:
+        # one slice at a time to keep the memory of out of core arrays
+        fixed = sum([int(numpy.count_nonzero(part)) for part in barr])
+        recorder = pochoir.fdm_generic.Telemetry(epoch, convergence, telemetry,
+                                                 mutable=barr.size - fixed)
+        kwds["convergence"] = recorder
+
+    def summary():
+        if recorder is None:
+            return dict()
+        return {f'telemetry_{key}': val for key, val in recorder.summary.items()}
+
+    if refine:
+        if checkpoint:
+            click.echo('refine does not support checkpoint')
+            sys.exit(-1)
+        if pochoir.fdm_generic.is_graded(gaps):
+            click.echo('refine does not support graded spacing')
+            sys.exit(-1)
+        import pochoir.patch
+        # the generator of the boundary gives the electrodes of patches
+        geometry = None
+        generator = bmd.get("generator")
+        if generator:
+            cfg = dict()
+            try:
+                for config in filter(None, str(bmd.get("config", "")).split(",")):
+                    cfg.update(json.loads(open(config,'rb').read().decode()))
+            except OSError as err:
+                click.echo(f'refine: electrodes of patches from coarse cells: {err}')
+            else:
+                fdom = pochoir.patch.refined_domain(dom, refine, bool_edges)
+                geometry = getattr(pochoir.gen, generator)(fdom, pochoir.util.unitify(cfg))
+        arr, err, patches = pochoir.patch.solve(
+            iarr, barr, bool_edges, precision, epoch, nepochs, solve,
+            ratio=refine, margin=refine_margin, geometry=geometry, **kwds)
+        params.update(refine=refine, refine_margin=refine_margin,
+                      refine_geometry=generator if geometry is not None else "nearest")
+        pkeys = list()
+        for ind, (patch, parr, perr) in enumerate(patches):
+            pkey = f'{potential}-patch{ind}'
+            pdomain = f'{pkey}-domain'
+            ctx.obj.put_domain(pdomain, patch.domain(dom))
+            ctx.obj.put(pkey, parr, taxon="potential",
+                        **dict(params, domain=pdomain))
+            pkeys.append(pkey)
+        ctx.obj.put(potential, arr, taxon="potential", patches=pkeys,
+                    **params, **summary())
+        ctx.obj.put(increment, err, taxon="increment", **params)
+        if history:
+            ctx.obj.put(history, convergence.array, taxon="history",
+                        columns=list(pochoir.fdm_generic.criteria), **params)
+        return
+
+    if not checkpoint:
+        arr, err = solve(iarr, barr, bool_edges,
+                         precision, epoch, nepochs, **kwds)
+        ctx.obj.put(potential, arr, taxon="potential", **params, **summary())
+        ctx.obj.put(increment, err, taxon="increment", **params)
+        if history:
+            ctx.obj.put(history, convergence.array, taxon="history",
+                        columns=list(pochoir.fdm_generic.criteria), **params)
+        return
+
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint-every must be at least one epoch")
+
+    # iarr is already read whole unless the memmap engine reads it by planes
+    done = 0
+    chunks = list()
+    arr = iarr
+    err = None
+    if resume:
+        carr, cmd = ctx.obj.get_checkpoint(checkpoint)
+        if carr is None:
+            click.echo(f'no checkpoint {checkpoint}, starting from {initial}')
+        else:
+            if carr.shape != arr.shape:
+                raise ValueError(f'checkpoint shape {carr.shape} does not match {arr.shape}')
+            arr = carr if engine == "memmap" else numpy.array(carr, dtype=arr.dtype)
+            done = int(cmd["epochs_done"])
+            chunks = [float(h) for h in cmd["history"]]
+            click.echo(f'resume from {checkpoint} after {done} epochs')
+
+    while done < nepochs:
+        if chunks and precision and chunks[-1] < precision:
+            break
+        nchunk = min(checkpoint_every, nepochs - done)
+        arr, err = solve(arr, barr, bool_edges,
+                         precision, epoch, nchunk, **kwds)
+        done += nchunk
+        if convergence:
+            chunks.append(convergence.history[-1][
+                pochoir.fdm_generic.criteria.index(params["criterion"])])
+        else:
+            chunks.append(max(float(err.max()), -float(err.min())))
+        ctx.obj.put_checkpoint(checkpoint, arr, taxon="checkpoint",
+                               epochs_done=done, history=chunks, **params)
+
+    if err is None:             # resumed after the last epoch
+        err = numpy.zeros(arr.shape, arr.dtype)
+
+    ctx.obj.put(potential, arr, taxon="potential", **params, **summary())
     ctx.obj.put(increment, err, taxon="increment", **params)
+    if history:
+        ctx.obj.put(history, convergence.array, taxon="history",
+                    columns=list(pochoir.fdm_generic.criteria), **params)
 
 
 
@@ -351,13 +695,27 @@ def velo(ctx, temperature, potential, velocity):
     domain = md['domain']
     dom = ctx.obj.get_domain(domain)
 
-    efield = pochoir.arrays.gradient(pot, *dom.spacing)
-    emag = pochoir.arrays.vmag(efield)
-    mu = pochoir.lar.mobility(emag, temp)
-    varr = [e*mu for e in efield]
+    def field(pot, dom):
+        efield = dom.gradient(pot)
+        emag = pochoir.arrays.vmag(efield)
+        mu = pochoir.lar.mobility(emag, temp)
+        return [e*mu for e in efield]
+
     params = dict(domain=domain, taxon="velocity", command="velo",
                   potential=potential, temperature=temp)
-    ctx.obj.put(velocity, varr, **params)
+
+    # refined patches of the potential give patches of the velocity
+    vkeys = list()
+    for ind, pkey in enumerate(md.get("patches", ())):
+        parr, pmd = ctx.obj.get(pkey, True)
+        vkey = f'{velocity}-patch{ind}'
+        ctx.obj.put(vkey, field(parr, ctx.obj.get_domain(pmd['domain'])),
+                    **dict(params, domain=pmd['domain'], potential=pkey))
+        vkeys.append(vkey)
+    if vkeys:
+        params["patches"] = vkeys
+
+    ctx.obj.put(velocity, field(pot, dom), **params)
 
 
 
@@ -374,12 +732,57 @@ def grad(ctx, scalar, gradient):
     pot, md = ctx.obj.get(scalar, True)
     domain = md['domain']
     dom = ctx.obj.get_domain(domain)
-    field = pochoir.arrays.gradient(pot, *dom.spacing)
+    field = dom.gradient(pot)
     ctx.obj.put(gradient, field, taxon="gradient",
                 domain=domain, scalar=scalar, command="grad")
 
 
     
+@cli.command()
+@click.option("-i", "--input", type=str,
+              help="Input array on a fraction of a symmetric domain")
+@click.option("-l", "--low", type=int, multiple=True,
+              help="Axis mirrored about its first grid points (repeat for more)")
+@click.option("-u", "--high", type=int, multiple=True,
+              help="Axis mirrored about its last grid points (repeat for more)")
+@click.option("-D", "--domain", type=str,
+              help="Output domain of the unfolded array")
+@click.option("-O", "--output", type=str,
+              help="Output unfolded array")
+@click.pass_context
+def unfold(ctx, input, low, high, domain, output):
+    '''
+    Unfold an array solved with mirror edges into the whole domain.
+
+    Along each given axis the array is extended by its mirror image
+    about the first (--low) or last (--high) grid points, which are
+    not repeated.  An axis of n points gives 2n-1.  A vector array
+    (eg, a velocity or gradient) has the component along the axis
+    negated in the image.
+    '''
+    arr, md = ctx.obj.get(input, True)
+    if not "domain" in md:
+        click.echo(f'failed to get domain for {input}')
+        sys.exit(-1)
+    dom = ctx.obj.get_domain(md['domain'])
+    ndim = len(dom.shape)
+    vector = arr.ndim == ndim + 1
+    for axis, at_high in [(a, False) for a in low] + [(a, True) for a in high]:
+        if not 0 <= axis < ndim:
+            click.echo(f'no axis {axis} in {ndim} dimensions')
+            sys.exit(-1)
+        if vector:
+            arr = [pochoir.arrays.unfold(comp, axis, at_high, -1 if ind == axis else 1)
+                   for ind, comp in enumerate(arr)]
+        else:
+            arr = pochoir.arrays.unfold(arr, axis, at_high)
+        dom = dom.unfold(axis, at_high)
+    ctx.obj.put_domain(domain, dom)
+    params = dict(taxon=md.get("taxon", "unfolded"), command="unfold",
+                  input=input, low=list(low), high=list(high), domain=domain)
+    ctx.obj.put(output, arr, **params)
+
+
 @cli.command()
 @click.option("-S","--starts", default=None, type=str,
               help="Output starts points array")
@@ -434,6 +837,8 @@ def drift(ctx, paths, starts, velocity, verbose, engine, steps):
     velo, md = ctx.obj.get(velocity, True)
     domain = md['domain']
     dom = ctx.obj.get_domain(domain)
+    if md.get("patches"):
+        velo = ctx.obj.get_interpolator(velocity)
 
     # shape: (nstarts, nticks, ndims)
     thepaths = pochoir.arrays.zeros((len(start_points), len(ticks),
@@ -606,7 +1011,7 @@ def induce(ctx, charge, weighting, paths, average,nstrips, output):
     npaths, nsteps, ndim = the_paths.shape
     ticks = pochoir.arrays.linspace(pmd['tstart'], pmd['tstop'],
                                     pmd['nsteps'], endpoint=False)
-    rgi = pochoir.arrays.rgi(dom.linspaces, wpot)
+    rgi = ctx.obj.get_interpolator(weighting)
     shift_x = dom.shape[0]*dom.spacing[0]/2.0
     shift_y = 0
     shifted_paths = []
@@ -736,7 +1141,7 @@ def srdot(ctx, weighting, paths, velocity, current):
     dom_Ew = ctx.obj.get_domain(pot_domain)
 
 
-    sol_Ew = pochoir.arrays.gradient(pot, dom_Ew.spacing)
+    sol_Ew = dom_Ew.gradient(pot)
     sol_Drift, pathmd = ctx.obj.get(paths, True)
     path_domain = pathmd['domain']
     dom_Drift = ctx.obj.get_domain(path_domain)
@@ -998,6 +1403,84 @@ def example(ctx, domain, initial, boundary, name):
     ctx.obj.put(boundary, barr)
     
 
+@cli.command()
+@click.option("-e", "--engines", default=None, type=str,
+              help="Comma separated list of FDM engines (def: all available)")
+@click.option("-d", "--drifts", default=None, type=str,
+              help="Comma separated list of drift engines (def: all available, 'none' for none)")
+@click.option("-p", "--problems", default="dipole,sandh,wires", type=str,
+              help="Comma separated list of problems (def: dipole,sandh,wires)")
+@click.option("--size2d", default="128,512", type=str,
+              help="Comma separated list of sizes of square 2D problems, empty for none")
+@click.option("--size3d", default="32,96", type=str,
+              help="Comma separated list of sizes of cubic 3D problems, empty for none")
+@click.option("--sweeps", default=100, type=int,
+              help="Number of timed iterations")
+@click.option("--precision", default=1e-3, type=float,
+              help="Relative residual to time the solution to, 0 to skip")
+@click.option("--epoch", default=20, type=int,
+              help="Number of iterations per precision check")
+@click.option("--nepochs", default=100, type=int,
+              help="Limit number of epochs to reach precision")
+@click.option("--timeout", default=600.0, type=float,
+              help="Seconds after which a case is abandoned")
+@click.option("-o", "--output", default=None,
+              type=click.Path(file_okay=True, dir_okay=False),
+              help="JSON file to receive the host description and results")
+@click.pass_context
+def bench(ctx, engines, drifts, problems, size2d, size3d, sweeps,
+          precision, epoch, nepochs, timeout, output):
+    '''
+    Benchmark engines on synthetic problems of several sizes.
+
+    Each FDM engine takes the number of sweeps on each problem at each
+    size and, unless precision is zero, iterates until the relative
+    residual is below precision.  Each drift engine drifts a few
+    points in the field of each problem.  The table gives the rate of
+    cell updates per second (FDM) or drift points per second (drift),
+    the speedup over the numpy engine, the seconds to reach precision
+    and the peak increase of memory.
+    '''
+    import pochoir.bench
+
+    def listof(text):
+        return [one.strip() for one in text.split(",") if one.strip()]
+
+    if engines:
+        engines = listof(engines)
+        known = pochoir.bench.fdm_engines()
+        for engine in engines:
+            if engine not in known:
+                click.echo(f'unknown FDM engine: {engine}, have: {",".join(known)}')
+                sys.exit(-1)
+    if drifts:
+        drifts = [] if drifts == "none" else listof(drifts)
+        known = pochoir.bench.drift_engines()
+        for engine in drifts:
+            if engine not in known:
+                click.echo(f'unknown drift engine: {engine}, have: {",".join(known)}')
+                sys.exit(-1)
+    problems = listof(problems)
+    for name in problems:
+        if name not in pochoir.bench.problems:
+            click.echo(f'unknown problem: {name}, have: {",".join(pochoir.bench.problems)}')
+            sys.exit(-1)
+    shapes = [(int(s),)*2 for s in listof(size2d)]
+    shapes += [(int(s),)*3 for s in listof(size3d)]
+
+    def log(one):
+        shape = "x".join([str(n) for n in one["shape"]])
+        what = one.get("error") or f'{one["rate"]:.3e}/s'
+        click.echo(f'{one["kind"]} {one["engine"]} {one["problem"]} {shape}: {what}')
+
+    results = pochoir.bench.bench(engines, drifts, problems, shapes,
+                                  sweeps, precision, epoch, nepochs,
+                                  timeout, log)
+    click.echo(pochoir.bench.table(results))
+    if output:
+        pochoir.bench.dump(output, results)
+
+
 @cli.command()
 @click.argument("things", nargs=-1)
 @click.pass_context
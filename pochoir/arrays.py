@@ -96,6 +96,9 @@ def to_like(array, like):
 def gradient(array, *spacing):
     '''
     Return the finite difference gradient of the array.
+
+    Each spacing is a scalar distance between points or, for a
+    non-uniform dimension, an array of the coordinates of the points.
     '''
     print (f'gradient spacing: {spacing}')
     if isinstance(array, numpy.ndarray):
@@ -106,7 +109,7 @@ def gradient(array, *spacing):
     # arithmetic operations.  At the cost of possible GPU->CPU->GPU
     # transit, for now we do the dirty:
     a = array.to('cpu').numpy()
-    gvec = numpy.gradient(a, spacing)
+    gvec = numpy.gradient(a, *spacing)
     g = numpy.array(gvec)
     return to_torch(g, device=array.device)
     
@@ -176,6 +179,62 @@ def rgi(points, values):
         from scipy.interpolate import RegularGridInterpolator as RGI
     return RGI(points, values)
 
+def resample(array, points, new_points):
+    '''
+    Return array linearly interpolated onto a new grid.
+
+    The points and new_points are N-tuples of increasing 1D arrays
+    giving the grid points on each axis of array and of the result.
+    New points outside the range of points take the edge value.
+
+    The interpolation is separable, one axis at a time, so the cost is
+    linear in the size of the result.
+    '''
+    array = numpy.asarray(array, dtype=float)
+    if len(points) != array.ndim or len(new_points) != array.ndim:
+        raise ValueError(f"dimension mismatch: {len(points)} != {array.ndim}")
+    for dim, (old, new) in enumerate(zip(points, new_points)):
+        old = numpy.asarray(old, dtype=float)
+        new = numpy.clip(numpy.asarray(new, dtype=float), old[0], old[-1])
+        if old.size == 1:
+            array = numpy.take(array, numpy.zeros(new.size, dtype=int), axis=dim)
+            continue
+        ind = numpy.clip(numpy.searchsorted(old, new, side='right') - 1,
+                         0, old.size-2)
+        frac = (new - old[ind])/(old[ind+1] - old[ind])
+        view = [1]*array.ndim
+        view[dim] = new.size
+        frac = frac.reshape(view)
+        array = numpy.take(array, ind, axis=dim)*(1-frac) \
+            + numpy.take(array, ind+1, axis=dim)*frac
+    return array
+
+
+def unfold(array, axis, high=False, sign=1):
+    '''
+    Return array extended by its mirror image along axis.
+
+    The mirror plane is on the first (or if high the last) plane of
+    cells along axis which is not repeated.  An array of n planes
+    gives 2n-1.  The mirror image is multiplied by sign, eg -1 for
+    the component of a vector field along axis.  Such an
+    antisymmetric array is zero on the mirror plane.
+    '''
+    array = numpy.asarray(array)
+    n = array.shape[axis]
+    if high:
+        image = numpy.flip(numpy.take(array, range(n-1), axis=axis), axis=axis)
+        ret = numpy.concatenate([array, sign*image], axis=axis)
+    else:
+        image = numpy.flip(numpy.take(array, range(1, n), axis=axis), axis=axis)
+        ret = numpy.concatenate([sign*image, array], axis=axis)
+    if sign < 0:
+        plane = [slice(None)]*ret.ndim
+        plane[axis] = n-1
+        ret[tuple(plane)] = 0
+    return ret
+
+
 def invert(arr):
     if is_torch(arr):
         return arr.logical_not()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+'''
+Benchmark the FDM and drift engines on synthetic problems.
+
+Each problem is made at a given shape from an existing setup:
+
+    - dipole :: two point electrodes, from examples.ex_dipole()
+
+    - sandh :: ground, cathode and two planes of strips with holes,
+      from gen_sandh with its planes scaled to the shape.  A 3D shape
+      extends the 2D problem along its last (periodic) axis.
+
+    - wires :: a plane at high potential, two rows of wires at
+      opposite potential and a ground plane, as in toy/stencil2d.py
+
+Each engine runs each problem in a child process which is given one
+warm up iteration (eg to compile), a timed number of iterations and,
+if a precision is given, iterations until the relative residual (see
+fdm_generic.Convergence) is below it.  An iteration of the multigrid,
+krylov and spectral engines is not a Jacobi sweep so their rate of
+cell updates counts iterations.  The peak memory of a case is the
+increase of the resident memory of its child.
+
+A drift engine is timed drifting a few points through the normalized
+field of the potential of each problem.
+'''
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import functools
+import contextlib
+import multiprocessing
+from queue import Empty
+import numpy
+
+from .domain import Domain
+from .fdm_generic import Convergence, Telemetry, resident
+
+problems = ("dipole", "sandh", "wires")
+
+
+def problem(name, shape):
+    '''
+    Return (iarr, barr, periodic) of the named problem of the shape.
+    '''
+    shape = tuple([int(n) for n in shape])
+    if len(shape) not in (2, 3):
+        raise ValueError(f'unsupported dimensions: {len(shape)}')
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        if name == "dipole":
+            from .examples import ex_dipole
+            iarr, barr = ex_dipole(Domain(shape, 1.0))
+            return iarr, barr, [False]*len(shape)
+        if name == "sandh":
+            return sandh(shape)
+    if name == "wires":
+        return wires(shape)
+    raise ValueError(f'unknown bench problem: {name}')
+
+
+def sandh(shape):
+    '''
+    Return (iarr, barr, periodic) of a strips and holes problem.
+    '''
+    from .gen_sandh import generator
+    n, m = shape[:2]
+    pitch = m/4
+    pcb = 0.3*n
+    thick = max(3.0, 0.06*n)
+
+    def plane(height, potential, strips=False):
+        one = dict(axis=0, height=height, thick=1.0, potential=potential)
+        if strips:
+            one["strips"] = dict(paxis=1, pitch=pitch, gap=2.0, offset=0.0)
+            one["holes"] = dict(radius=pitch/4, spacing=[pitch, pitch],
+                                offset=[0.0, 0.0])
+        return one
+
+    cfg = dict(planes=[plane(1, 0.0), plane(n-2, n-2.0),
+                       plane(pcb + thick/2, pcb + thick/2 + 5, True),
+                       plane(pcb - thick/2, pcb - thick/2 - 5, True)])
+    iarr, barr = generator(Domain((n, m), 1.0), cfg)
+    iarr = numpy.array(iarr, dtype=float)
+    barr = numpy.array(barr, dtype=bool)
+    if len(shape) == 3:
+        iarr = numpy.repeat(iarr[:,:,None], shape[2], axis=2)
+        barr = numpy.repeat(barr[:,:,None], shape[2], axis=2)
+    return iarr, barr, [False] + [True]*(len(shape)-1)
+
+
+def wires(shape):
+    '''
+    Return (iarr, barr, periodic) of a wires problem.
+    '''
+    iarr = numpy.zeros(shape)
+    barr = numpy.zeros(shape, dtype=bool)
+    half = shape[0]//2
+    iarr[0] = 1000
+    iarr[half+2, 0::2] = 200
+    iarr[half, 0::2] = -200
+    for row in (0, -1):
+        barr[row] = True
+    for row in (half, half+2):
+        barr[row, 0::2] = True
+    return iarr, barr, [False] + [True]*(len(shape)-1)
+
+
+def fdm_engines():
+    '''
+    Return the names of the FDM engines available in pochoir.fdm,
+    numpy first.
+    '''
+    import pochoir.fdm
+    names = [name[6:].replace('_', '-') for name in dir(pochoir.fdm)
+             if name.startswith("solve_")
+             and not name.endswith(("_mixed", "_batch"))
+             and hasattr(pochoir.fdm, name)]
+    return sorted(names, key=lambda name: (name != "numpy", name))
+
+
+def drift_engines():
+    '''
+    Return the names of the drift engines available in pochoir.drift,
+    numpy first.
+    '''
+    import pochoir.drift
+    names = [name[6:] for name in dir(pochoir.drift)
+             if name.startswith("solve_") and hasattr(pochoir.drift, name)]
+    return sorted(names, key=lambda name: (name != "numpy", name))
+
+
+def run_fdm(engine, iarr, barr, periodic, sweeps, precision=0,
+            epoch=20, nepochs=100, **kwds):
+    '''
+    Return dict of the timing of an FDM engine on a problem.
+
+    Any keywords are given to the solve function of the engine.
+    '''
+    import pochoir.fdm
+    solve = getattr(pochoir.fdm, 'solve_' + engine.replace('-', '_'))
+    if kwds:
+        solve = functools.partial(solve, **kwds)
+    solve(iarr, barr, periodic, 0, 1, 1)
+
+    start = time.perf_counter()
+    arr, _ = solve(iarr, barr, periodic, 0, sweeps, 1)
+    seconds = time.perf_counter() - start
+    ret = dict(seconds=seconds, rate=sweeps*iarr.size/seconds,
+               precision_seconds=None, precision_iterations=None)
+    if precision:
+        conv = Convergence(iarr, barr, periodic, "relative")
+        tel = Telemetry(epoch, conv)
+        solve(iarr, barr, periodic, precision, epoch, nepochs, convergence=tel)
+        reached = [r for r in tel.records if r["value"] < precision]
+        if reached:
+            ret["precision_seconds"] = reached[0]["time"]
+            ret["precision_iterations"] = (reached[0]["epoch"] + 1)*epoch
+    return ret
+
+
+def run_drift(engine, dom, velocity, starts, times):
+    '''
+    Return dict of the timing of a drift engine.
+    '''
+    import pochoir.drift
+    solve = getattr(pochoir.drift, 'solve_' + engine)
+    start = time.perf_counter()
+    for point in starts:
+        solve(dom, point, velocity, times)
+    seconds = time.perf_counter() - start
+    return dict(seconds=seconds, rate=len(starts)*len(times)/seconds,
+                precision_seconds=None, precision_iterations=None)
+
+
+def child(queue, func, args):
+    # the progress of the engines but not their warnings
+    logging.getLogger("pochoir").setLevel(logging.WARNING)
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        before = resident()
+        try:
+            got = func(*args)
+        except Exception as err:
+            queue.put(dict(error=f'{type(err).__name__}: {err}'))
+            return
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak*1024
+        got["peak_memory"] = max(0, peak - before)
+    except ImportError:
+        got["peak_memory"] = None
+    queue.put(got)
+
+
+def isolated(func, args, timeout=None):
+    '''
+    Return dict from func(*args) called in a child process with the
+    increase of its resident memory as "peak_memory".  Exceptions or
+    a timeout give a dict with an "error".
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    queue = ctx.Queue()
+    proc = ctx.Process(target=child, args=(queue, func, args))
+    proc.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        try:
+            got = queue.get(timeout=1.0)
+            break
+        except Empty:
+            pass
+        if not proc.is_alive():
+            try:
+                got = queue.get(timeout=1.0)
+            except Empty:
+                got = dict(error=f'child exit code {proc.exitcode}')
+            break
+        if deadline and time.monotonic() > deadline:
+            got = dict(error="timeout")
+            break
+    if proc.is_alive():
+        proc.terminate()
+    proc.join()
+    return got
+
+
+def velocity(arr):
+    '''
+    Return the field of the potential normalized to a max speed of one
+    cell per unit time.
+    '''
+    field = [-g for g in numpy.gradient(arr)]
+    speed = numpy.sqrt(sum([f*f for f in field]))
+    big = float(numpy.max(speed)) or 1.0
+    return [f/big for f in field]
+
+
+def bench(engines=None, drifts=None, problems=problems, shapes=((64, 64),),
+          sweeps=100, precision=1e-3, epoch=20, nepochs=100, timeout=None,
+          log=None):
+    '''
+    Return list of result dicts of engines on problems at shapes.
+
+    The engines and drifts are lists of FDM and drift engine names
+    (def: all available).  Each result has kind ("fdm" or "drift"),
+    engine, problem, shape, cells, seconds, rate (cell updates or
+    drift points per second), precision_seconds and
+    precision_iterations (None if not reached or not run),
+    peak_memory (bytes) and speedup (rate over that of the numpy
+    engine) or an error.  The numpy engines are run first so each
+    result has its speedup when it is made.  If log is given it is
+    called with each result as it is made.
+    '''
+    if engines is None:
+        engines = fdm_engines()
+    if drifts is None:
+        drifts = drift_engines()
+    results = list()
+
+    def add(one):
+        results.append(one)
+        if log:
+            log(one)
+
+    for name in problems:
+        for shape in shapes:
+            iarr, barr, periodic = problem(name, shape)
+            base = dict(problem=name, shape=list(iarr.shape),
+                        cells=int(iarr.size))
+            numpy_rate = None
+            for engine in sorted(engines, key=lambda one: one != "numpy"):
+                got = isolated(run_fdm, (engine, iarr, barr, periodic, sweeps,
+                                         precision, epoch, nepochs), timeout)
+                if engine == "numpy":
+                    numpy_rate = got.get("rate")
+                if "rate" in got and numpy_rate:
+                    got["speedup"] = got["rate"]/numpy_rate
+                add(dict(base, kind="fdm", engine=engine, **got))
+
+            if not drifts:
+                continue
+            from .fdm_numpy import solve
+            arr, _ = solve(iarr, barr, periodic, 0, sweeps, 1)
+            dom = Domain(iarr.shape, 1.0)
+            field = velocity(arr)
+            # between the first plane and the middle, off and on center
+            center = (numpy.array(iarr.shape) - 1)/2
+            starts = list()
+            for frac in (0.5, 0.25):
+                point = numpy.array(center)
+                point[0] = 0.25*(iarr.shape[0] - 1)
+                point[1] = frac*(iarr.shape[1] - 1)
+                starts.append(point)
+            times = numpy.linspace(0, iarr.shape[0]/4, 20)
+            numpy_rate = None
+            for engine in sorted(drifts, key=lambda one: one != "numpy"):
+                got = isolated(run_drift, (engine, dom, field, starts, times),
+                               timeout)
+                if engine == "numpy":
+                    numpy_rate = got.get("rate")
+                if "rate" in got and numpy_rate:
+                    got["speedup"] = got["rate"]/numpy_rate
+                add(dict(base, kind="drift", engine=engine, **got))
+    return results
+
+
+def host():
+    '''
+    Return dict describing the host and software versions.
+    '''
+    from .version import version
+    return dict(time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                machine=platform.machine(), processor=platform.processor(),
+                system=platform.platform(), cpus=os.cpu_count(),
+                python=platform.python_version(), numpy=numpy.__version__,
+                pochoir=version)
+
+
+def table(results):
+    '''
+    Return the results as a text table.
+    '''
+    cols = ("kind", "engine", "problem", "shape", "rate", "speedup",
+            "to prec [s]", "peak [MB]")
+    rows = list()
+    for one in results:
+        shape = "x".join([str(n) for n in one["shape"]])
+        if "error" in one:
+            rows.append((one["kind"], one["engine"], one["problem"], shape,
+                         one["error"][:40], "", "", ""))
+            continue
+
+        def fmt(val, form):
+            return "-" if val is None else format(val, form)
+        peak = one.get("peak_memory")
+        rows.append((one["kind"], one["engine"], one["problem"], shape,
+                     fmt(one["rate"], ".3e"), fmt(one.get("speedup"), ".2f"),
+                     fmt(one["precision_seconds"], ".3f"),
+                     fmt(None if peak is None else peak/1e6, ".1f")))
+    widths = [max([len(str(r[i])) for r in rows + [cols]]) for i in range(len(cols))]
+    lines = ["  ".join([str(c).ljust(w) for c, w in zip(row, widths)]).rstrip()
+             for row in [cols] + rows]
+    return "\n".join(lines)
+
+
+def dump(filename, results):
+    '''
+    Write the host and results to a JSON file.
+    '''
+    with open(filename, "w") as fp:
+        json.dump(dict(host=host(), results=results), fp, indent=4)
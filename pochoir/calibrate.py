@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+'''
+Choose the fastest FDM engine for a problem from a cached calibration.
+
+An engine is chosen among those doing plain Jacobi sweeps (so that an
+iteration means the same whichever is chosen) which are installed and
+support the requested options and features of the problem (see
+pochoir.fdm.options and pochoir.fdm.unsupported).  Each is timed on a
+synthetic problem (the "wires" problem of pochoir.bench) of the
+dimensions and dtype of the problem and of about its number of cells,
+up to a maximum, with the requested number of threads.  The choice is
+kept in a JSON file per host, keyed by dimensions, dtype, the power of
+two nearest the number of cells, the number of threads and the
+candidate engines, and is remade when the versions of python or of
+the packages the engines use change.
+
+The file is $POCHOIR_CACHE if set, else pochoir/engines.json in
+$XDG_CACHE_HOME (def: ~/.cache).
+'''
+
+import logging
+import os
+import json
+import math
+import functools
+import platform
+import tempfile
+import numpy
+
+from . import bench
+
+log = logging.getLogger(__name__)
+
+# engines whose iteration is one Jacobi sweep
+jacobi = ("numpy", "numpy-threads", "numpy-mp", "numba", "numba-fused",
+          "numba-blocked", "torch", "torch-conv", "cupy", "cumba")
+
+packages = ("numpy", "scipy", "numba", "llvmlite", "torch", "cupy")
+
+
+def cache_file():
+    '''
+    Return the name of the calibration file.
+    '''
+    path = os.environ.get("POCHOIR_CACHE")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "pochoir", "engines.json")
+
+
+def versions():
+    '''
+    Return dict of the versions of python, pochoir and the installed
+    packages which engines use.
+    '''
+    from importlib import metadata
+    from .version import version
+    ret = dict(python=platform.python_version(), pochoir=version)
+    for name in packages:
+        try:
+            ret[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            pass
+    return ret
+
+
+def candidates(needs=(), suffix=""):
+    '''
+    Return the installed Jacobi engines with a solve function of the
+    suffix ("", "_mixed" or "_batch") supporting the needs.
+
+    A need is an engine specific keyword (see pochoir.fdm.options) or
+    a feature of the problem (see pochoir.fdm.unsupported), eg
+    "graded" spacing or "mirror" edges.
+    '''
+    import pochoir.fdm
+    ret = list()
+    for engine in jacobi:
+        if not hasattr(pochoir.fdm, 'solve_' + engine.replace('-', '_') + suffix):
+            continue
+        if all([engine in pochoir.fdm.options[need] if need in pochoir.fdm.options
+                else engine not in pochoir.fdm.unsupported[need]
+                for need in needs]):
+            ret.append(engine)
+    return ret
+
+
+def key(shape, dtype, suffix, engines, threads=None):
+    '''
+    Return the key of the calibration of a problem among engines.
+    '''
+    cells = int(numpy.prod(shape))
+    return f'{len(shape)}d-{dtype}{suffix}-2^{round(math.log2(max(cells, 1)))}-' + \
+        (f'{threads}threads-' if threads else '') + ",".join(engines)
+
+
+def calibrate(engines, ndim, dtype, cells, sweeps=20, timeout=120, threads=None):
+    '''
+    Return dict of the rate of each engine on a problem of ndim
+    dimensions of about the number of cells.
+
+    A mixed dtype is timed in float32.  The number of threads is given
+    to the engines which take it.  A failing engine is left out.
+    '''
+    import pochoir.fdm
+    side = max(8, round(cells ** (1.0/ndim)))
+    iarr, barr, periodic = bench.problem("wires", (side,)*ndim)
+    iarr = iarr.astype("float32" if dtype in ("float32", "mixed") else "float64")
+    rates = dict()
+    for engine in engines:
+        kwds = dict()
+        if threads and engine in pochoir.fdm.options["threads"]:
+            kwds["threads"] = threads
+        got = bench.isolated(functools.partial(bench.run_fdm, **kwds),
+                             (engine, iarr, barr, periodic, sweeps), timeout)
+        if "rate" in got:
+            rates[engine] = got["rate"]
+    return rates
+
+
+def load(filename):
+    '''
+    Return the calibrations in the file or an empty dict.
+    '''
+    try:
+        with open(filename) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return dict()
+
+
+def save(filename, data):
+    '''
+    Write the calibrations to the file in one replacement.
+    '''
+    dirname = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    with os.fdopen(fd, "w") as fp:
+        json.dump(data, fp, indent=4)
+    os.replace(tmp, filename)
+
+
+def choose(shape, dtype="float64", needs=(), suffix="", filename=None,
+           most=2**22, sweeps=20, timeout=120, threads=None):
+    '''
+    Return the name of the fastest engine for a problem of the shape.
+
+    The dtype is "float32", "float64" or "mixed" and suffix is "" or
+    "_batch".  The needs lists the engine specific keywords and the
+    features of the problem which the engine must support, see
+    candidates().  The calibration is read from and added to filename
+    (def: cache_file()) and runs on at most most cells with the number
+    of threads.  ValueError is raised if no engine supports the needs.
+    '''
+    name = ("_mixed" if dtype == "mixed" else "") + suffix
+    engines = candidates(needs, name)
+    if not engines:
+        raise ValueError(f'no engine supports {", ".join(needs)}' +
+                         (f' with {name[1:]}' if name else ''))
+    if len(engines) == 1:
+        return engines[0]
+
+    filename = filename or cache_file()
+    data = load(filename)
+    node = platform.node()
+    have = versions()
+    entry = data.get(node)
+    if not entry or entry.get("versions") != have:
+        entry = data[node] = dict(versions=have, choices=dict())
+
+    name = key(shape, dtype, suffix, engines, threads)
+    if name not in entry["choices"]:
+        cells = min(2**round(math.log2(max(int(numpy.prod(shape)), 1))), most)
+        log.info(f'calibrate: timing {", ".join(engines)} on {cells} cells')
+        rates = calibrate(engines, len(shape), dtype, cells, sweeps, timeout, threads)
+        if not rates:
+            raise ValueError(f'no engine of {", ".join(engines)} ran')
+        best = max(rates, key=rates.get)
+        entry["choices"][name] = dict(engine=best, rates=rates)
+        # keep choices made meanwhile by others
+        again = load(filename)
+        if again.get(node, {}).get("versions") == have:
+            again[node]["choices"].update(entry["choices"])
+        else:
+            again[node] = entry
+        save(filename, again)
+    return entry["choices"][name]["engine"]
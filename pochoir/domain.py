@@ -117,15 +117,143 @@ class Domain:
         return numpy.meshgrid(*self.linspaces, indexing="ij")
 
     
+    @property
+    def gaps(self):
+        '''
+        Return list giving for each dimension the distance between
+        neighboring grid points.
+
+        This is the scalar spacing for a uniform dimension.
+        '''
+        return [float(sp) for sp in self.spacing]
+
     def gradient(self, scalar):
         '''
         Return the finite difference gradient of the scalar field.
         '''
-        return gradient(scalar, self.spacing)
+        return gradient(scalar, *self.spacing)
+
+
+    def unfold(self, axis, high=False):
+        '''
+        Return the domain extended by its mirror image along axis.
 
+        The mirror plane is on the first (or if high the last) grid
+        points along axis, see arrays.unfold().
+        '''
+        shape = numpy.array(self.shape)
+        origin = numpy.array(self.origin, dtype=float)
+        if not high:
+            origin[axis] -= (shape[axis] - 1)*self.spacing[axis]
+        shape[axis] = 2*shape[axis] - 1
+        return Domain(shape, self.spacing, origin)
 
     @property
     def asdict(self):
         return dict(shape = self.shape.tolist(),
                     spacing = self.spacing.tolist(),
                     origin = self.origin.tolist())
+
+
+class GradedDomain(Domain):
+    '''
+    A domain with explicit, increasing coordinates along one axis.
+
+    Along the other axes the grid is uniform as for Domain.  Along
+    axis the origin is the first coordinate and the spacing is the
+    mean distance between grid points.
+    '''
+
+    def __init__(self, shape, spacing, origin=None, axis=0, coords=None):
+        super().__init__(shape, spacing, origin)
+        self.axis = int(axis)
+        self.coords = numpy.array(coords, dtype=float)
+        if self.coords.shape != (self.shape[self.axis],):
+            raise ValueError(f'need {self.shape[self.axis]} coordinates on axis {self.axis}, got {self.coords.shape}')
+        if numpy.any(numpy.diff(self.coords) <= 0):
+            raise ValueError('coordinates must increase')
+        self.spacing = numpy.array(self.spacing, dtype=float)
+        self.origin = numpy.array(self.origin, dtype=float)
+        self.origin[self.axis] = self.coords[0]
+        if len(self.coords) > 1:
+            self.spacing[self.axis] = numpy.mean(numpy.diff(self.coords))
+
+    def point(self, index):
+        '''
+        Given an index into the array as a array-like return spatial point as array.
+
+        Along the graded axis a fractional index is linearly
+        interpolated between coordinates.
+        '''
+        index = numpy.array(index)
+        ret = super().point(index)
+        ind = numpy.arange(len(self.coords))
+        ret[self.axis] = numpy.interp(index[self.axis], ind, self.coords)
+        return ret
+
+    def index(self, point):
+        '''
+        Given a point as an array-like, return nearest index as tuple.
+        '''
+        point = numpy.array(point)
+        ret = list(super().index(point))
+        ret[self.axis] = int(numpy.argmin(numpy.abs(self.coords - point[self.axis])))
+        return tuple(ret)
+
+    @property
+    def linspaces(self):
+        '''
+        Return vector of array, each giving the positions of grid
+        points along a dimension of the domain.
+        '''
+        ret = super().linspaces
+        ret[self.axis] = numpy.array(self.coords)
+        return ret
+
+    @property
+    def gaps(self):
+        '''
+        Return list giving for each dimension the distance between
+        neighboring grid points.
+
+        This is an array of one less than the number of points for
+        the graded axis.
+        '''
+        ret = super().gaps
+        ret[self.axis] = numpy.diff(self.coords)
+        return ret
+
+    def gradient(self, scalar):
+        '''
+        Return the finite difference gradient of the scalar field.
+        '''
+        steps = list(self.spacing)
+        steps[self.axis] = self.coords
+        return gradient(scalar, *steps)
+
+    def unfold(self, axis, high=False):
+        '''
+        Return the domain extended by its mirror image along axis.
+
+        The mirror plane is on the first (or if high the last) grid
+        points along axis, see arrays.unfold().
+        '''
+        if axis != self.axis:
+            dom = super().unfold(axis, high)
+            return GradedDomain(dom.shape, dom.spacing, dom.origin,
+                                self.axis, self.coords)
+        edge = self.coords[-1] if high else self.coords[0]
+        image = 2*edge - self.coords[::-1]
+        if high:
+            coords = numpy.concatenate([self.coords, image[1:]])
+        else:
+            coords = numpy.concatenate([image[:-1], self.coords])
+        shape = numpy.array(self.shape)
+        shape[axis] = len(coords)
+        return GradedDomain(shape, self.spacing, self.origin, axis, coords)
+
+    @property
+    def asdict(self):
+        ret = super().asdict
+        ret.update(axis = self.axis, coords = self.coords.tolist())
+        return ret
@@ -1,21 +1,35 @@
-try:
-    from .drift_torch import solve as solve_torch
-except ImportError as err:
-    print('warning: pochoir.drift: no support for torch')
-    print(err)
+'''
+The drift engines.
 
-try:
-    from .drift_numpy import solve as solve_numpy
-except ImportError as err:
-    print('warning: pochoir.drift: no support for numpy')
-    print(err)
+Each solve_<engine> is imported from its module when first used, as
+for pochoir.fdm.  The solve function of an engine whose packages are
+missing is not an attribute.
+'''
 
-try:
-    from .drift_numpyold import solve as solve_numpyold
-except ImportError as err:
-    print('warning: pochoir.drift: no support for numpyold')
-    print(err)
+import importlib
 
+# attribute name: (module, function)
+solvers = dict(
+    solve_torch=("drift_torch", "solve"),
+    solve_numpy=("drift_numpy", "solve"),
+    solve_numpyold=("drift_numpyold", "solve"),
+    # a different implementation with scipy
+    solve_scipy=("pathfinder", "solve"),
+)
 
-# a different implementation with scipy
-from .pathfinder import solve as solve_scipy
+
+def __getattr__(name):
+    if name not in solvers:
+        raise AttributeError(f'module {__name__} has no attribute {name}')
+    modname, funcname = solvers[name]
+    try:
+        module = importlib.import_module('.' + modname, __package__)
+    except ImportError as err:
+        raise AttributeError(f'pochoir.drift: no support for {name[6:]}: {err}') from err
+    func = getattr(module, funcname)
+    globals()[name] = func
+    return func
+
+
+def __dir__():
+    return sorted(set(globals()) | set(solvers))
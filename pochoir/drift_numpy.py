@@ -15,25 +15,22 @@ class Simple:
 
     def __init__(self, domain, vfield, verbose=False):
         '''
-        The vfield give vector feild on domain.
+        The vfield give vector feild on domain.  A component may
+        instead be a callable interpolating it (eg, patch.Composite).
         '''
-        shape = domain.shape
-        spacing = domain.spacing
-        origin = domain.origin
         points = list()
         self.bb = domain.bb
         self.verbose = verbose
         self.calls = 0
 
-        for dim in range(len(domain.shape)):
-            start = origin[dim]
-            stop  = origin[dim] + shape[dim] * spacing[dim]
-            rang = numpy.arange(start, stop, spacing[dim])
-            print ("interp dim:", dim, rang.shape, vfield[dim].shape)
+        # grid point positions, also along a graded axis
+        for dim, rang in enumerate(domain.linspaces):
+            print ("interp dim:", dim, rang.shape)
             points.append(rang)
 
         self.interp = [
-            RGI(points, component, fill_value=0.0)
+            component if callable(component)
+            else RGI(points, component, fill_value=0.0)
             for component in vfield]
 
     def inside(self, point):
@@ -83,7 +80,7 @@ def solve(domain, start, velocity, times, verbose=False):
     Return the path of points at times from start through velocity field.
     '''
     start = numpy.array(start)
-    velocity = [numpy.array(v) for v in velocity]
+    velocity = [v if callable(v) else numpy.array(v) for v in velocity]
     times = numpy.array(times)
     print(f'start @{start}, times={times/units.us}')
     func = Simple(domain, velocity, verbose=verbose)
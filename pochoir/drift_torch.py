@@ -22,17 +22,13 @@ class Simple:
         '''
         The vfield give vector feild on domain.
         '''
-        shape = torch.tensor(domain.shape)
-        spacing = torch.tensor(domain.spacing)
-        origin = torch.tensor(domain.origin)
         points = list()
 
         self.calls = 0
 
-        for dim in range(len(domain.shape)):
-            start = origin[dim]
-            stop  = origin[dim] + shape[dim] * spacing[dim]
-            rang = torch.arange(start, stop, spacing[dim])
+        # grid point positions, also along a graded axis
+        for dim, rang in enumerate(domain.linspaces):
+            rang = torch.tensor(rang)
             #print ("interp dim:",dim,rang.shape,vfield[dim].shape)
             points.append(rang)
 
@@ -1,27 +1,73 @@
+'''
+The FDM engines.
 
-from pochoir.fdm_numpy import solve as solve_numpy
+Each solve_<engine> (and its _mixed or _batch variant) is imported
+from its module when first used so only the packages of the engines
+in use (eg scipy, torch, numba or cupy) are imported.  The solve
+function of an engine whose packages are missing is not an attribute.
+'''
 
-try:
-    from pochoir.fdm_torch import solve as solve_torch
-except ImportError as err:
-    print('warning: pochoir.fdm: no support for torch')
-    print(err)
+import importlib
 
-try:
-    from pochoir.fdm_numba import solve as solve_numba
-except ImportError as err:
-    print('warning: pochoir.fdm: no support for numba')
-    print(err)
+# attribute name: (module, function)
+solvers = dict(
+    solve_numpy=("fdm_numpy", "solve"),
+    solve_numpy_mixed=("fdm_numpy", "solve_mixed"),
+    solve_numpy_batch=("fdm_numpy", "solve_batch"),
+    solve_numpy_mp=("fdm_numpy_mp", "solve"),
+    solve_numpy_threads=("fdm_numpy_threads", "solve"),
+    solve_numpy_threads_mixed=("fdm_numpy_threads", "solve_mixed"),
+    solve_numpy_threads_batch=("fdm_numpy_threads", "solve_batch"),
+    solve_memmap=("fdm_memmap", "solve"),
+    solve_multigrid=("fdm_multigrid", "solve"),
+    solve_sor=("fdm_sor", "solve"),
+    solve_krylov=("fdm_krylov", "solve"),
+    solve_spectral=("fdm_spectral", "solve"),
+    solve_torch=("fdm_torch", "solve"),
+    solve_torch_conv=("fdm_torch_conv", "solve"),
+    solve_numba=("fdm_numba", "solve"),
+    solve_numba_fused=("fdm_numba_fused", "solve"),
+    solve_numba_tiled=("fdm_numba_tiled", "solve"),
+    solve_numba_blocked=("fdm_numba_blocked", "solve"),
+    solve_cupy=("fdm_cupy", "solve"),
+    solve_cumba=("fdm_cumba", "solve"),
+)
 
-try:
-    from pochoir.fdm_cupy import solve as solve_cupy
-except ImportError as err:
-    print('warning: pochoir.fdm: no support for cupy')
-    print(err)
+# engine specific keyword: engines whose solve takes it
+options = dict(
+    cycle_type=("multigrid",),
+    omega=("sor",),
+    precond=("krylov",),
+    accelerate=("numpy", "numpy-threads", "numba"),
+    threads=("numpy-threads", "numba-fused", "numba-blocked", "torch-conv"),
+    tile=("numba-tiled", "numba-blocked"),
+    fraction=("numba-tiled",),
+    time_block=("numba-blocked", "memmap"),
+    max_memory=("memmap",),
+    workdir=("memmap",),
+    procs=("numpy-mp",),
+)
 
-try:
-    from pochoir.fdm_cumba import solve as solve_cumba
-except ImportError as err:
-    print('warning: pochoir.fdm: no support for cumba (numba+cupy)')
-    print(err)
+# feature of a problem: engines which do not support it
+unsupported = dict(
+    mirror=("multigrid", "spectral"),
+    graded=("numba", "numba-fused", "numba-tiled", "numba-blocked",
+            "torch-conv", "cumba", "multigrid", "sor", "spectral"),
+)
 
+
+def __getattr__(name):
+    if name not in solvers:
+        raise AttributeError(f'module {__name__} has no attribute {name}')
+    modname, funcname = solvers[name]
+    try:
+        module = importlib.import_module('.' + modname, __package__)
+    except ImportError as err:
+        raise AttributeError(f'pochoir.fdm: no support for {name[6:]}: {err}') from err
+    func = getattr(module, funcname)
+    globals()[name] = func
+    return func
+
+
+def __dir__():
+    return sorted(set(globals()) | set(solvers))
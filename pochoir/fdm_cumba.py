@@ -3,41 +3,48 @@
 Apply FDM solution to solve Laplace boundary value problem using numba
 with CUDA.
 '''
+import logging
 import math
 import numba
 import cupy
 from numba import cuda
 from pochoir import arrays
-from .fdm_generic import edge_condition
+from .fdm_generic import edge_condition, weights
+
+log = logging.getLogger(__name__)
 
 @cuda.jit
-def stencil_numba2d_jit(arr, out):
+def stencil_numba2d_jit(arr, out, w0, w1):
     i, j = cuda.grid(2)
     n, m = arr.shape
     if 1 <= i < n - 1 and 1 <= j < m - 1:
-        out[i, j] = (1/4.0)*(
-            arr[i - 1, j] + arr[i, j - 1] +
-            arr[i + 1, j] + arr[i, j + 1])
+        out[i, j] = (
+            w0*(arr[i - 1, j] + arr[i + 1, j]) +
+            w1*(arr[i, j - 1] + arr[i, j + 1]))
         
 @cuda.jit
-def stencil_numba3d_jit(arr, out):
+def stencil_numba3d_jit(arr, out, w0, w1, w2):
     i, j, k = cuda.grid(2)
     l, n, m = arr.shape
     if 1 <= i < l - 1 and 1 <= j < n - 1 and 1 <= k < m - 1:
-        out[i, j, k] = (1/6.0)*(
-            arr[i-1, j, k] + arr[i, j-1, k] + arr[i, j, k-1] +  
-            arr[i+1, j, k] + arr[i, j+1, k] + arr[i, j, k+1])
+        out[i, j, k] = (
+            w0*(arr[i-1, j, k] + arr[i+1, j, k]) +
+            w1*(arr[i, j-1, k] + arr[i, j+1, k]) +
+            w2*(arr[i, j, k-1] + arr[i, j, k+1]))
 
 
-def stencil(arr, out):
+def stencil(arr, out, spacing=None):
     out[:] = 0
+    if spacing is None:
+        spacing = [1.0]*arr.ndim
+    wts = weights(spacing)
 
     if arr.ndim == 2:
         threadsperblock = (32, 32)
         blockspergrid_x = math.ceil(arr.shape[0] / threadsperblock[0])
         blockspergrid_y = math.ceil(arr.shape[1] / threadsperblock[1])
         blockspergrid = (blockspergrid_x, blockspergrid_y)
-        stencil_numba2d_jit[blockspergrid, threadsperblock](arr, out)
+        stencil_numba2d_jit[blockspergrid, threadsperblock](arr, out, *wts)
         return
 
     threadsperblock = (16, 16, 16)
@@ -45,14 +52,15 @@ def stencil(arr, out):
     blockspergrid_y = math.ceil(arr.shape[1] / threadsperblock[1])
     blockspergrid_z = math.ceil(arr.shape[2] / threadsperblock[2])
     blockspergrid = (blockspergrid_x, blockspergrid_y, blockspergrid_z)
-    stencil_numba3d_jit[blockspergrid, threadsperblock](arr, out)
+    stencil_numba3d_jit[blockspergrid, threadsperblock](arr, out, *wts)
     return
     
 
 
 from pochoir.fdm_numpy import solve as solve_numpy
 def solve(iarr, barr, periodic, prec, epoch, nepochs,
-          stencil = stencil):
+          stencil = stencil, spacing = None, mirror = None,
+          convergence = None):
 
 
 
@@ -70,27 +78,29 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
     prev = None
     for iepoch in range(nepochs):
-        print(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
 
         for istep in range(epoch):
             #print(f'step: {istep}/{epoch}')
             if epoch-istep == 1: # last in the epoch
                 prev = cupy.array(iarr_pad)
 
-            stencil(iarr_pad, tmp_pad)
+            stencil(iarr_pad, tmp_pad, spacing=spacing)
 
             iarr_pad = bi_pad + mutable_pad*tmp_pad
-            edge_condition(iarr_pad, *periodic)
+            edge_condition(iarr_pad, *periodic, mirror=mirror)
             
             if epoch-istep == 1: # last in the epoch
                 err = iarr_pad - prev
                 maxerr = cupy.max(cupy.abs(err))
+                if convergence:
+                    maxerr = convergence(iarr_pad[core].get(), err[core].get())
                 #print(f'maxerr: {maxerr}')
                 if prec and maxerr < prec:
-                    print(f'fdm reach max precision: {prec} > {maxerr}')
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
                     return (iarr_pad[core], err[core])
 
-    print(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
     res = (iarr_pad[core], err[core])
     return tuple([r.get() for r in res])
 
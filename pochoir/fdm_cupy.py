@@ -3,17 +3,21 @@
 Apply FDM solution to solve Laplace boundary value problem using numpy
 '''
 
+import logging
 import cupy
 from pochoir.fdm_numpy import solve as solve_numpy
 from pochoir.fdm_generic import stencil
 
 from pochoir import arrays
 
-from .fdm_generic import edge_condition, stencil
+from .fdm_generic import edge_condition, stencil, spaced
+
+log = logging.getLogger(__name__)
     
 
 def solve(iarr, barr, periodic, prec, epoch, nepochs,
-          stencil = stencil):
+          stencil = stencil, spacing = None, mirror = None,
+          convergence = None):
     '''
     Solve boundary value problem
 
@@ -31,16 +35,28 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
         - nepochs limits the number of epochs
 
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.stencil().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
     Returned arrays "arr" is like iarr with updated solution including
     fixed boundary value elements.  "err" is difference between last
     and penultimate iteration.
     '''
+    stencil = spaced(stencil, spacing)
     iarr = cupy.array(iarr)
     barr = cupy.array(barr)
 
     bi_core = cupy.array(iarr*barr)
     mutable_core = cupy.invert(barr)
-    tmp_core = cupy.zeros(iarr.shape)
+    tmp_core = cupy.zeros(iarr.shape, dtype=iarr.dtype)
 
     err = cupy.zeros_like(iarr)
 
@@ -54,7 +70,7 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
     prev = None
     for iepoch in range(nepochs):
-        print(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
         for istep in range(epoch):
             #print(f'step: {istep}/{epoch}')
             if epoch-istep == 1: # last in the epoch
@@ -64,17 +80,19 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
             iarr_pad[core] = bi_core + mutable_core*tmp_core
 
-            edge_condition(iarr_pad, *periodic)
+            edge_condition(iarr_pad, *periodic, mirror=mirror)
             
             if epoch-istep == 1: # last in the epoch
                 err = iarr_pad[core] - prev
                 maxerr = cupy.max(cupy.abs(err))
+                if convergence:
+                    maxerr = convergence(iarr_pad[core].get(), err.get())
                 #print(f'maxerr: {maxerr}')
                 if prec and maxerr < prec:
-                    print(f'fdm reach max precision: {prec} > {maxerr}')
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
                     return (iarr_pad[core], err)
 
-    print(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
     res = (iarr_pad[core], err)
     return tuple([r.get() for r in res])
 
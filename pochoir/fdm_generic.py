@@ -1,67 +1,380 @@
+import os
+import json
+import time
+import functools
+import numpy
 from pochoir import arrays
 
-def edge_condition(arr, *periodic):
+def edge_condition(arr, *periodic, mirror=None):
     '''
     Apply N edge conditions (periodic if True, else fixed) to N-D array.
+
+    A fixed dimension which is True in the optional list mirror
+    instead has mirror edges, see edge_condition1().
     '''
     np = len(periodic)
     na = len(arr.shape)
     if np != na:
         raise ValueError(f"dimension mismatch: {np} != {na}")
-    
+    if mirror is None:
+        mirror = [False]*np
+
+    for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+        edge_condition1(arr, dim, per, mir)
+
+
+def edge_condition1(arr, dim, per, mirror=False):
+    '''
+    Apply one edge condition (periodic if True, else fixed) along dim.
+
+    The padding cell at each end of a fixed dimension is set to the
+    edge cell next to it, which puts a symmetry plane half a cell
+    beyond the edge.  With mirror it is instead set to the cell one
+    beyond the edge cell, which puts the symmetry plane on the edge
+    cell.  A domain which is symmetric about a plane through a row of
+    cells can then be solved from that row on and unfolded.
+    '''
     # whole array slice
     slices = [slice(0,s) for s in arr.shape]
-    for dim, per in enumerate(periodic):
-        n = arr.shape[dim]
-        src1 = list(slices)
-        src2 = list(slices)
-        dst1 = list(slices)
-        dst2 = list(slices)
+    n = arr.shape[dim]
+    src1 = list(slices)
+    src2 = list(slices)
+    dst1 = list(slices)
+    dst2 = list(slices)
+
+    dst1[dim] = slice(0,1)
+    src1[dim] = slice(n-2, n-1)
+
+    dst2[dim] = slice(n-1,n)
+    src2[dim] = slice(1,2)
+
+    if per and mirror:
+        raise ValueError("a periodic dimension can not have mirror edges")
+    if per:
+        arr[tuple(dst1)] = arr[tuple(src1)]
+        arr[tuple(dst2)] = arr[tuple(src2)]
+    elif mirror:
+        src1[dim] = slice(n-3, n-2)
+        src2[dim] = slice(2, 3)
+        arr[tuple(dst1)] = arr[tuple(src2)]
+        arr[tuple(dst2)] = arr[tuple(src1)]
+    else:                   # fixed
+        arr[tuple(dst1)] = arr[tuple(src2)]
+        arr[tuple(dst2)] = arr[tuple(src1)]
+
+
+def is_graded(spacing):
+    '''
+    Return True if any dimension of spacing is graded.
+
+    A graded dimension has an array of the n-1 distances between its
+    n cells instead of a scalar spacing.
+    '''
+    if spacing is None:
+        return False
+    return any([numpy.ndim(h) > 0 for h in spacing])
+
+
+def weights(spacing):
+    '''
+    Return the weight of each of the two neighbors along each
+    dimension in a Jacobi step given the per-dimension spacing.
+
+    The weight along dimension d is (1/h_d^2) / sum_e (2/h_e^2) which
+    is 1/(2N) when all N spacings are equal.
+    '''
+    if is_graded(spacing):
+        raise ValueError("graded spacing is not supported, see graded_weights()")
+    inv = [1.0/(h*h) for h in spacing]
+    tot = 2*sum(inv)
+    return [one/tot for one in inv]
 
-        dst1[dim] = slice(0,1)
-        src1[dim] = slice(n-2, n-1)
 
-        dst2[dim] = slice(n-1,n)
-        src2[dim] = slice(1,2)
+def graded_weights(spacing):
+    '''
+    Return list of (lo, hi) weights of the neighbor below and above
+    along each dimension in a Jacobi step.
 
-        if per:
-            arr[tuple(dst1)] = arr[tuple(src1)]
-            arr[tuple(dst2)] = arr[tuple(src2)]
-        else:                   # fixed
-            arr[tuple(dst1)] = arr[tuple(src2)]
-            arr[tuple(dst2)] = arr[tuple(src1)]
+    A scalar spacing h gives coefficient 1/h^2 to both neighbors.  A
+    graded dimension with distance hlo to the cell below and hhi to
+    the cell above gives coefficients 2/(hlo (hlo+hhi)) and
+    2/(hhi (hlo+hhi)), from the three point second derivative.  The
+    distance beyond an edge is taken equal to the one inside.  The
+    weights are the coefficients over their sum over all neighbors.
 
+    The weights of a graded dimension are arrays of its size shaped
+    to broadcast along it.
+    '''
+    ndim = len(spacing)
+    coefs = list()
+    for dim, h in enumerate(spacing):
+        if numpy.ndim(h) == 0:
+            coefs.append((1.0/(h*h), 1.0/(h*h)))
+            continue
+        h = numpy.asarray(h, dtype=float)
+        hlo = numpy.concatenate([h[:1], h])
+        hhi = numpy.concatenate([h, h[-1:]])
+        shape = [-1 if d == dim else 1 for d in range(ndim)]
+        coefs.append(((2/(hlo*(hlo+hhi))).reshape(shape),
+                      (2/(hhi*(hlo+hhi))).reshape(shape)))
+    tot = sum([lo + hi for lo, hi in coefs])
+    return [(lo/tot, hi/tot) for lo, hi in coefs]
 
-def stencil(array, res = None):
+
+def stencil(array, res = None, nbatch = 0, spacing = None):
     '''
-    Return sum of 2N views of N-D array.
+    Return weighted sum of 2N views of N-D array.
 
-    Each view for a dimension is offset by +/- one cell.
+    Each view for a dimension is offset by +/- one cell.  All views
+    have weight 1/(2N) unless a per-dimension spacing is given, see
+    weights() and, if a dimension is graded, graded_weights().
 
     The shape of the returned array is reduced by two indices in each
     dimension.  If res is given, it must be of reduced size and it
     will be used to hold the result.
+
+    The first nbatch dimensions are not part of the stencil and are
+    kept whole, eg to hold a batch of independent arrays.
     '''
     # whole array slice
-    slices = [slice(1,s-1) for s in array.shape]
-    nd = len(slices)
+    slices = [slice(None)]*nbatch
+    slices += [slice(1,s-1) for s in array.shape[nbatch:]]
+    nd = len(slices) - nbatch
     norm = 1/(2*nd)
+    if spacing is not None:
+        if len(spacing) != nd:
+            raise ValueError(f"dimension mismatch: {len(spacing)} != {nd}")
+    graded = is_graded(spacing)
+    if graded:
+        wdim = [[like(w, array) for w in pair]
+                for pair in graded_weights(spacing)]
+    elif spacing is not None:
+        wdim = weights(spacing)
 
     if res is None:
-        core_shape = [s-2 for s in array.shape]
+        # same dtype (and device) as the array
         amod = arrays.module(array)
-        res = amod.zeros(core_shape)
+        res = amod.zeros_like(array[tuple(slices)])
     else:
         res[:] = 0
 
     for dim, n in enumerate(array.shape):
+        if dim < nbatch:
+            continue
         pos = list(slices)
         pos[dim] = slice(2,n)
-        res += array[tuple(pos)]
-
         neg = list(slices)
         neg[dim] = slice(0,n-2)
-        res += array[tuple(neg)]
+        if graded:
+            wlo, whi = wdim[dim-nbatch]
+            res += wlo*array[tuple(neg)]
+            res += whi*array[tuple(pos)]
+        elif spacing is None:
+            res += array[tuple(pos)]
+            res += array[tuple(neg)]
+        else:
+            res += wdim[dim-nbatch]*(array[tuple(pos)] + array[tuple(neg)])
 
-    res *= norm
+    if spacing is None:
+        res *= norm
     return res
+
+
+def like(weight, array):
+    '''
+    Return weight as a scalar or as an array of the type, dtype and
+    device of array.
+    '''
+    if numpy.ndim(weight) == 0:
+        return weight
+    if arrays.is_torch(array):
+        import torch
+        return torch.as_tensor(weight, dtype=array.dtype, device=array.device)
+    return arrays.module(array).asarray(weight, dtype=array.dtype)
+
+
+def spaced(stencil, spacing):
+    '''
+    Return the stencil function called with the given spacing.
+
+    With no spacing the stencil is returned unchanged.
+    '''
+    if spacing is None:
+        return stencil
+    return functools.partial(stencil, spacing=spacing)
+
+
+criteria = ("increment", "residual", "relative")
+
+
+def residual(arr, barr, periodic, spacing = None, mirror = None):
+    '''
+    Return RMS over mutable cells of the residual of core array arr.
+
+    The residual is the change one Jacobi step would make, that is
+    the discrete Laplacian scaled by the square of the spacing over 2N
+    (or weighted per dimension as in stencil() if spacing is given).
+    Edges are as in edge_condition() with the optional mirror.
+    '''
+    amod = arrays.module(arr)
+    pad = arrays.pad1(arr)
+    edge_condition(pad, *periodic, mirror=mirror)
+    res = stencil(pad, spacing=spacing) - arr
+    res = res[amod.invert(barr)]
+    if res.size == 0:
+        return 0.0
+    return float(amod.sqrt(amod.mean(res*res)))
+
+
+class Convergence:
+    '''
+    Measure convergence at the end of each epoch.
+
+    Calling with the current core array and its last increment returns
+    the value of the criterion which an engine compares to its
+    precision:
+
+        - increment :: max absolute increment
+
+        - residual :: RMS residual, see residual()
+
+        - relative :: RMS residual over that of the initial array
+
+    The history holds (increment, residual, relative) for each call.
+    '''
+
+    def __init__(self, iarr, barr, periodic, criterion="increment",
+                 spacing=None, mirror=None):
+        if criterion not in criteria:
+            raise ValueError(f'unknown convergence criterion: {criterion}')
+        self.criterion = criterion
+        self.barr = barr
+        self.periodic = periodic
+        self.spacing = spacing
+        self.mirror = mirror
+        self.initial = residual(iarr, barr, periodic, spacing, mirror)
+        self.history = list()
+
+    def __call__(self, arr, err):
+        amod = arrays.module(err)
+        inc = float(amod.max(amod.abs(err)))
+        res = residual(arr, self.barr, self.periodic, self.spacing, self.mirror)
+        rel = res/self.initial if self.initial else 0.0
+        self.history.append((inc, res, rel))
+        return dict(increment=inc, residual=res, relative=rel)[self.criterion]
+
+    @property
+    def array(self):
+        '''
+        The history as an array of shape (ncalls, 3).
+        '''
+        return arrays.to_numpy(self.history).reshape((-1, 3))
+
+
+def resident():
+    '''
+    Return the resident memory of this process in bytes.
+
+    This is the current value where /proc is available, else the peak.
+    '''
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak*1024
+
+
+class Telemetry:
+    '''
+    Record what an engine does in each epoch.
+
+    This is called by an engine at the end of each epoch like a
+    Convergence, which it optionally wraps to give the value compared
+    to the precision (def: max absolute increment).  Each call adds a
+    record of:
+
+        - epoch :: number of calls before this one
+
+        - time :: seconds since the telemetry was made
+
+        - seconds :: seconds since the previous call
+
+        - cells :: number of cells of the array
+
+        - rate :: nominal cell updates per second, the epoch
+          iterations times the updated cells over the seconds.  The
+          updated cells are the mutable cells if their number is given
+          else all cells.  This assumes each iteration is one sweep
+          over them which is not so for engines that skip cells (eg
+          numba-tiled) or do more or other work per iteration (eg
+          multigrid, krylov or spectral).
+
+        - max_increment :: max absolute increment
+
+        - rms_increment :: RMS increment over the cells
+
+        - resident :: resident memory in bytes, see resident()
+
+        - value :: the value returned to the engine
+
+    The records are appended to the list "records" and, if a stream
+    is given, written to it as JSON lines.  The engines also log a
+    line per epoch at INFO level to the logger of their module.
+    '''
+
+    def __init__(self, epoch, convergence=None, stream=None, mutable=None):
+        self.epoch = epoch
+        self.convergence = convergence
+        self.stream = stream
+        self.mutable = mutable
+        self.records = list()
+        self.start = self.last = time.perf_counter()
+
+    def __call__(self, arr, err):
+        now = time.perf_counter()
+        seconds = now - self.last
+        amod = arrays.module(err)
+        # one slice at a time to keep the memory of out of core arrays
+        big = 0.0
+        sumsq = 0.0
+        for part in (err if err.ndim > 1 else [err]):
+            if part.size:
+                big = max(big, float(amod.max(amod.abs(part))))
+                sumsq += float(amod.sum(part*part))
+        cells = int(err.size)
+        updated = cells if self.mutable is None else self.mutable
+        value = self.convergence(arr, err) if self.convergence else big
+        record = dict(epoch=len(self.records), time=now - self.start,
+                      seconds=seconds, cells=cells,
+                      rate=self.epoch*updated/seconds if seconds > 0 else 0.0,
+                      max_increment=big,
+                      rms_increment=(sumsq/cells)**0.5 if cells else 0.0,
+                      resident=resident(), value=float(value))
+        self.records.append(record)
+        if self.stream:
+            self.stream.write(json.dumps(record) + "\n")
+            self.stream.flush()
+        # the record is not part of the time of the next epoch
+        self.last = time.perf_counter()
+        return value
+
+    @property
+    def summary(self):
+        '''
+        A dict summarizing the records: number of epochs, total
+        seconds, mean nominal rate, increments of the last epoch and peak
+        resident memory.
+        '''
+        if not self.records:
+            return dict(epochs=0)
+        seconds = sum([r["seconds"] for r in self.records])
+        updates = sum([r["rate"]*r["seconds"] for r in self.records])
+        last = self.records[-1]
+        return dict(epochs=len(self.records), seconds=seconds,
+                    rate=updates/seconds if seconds > 0 else 0.0,
+                    max_increment=last["max_increment"],
+                    rms_increment=last["rms_increment"],
+                    resident=max([r["resident"] for r in self.records]))
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+'''
+Solve Laplace boundary value problem with a preconditioned conjugate
+gradient (PCG) over a sparse matrix using scipy.
+
+Only the mutable cells (not in barr) are unknowns.  Each row of the
+matrix holds the 5-point (2D) or 7-point (3D) Laplacian of one mutable
+cell and the values of its fixed neighbors are moved to the right hand
+side.  Edge conditions follow edge_condition(): a periodic dimension
+wraps the matrix connectivity and a fixed dimension has the cell beyond
+the edge equal to the edge cell, which drops out of the equation.  A
+mirror dimension has the cell beyond the edge equal to the one inside
+and the equations of its edge cells are halved to keep the matrix
+symmetric.
+'''
+
+import logging
+import numpy
+from scipy import sparse
+from scipy.sparse import linalg
+
+log = logging.getLogger(__name__)
+
+preconditioners = ("amg", "ilu", "jacobi", "none")
+
+
+def neighbors(shape, dim, step, periodic, mirror=False):
+    '''
+    Return flat index array giving the neighbor of each cell.
+
+    The neighbor is one cell away by step along dim.  Beyond the edge
+    the neighbor wraps if periodic, is the cell inside the edge if
+    mirror or else is the cell itself.
+    '''
+    ind = numpy.arange(numpy.prod(shape)).reshape(shape)
+    if periodic:
+        return numpy.roll(ind, -step, axis=dim)
+    n = shape[dim]
+    pos = numpy.arange(n) + step
+    if mirror:
+        pos = n-1 - numpy.abs(n-1 - numpy.abs(pos))
+    pos = numpy.clip(pos, 0, n-1)
+    return numpy.take(ind, pos, axis=dim)
+
+
+def coefficients(spacing):
+    '''
+    Return list of (lo, hi) coefficients of the neighbor below and
+    above along each dimension.
+
+    With uniform spacing these are 1/h^2.  With a graded dimension
+    (an array of the distances between its cells, see
+    fdm_generic.graded_weights()) the equation of each cell is
+    multiplied by its width along that dimension to keep the matrix
+    symmetric.  The coefficients along the graded dimension are then
+    1/hlo and 1/hhi and along the others 1/h^2 times the width.  These
+    are arrays shaped to broadcast along the graded dimension.
+    '''
+    graded = [d for d, h in enumerate(spacing) if numpy.ndim(h) > 0]
+    if not graded:
+        return [(1.0/(h*h), 1.0/(h*h)) for h in spacing]
+    if len(graded) > 1:
+        raise ValueError("only one dimension may be graded")
+    gdim = graded[0]
+    h = numpy.asarray(spacing[gdim], dtype=float)
+    shape = [-1 if d == gdim else 1 for d in range(len(spacing))]
+    hlo = numpy.concatenate([h[:1], h]).reshape(shape)
+    hhi = numpy.concatenate([h, h[-1:]]).reshape(shape)
+    width = 0.5*(hlo + hhi)
+    ret = list()
+    for dim, h in enumerate(spacing):
+        if dim == gdim:
+            ret.append((1.0/hlo, 1.0/hhi))
+        else:
+            ret.append((width/(h*h), width/(h*h)))
+    return ret
+
+
+def laplacian(iarr, barr, periodic, spacing=None, mirror=None):
+    '''
+    Return (A, b, mutable) for the problem A x = b.
+
+    The x are the values on the mutable cells in flattened order and
+    mutable is the bool array selecting them.  A is symmetric positive
+    (semi-)definite in CSR format.  Neighbors along a dimension have
+    coefficients from coefficients() if spacing is given, else 1.  A
+    dimension which is True in mirror has mirror edges.
+    '''
+    shape = iarr.shape
+    if spacing is None:
+        spacing = [1.0]*len(shape)
+    if mirror is None:
+        mirror = [False]*len(shape)
+
+    # edge cells of a mirror dimension hold half of their equation
+    scale = numpy.ones(shape)
+    for dim, mir in enumerate(mirror):
+        if mir:
+            edge = [slice(None)]*len(shape)
+            edge[dim] = [0, -1]
+            scale[tuple(edge)] *= 0.5
+    mutable = numpy.invert(numpy.asarray(barr, dtype=bool)).ravel()
+    values = numpy.asarray(iarr, dtype=float).ravel()
+
+    nmut = int(numpy.count_nonzero(mutable))
+    row_of = numpy.zeros(mutable.size, dtype=numpy.int64) - 1
+    row_of[mutable] = numpy.arange(nmut)
+
+    cells = numpy.flatnonzero(mutable)
+    rows = [row_of[cells]]
+    cols = [row_of[cells]]
+    data = [numpy.zeros(nmut)]
+    rhs = numpy.zeros(nmut)
+    coefs = coefficients(spacing)
+    for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+        for step, coef in zip((1, -1), coefs[dim][::-1]):
+            coef = (scale*coef).ravel()[cells]
+            nbr = neighbors(shape, dim, step, per, mir).ravel()[cells]
+            other = nbr != cells   # a neighbor which is self drops out
+            data[0] += coef*other
+
+            inner = other & mutable[nbr]
+            rows.append(row_of[cells[inner]])
+            cols.append(row_of[nbr[inner]])
+            data.append(-coef[inner])
+
+            outer = other & ~mutable[nbr]
+            numpy.add.at(rhs, row_of[cells[outer]], coef[outer]*values[nbr[outer]])
+
+    A = sparse.coo_matrix((numpy.concatenate(data),
+                           (numpy.concatenate(rows), numpy.concatenate(cols))),
+                          shape=(nmut, nmut)).tocsr()
+    return A, rhs, mutable.reshape(shape)
+
+
+def preconditioner(A, kind="amg"):
+    '''
+    Return a callable applying an approximate inverse of A to a vector.
+    '''
+    if kind == "ilu":
+        # Keep symmetric pattern and no pivoting so this stays close
+        # to an incomplete Cholesky factorization.
+        ilu = linalg.spilu(A.tocsc(), drop_tol=1e-4, fill_factor=10,
+                           permc_spec="MMD_AT_PLUS_A",
+                           diag_pivot_thresh=0.0,
+                           options=dict(SymmetricMode=True))
+        return ilu.solve
+    if kind == "amg":
+        import pyamg
+        ml = pyamg.smoothed_aggregation_solver(A, symmetry='symmetric')
+        return ml.aspreconditioner(cycle='V').matvec
+    if kind == "jacobi":
+        inv = 1.0/A.diagonal()
+        return lambda r: inv*r
+    if kind == "none":
+        return lambda r: r
+    raise ValueError(f'unknown preconditioner: {kind}')
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, precond="amg",
+          convergence=None, spacing=None, mirror=None):
+    '''
+    Solve boundary value problem with preconditioned conjugate gradient.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of PCG iterations per precision check
+
+        - nepochs limits the number of epochs
+
+        - precond names the preconditioner, one of "amg" (requires
+          pyamg), "ilu", "jacobi" or "none".  Only "amg" keeps the
+          number of iterations low on large domains.
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see laplacian().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.  The iterations stop early at an exact
+    solution or if the search direction breaks down (p.Ap <= 0), which
+    is reported, and "err" is then the last increment made.
+    '''
+    A, b, mutable = laplacian(iarr, barr, periodic, spacing, mirror)
+    log.info(f'krylov: {A.shape[0]} unknowns, {A.nnz} nonzeros, precond {precond}')
+    psolve = preconditioner(A, precond)
+
+    arr = numpy.array(iarr, dtype=float)
+    err = numpy.zeros_like(arr)
+
+    x = arr[mutable]
+    r = b - A @ x
+    z = psolve(r)
+    p = numpy.array(z)
+    rz = numpy.dot(r, z)
+
+    maxerr = None
+    inc = numpy.zeros_like(x)
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        for istep in range(epoch):
+            q = A @ p
+            pq = numpy.dot(p, q)
+            if rz == 0 or pq <= 0:
+                if rz == 0:
+                    log.info('fdm reach exact solution')
+                else:
+                    # eg, an indefinite preconditioner
+                    log.warning(f'krylov: breakdown with p.Ap = {pq}, stopping')
+                arr[mutable] = x
+                err[mutable] = inc
+                return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+            alpha = rz/pq
+            inc = alpha*p
+            x += inc
+            r -= alpha*q
+
+            if epoch-istep == 1: # last in the epoch
+                err[mutable] = inc
+                maxerr = numpy.max(numpy.abs(inc))
+                if convergence:
+                    arr[mutable] = x
+                    maxerr = convergence(arr, err)
+                if prec and maxerr < prec:
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                    arr[mutable] = x
+                    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+
+            z = psolve(r)
+            rz_new = numpy.dot(r, z)
+            p *= rz_new/rz
+            p += z
+            rz = rz_new
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    arr[mutable] = x
+    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
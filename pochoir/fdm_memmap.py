@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using numpy
+on arrays kept out of core in memory-mapped files.
+
+The potential is held in two .npy files in a scratch directory and
+only a few planes are in memory.  The planes are streamed along one
+axis (the "stream axis") with a wavefront: as plane i of one step is
+read, plane i-1 of the next step is computed from it and its
+neighbors, plane i-2 of the step after that and so on.  A pass over
+the files thus takes k steps while each plane is read and written
+once, and only three planes of each of the k steps are in memory.
+
+The stream axis is the first with fixed or mirror edges and without
+graded spacing.  The files are ordered with it first so a plane is
+contiguous.  Every cell gets the same operations as in fdm_numpy so
+the result is identical.
+'''
+
+import logging
+import os
+import re
+import tempfile
+import numpy
+from numpy.lib import format
+
+from .fdm_generic import edge_condition1, stencil
+
+log = logging.getLogger(__name__)
+
+
+def parse_size(text):
+    '''
+    Return number of bytes from a string like "512M" or "4GB".
+
+    The suffixes K, M, G and T are powers of 1024.  A plain number
+    is a number of bytes.
+    '''
+    got = re.match(r'^\s*([0-9.]+)\s*([kmgt]?)i?b?\s*$', str(text), re.I)
+    if not got:
+        raise ValueError(f'unsupported memory size: {text}')
+    power = " kmgt".index(got.group(2).lower() or " ")
+    return int(float(got.group(1)) * 1024**power)
+
+
+def stream_axis(periodic, spacing=None):
+    '''
+    Return the axis along which planes are streamed.
+    '''
+    for dim, per in enumerate(periodic):
+        if per:
+            continue
+        if spacing is not None and numpy.ndim(spacing[dim]) > 0:
+            continue
+        return dim
+    raise ValueError("the memmap engine needs a dimension with fixed or mirror edges and without graded spacing")
+
+
+def footprint(plane, dtype, nsteps):
+    '''
+    Return the number of bytes in memory to take nsteps per pass over
+    planes of the given shape.
+    '''
+    size = int(numpy.prod(plane))
+    padded = int(numpy.prod([n+2 for n in plane]))
+    item = numpy.dtype(dtype).itemsize
+    # three planes per step (the first are copies of the planes read),
+    # the new plane and the last one written, the increment, two
+    # temporaries of the stencil, a window of three padded planes and
+    # one mask plane per step and one
+    return (3*nsteps + 5)*size*item + 3*padded*item + (nsteps + 1)*size
+
+
+def blocking(plane, dtype, max_memory=None, time_block=None, most=8):
+    '''
+    Return the number of steps per pass.
+
+    This is time_block if given, else the most steps up to most which
+    fit max_memory bytes, else 4.
+    '''
+    if time_block:
+        if time_block < 1:
+            raise ValueError(f'time block must be at least one step: {time_block}')
+        need = footprint(plane, dtype, time_block)
+        if max_memory and need > max_memory:
+            raise ValueError(f'{time_block} steps per pass need {need} bytes > max memory {max_memory}')
+        return time_block
+    if not max_memory:
+        return 4
+    fits = [k for k in range(1, most+1)
+            if footprint(plane, dtype, k) <= max_memory]
+    if not fits:
+        need = footprint(plane, dtype, 1)
+        raise ValueError(f'one plane pass needs {need} bytes > max memory {max_memory}')
+    return fits[-1]
+
+
+def sweep(src, dst, fixed, nsteps, axis, periodic, mirror, spacing=None,
+          errs=None):
+    '''
+    Write nsteps Jacobi steps of src to dst in one pass over planes.
+
+    The src, dst and fixed are arrays with the stream axis first and
+    the others in order.  The stencil sees a window of three planes
+    with the axes in the original order.  If errs is given the
+    increment of the last step is written to it and its max absolute
+    value returned.
+    '''
+    n = src.shape[0]
+    plane = src.shape[1:]
+    ndim = len(periodic)
+    window = numpy.zeros((3,) + tuple([s+2 for s in plane]), dtype=src.dtype)
+    core = window[(slice(None),) + tuple([slice(1, s+1) for s in plane])]
+    view = numpy.moveaxis(window, 0, axis)
+    others = [d for d in range(ndim) if d != axis]
+    inc = numpy.zeros(plane, dtype=src.dtype)
+
+    # rings of three planes of each step before the last, by index % 3
+    levels = [[None]*3 for _ in range(nsteps)]
+    masks = [None]*(nsteps+1)
+    maxerr = 0.0
+    for i in range(n + nsteps):
+        if i < n:
+            levels[0][i % 3] = numpy.array(src[i])
+            masks[i % (nsteps+1)] = numpy.array(fixed[i])
+        for step in range(1, nsteps+1):
+            j = i - step
+            if j < 0 or j >= n:
+                continue
+            ring = levels[step-1]
+            lo = j-1 if j > 0 else (1 if mirror[axis] else 0)
+            hi = j+1 if j < n-1 else (n-2 if mirror[axis] else n-1)
+            for w, p in enumerate((lo, j, hi)):
+                core[w] = ring[p % 3]
+            for dim in others:
+                edge_condition1(view, dim, periodic[dim], mirror[dim])
+            new = stencil(view, spacing=spacing).reshape(plane)
+            old = ring[j % 3]
+            numpy.copyto(new, old, where=masks[j % (nsteps+1)])
+            if step < nsteps:
+                levels[step][j % 3] = new
+                continue
+            dst[j] = new
+            if errs is not None:
+                numpy.subtract(new, old, out=inc)
+                errs[j] = inc
+                maxerr = max(maxerr, float(inc.max()), -float(inc.min()))
+    return maxerr
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, max_memory=None,
+          time_block=None, workdir=None, dtype=None, convergence=None,
+          spacing=None, mirror=None):
+    '''
+    Solve boundary value problem out of core.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values.  It may be any array
+          which can be sliced, eg an HDF5 dataset, and is read one
+          plane at a time.
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).  It is read like iarr.
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - max_memory optionally bounds the number of bytes of planes
+          in memory, see footprint().
+
+        - time_block gives the number of steps per pass over the
+          files (def: the most up to 8 fitting max_memory, else 4).
+
+        - workdir gives the directory holding the scratch files
+          (def: the system temporary directory).
+
+        - dtype gives the dtype of the solution (def: that of iarr).
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).  It is given memory maps in
+          the original order of axes and a criterion other than the
+          increment reads them whole.
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.stencil().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.  Both are memory maps of files which
+    are already removed from workdir so they last as long as the
+    arrays.
+    '''
+    shape = tuple(iarr.shape)
+    ndim = len(shape)
+    if len(periodic) != ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {ndim}")
+    if mirror is None:
+        mirror = [False]*ndim
+    dtype = numpy.dtype(dtype or iarr.dtype)
+    axis = stream_axis(periodic, spacing)
+    n = shape[axis]
+    plane = tuple([s for d, s in enumerate(shape) if d != axis])
+    nsteps = blocking(plane, dtype, max_memory, time_block)
+    log.info(f'memmap: stream axis {axis}, {nsteps} steps per pass, '
+             f'{footprint(plane, dtype, nsteps)} bytes in memory')
+
+    def along(j):
+        ind = [slice(None)]*ndim
+        ind[axis] = j
+        return tuple(ind)
+
+    with tempfile.TemporaryDirectory(prefix="pochoir-memmap-", dir=workdir) as tmp:
+
+        def create(name, shape, dtype):
+            path = os.path.join(tmp, name + ".npy")
+            return format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+        bufs = [create(f'potential{i}', (n,)+plane, dtype) for i in range(2)]
+        fixed = create('fixed', (n,)+plane, bool)
+        errs = create('increment', (n,)+plane, dtype)
+        for j in range(n):
+            bufs[0][j] = numpy.asarray(iarr[along(j)], dtype=dtype)
+            fixed[j] = numpy.asarray(barr[along(j)], dtype=bool)
+
+        cur = 0
+        maxerr = None
+        for iepoch in range(nepochs):
+            log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+            for beg in range(0, epoch, nsteps):
+                nblock = min(nsteps, epoch - beg)
+                last = beg + nblock == epoch
+                got = sweep(bufs[cur], bufs[1-cur], fixed, nblock, axis,
+                            periodic, mirror, spacing, errs if last else None)
+                cur = 1-cur
+                if last:
+                    maxerr = got
+            if convergence:
+                maxerr = convergence(numpy.moveaxis(bufs[cur], 0, axis),
+                                     numpy.moveaxis(errs, 0, axis))
+            if prec and maxerr < prec:
+                log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                break
+        else:
+            log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+
+        if axis == 0:
+            return (bufs[cur], errs)
+
+        # back to the original order of axes
+        arr = create('arr', shape, dtype)
+        err = create('err', shape, dtype)
+        for j in range(n):
+            arr[along(j)] = bufs[cur][j]
+            err[along(j)] = errs[j]
+        return (arr, err)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+'''
+Apply geometric multigrid to solve Laplace boundary value problem
+using numpy.
+
+The grid hierarchy is cell-centered.  Along every axis which is still
+longer than two cells, each coarse cell covers two fine cells (one for
+the last cell of an odd axis).  A coarse cell is a boundary cell if any
+of its fine cells are.  Edge conditions are applied on every level
+with edge_condition() so "periodic" and "fixed" edges mean the same as
+for the relaxation engines.
+
+Marking a coarse cell fixed when any of its fine cells are moves thin
+electrodes and walls on coarse levels and a plain multigrid iteration
+can then converge slowly or even diverge.  The cycles are therefore
+used as a symmetric preconditioner for conjugate gradient iterations
+which converge for any such coarse problem.
+'''
+
+import logging
+import numpy
+
+from pochoir import arrays
+
+from .fdm_generic import edge_condition, is_graded
+
+log = logging.getLogger(__name__)
+
+cycles = ("V", "W", "FMG")
+
+
+def restrict(arr, axes, reduce=numpy.mean):
+    '''
+    Return arr coarsened by two along each of the given axes.
+
+    The reduce function combines pairs of fine cells.  An odd axis
+    has its last cell paired with itself.
+    '''
+    for dim in axes:
+        n = arr.shape[dim]
+        if n % 2:
+            last = [slice(None)]*arr.ndim
+            last[dim] = slice(n-1, n)
+            arr = numpy.concatenate((arr, arr[tuple(last)]), axis=dim)
+        shape = arr.shape[:dim] + (arr.shape[dim]//2, 2) + arr.shape[dim+1:]
+        arr = reduce(arr.reshape(shape), axis=dim+1)
+    return arr
+
+
+def restrict_adjoint(arr, axes, periodic):
+    '''
+    Return arr coarsened by two along each of the given axes as the
+    transpose of prolong() scaled by 1/2 per axis.
+
+    This is used to restrict residuals so that the cycle remains a
+    symmetric operator.
+    '''
+    for dim in axes:
+        n = arr.shape[dim]
+        if n % 2:
+            zero = numpy.zeros(arr.shape[:dim] + (1,) + arr.shape[dim+1:])
+            arr = numpy.concatenate((arr, zero), axis=dim)
+        m = arr.shape[dim]//2
+        pairs = arr.reshape(arr.shape[:dim] + (m, 2) + arr.shape[dim+1:])
+        even = numpy.take(pairs, 0, axis=dim+1)
+        odd = numpy.take(pairs, 1, axis=dim+1)
+
+        # the fine neighbors on either side which interpolate from
+        # a coarse cell, and those from beyond the edge.
+        below = numpy.roll(odd, 1, axis=dim)
+        above = numpy.roll(even, -1, axis=dim)
+        if not periodic[dim]:
+            first = [slice(None)]*arr.ndim
+            first[dim] = slice(0, 1)
+            first = tuple(first)
+            last = [slice(None)]*arr.ndim
+            last[dim] = slice(m-1, m)
+            last = tuple(last)
+            below[first] = even[first]
+            above[last] = odd[last]
+        arr = 0.5*(0.75*(even + odd) + 0.25*(below + above))
+    return arr
+
+
+def prolong(arr, axes, shape, periodic):
+    '''
+    Return arr refined by two along each of the given axes and
+    cropped to shape.
+
+    Fine values linearly interpolate between a coarse cell and its
+    neighbor with weights 3/4 and 1/4.  The neighbor beyond the edge
+    is provided as in edge_condition().
+    '''
+    for dim in axes:
+        n = arr.shape[dim]
+        def take(beg, end):
+            slc = [slice(None)]*arr.ndim
+            slc[dim] = slice(beg, end)
+            return arr[tuple(slc)]
+        if periodic[dim]:
+            ext = (take(n-1, n), arr, take(0, 1))
+        else:
+            ext = (take(0, 1), arr, take(n-1, n))
+        ext = numpy.concatenate(ext, axis=dim)
+
+        def ext_take(beg, end):
+            slc = [slice(None)]*ext.ndim
+            slc[dim] = slice(beg, end)
+            return ext[tuple(slc)]
+        mid = 0.75*arr
+        lo = mid + 0.25*ext_take(0, n)
+        hi = mid + 0.25*ext_take(2, n+2)
+        fine = numpy.stack((lo, hi), axis=dim+1)
+        fine = fine.reshape(arr.shape[:dim] + (2*n,) + arr.shape[dim+1:])
+
+        crop = [slice(None)]*arr.ndim
+        crop[dim] = slice(0, shape[dim])
+        arr = fine[tuple(crop)]
+    return arr
+
+
+class Level:
+    '''
+    One grid in the multigrid hierarchy.
+
+    The level holds a padded potential (or correction) array, a core
+    sized source array and the boundary mask.  It solves
+
+        sum_d w_d (u[i+1] + u[i-1] - 2 u[i]) = src[i]
+
+    on mutable cells with w_d = 1/spacing_d^2.
+    '''
+
+    def __init__(self, fixed, spacing, periodic):
+        self.fixed = fixed
+        self.mutable = numpy.invert(fixed)
+        self.spacing = numpy.array(spacing, dtype=float)
+        self.periodic = periodic
+        self.shape = fixed.shape
+
+        self.pot = numpy.zeros([s+2 for s in self.shape])
+        self.src = numpy.zeros(self.shape)
+        self.core = arrays.core_slices1(self.pot)
+
+        self.weights = 1.0/self.spacing**2
+        self.diag = 2*self.weights.sum()
+
+        # checkerboard coloring of mutable cells
+        parity = numpy.zeros(self.shape, dtype=bool)
+        for dim, n in enumerate(self.shape):
+            odd = numpy.arange(n) % 2 == 1
+            view = [1]*len(self.shape)
+            view[dim] = n
+            parity = parity ^ odd.reshape(view)
+        self.colors = (self.mutable & ~parity, self.mutable & parity)
+
+        # axes to coarsen to reach the next level
+        self.axes = [d for d, n in enumerate(self.shape) if n > 2]
+
+    def coarsen(self):
+        '''
+        Return the next coarser level or None if this is the coarsest.
+        '''
+        if not self.axes:
+            return None
+        fixed = restrict(self.fixed, self.axes, numpy.any)
+        spacing = numpy.array(self.spacing)
+        spacing[self.axes] *= 2
+        return Level(fixed, spacing, self.periodic)
+
+    def neighbors(self):
+        '''
+        Return weighted sum of neighbors of each core cell.
+        '''
+        pot = self.pot
+        edge_condition(pot, *self.periodic)
+        slices = list(self.core)
+        res = numpy.zeros(self.shape)
+        for dim, n in enumerate(pot.shape):
+            pos = list(slices)
+            pos[dim] = slice(2, n)
+            neg = list(slices)
+            neg[dim] = slice(0, n-2)
+            res += self.weights[dim]*(pot[tuple(pos)] + pot[tuple(neg)])
+        return res
+
+    def smooth(self, nsweeps, order=(0, 1)):
+        '''
+        Apply red-black Gauss-Seidel sweeps.
+
+        The order gives the sequence of colors in one sweep.
+        '''
+        core = self.pot[self.core]
+        for isweep in range(nsweeps):
+            for color in order:
+                new = (self.neighbors() - self.src)/self.diag
+                numpy.copyto(core, new, where=self.colors[color])
+
+    def residual(self):
+        '''
+        Return residual on core cells, zero on fixed cells.
+        '''
+        res = self.src - self.neighbors() + self.diag*self.pot[self.core]
+        res[self.fixed] = 0
+        return res
+
+    def apply(self, arr):
+        '''
+        Return the negative Laplacian of core array arr.
+
+        This is the positive definite operator on mutable cells which
+        conjugate gradient iterates on.  Fixed cells are zero.
+        '''
+        self.pot[self.core] = arr
+        res = self.diag*arr - self.neighbors()
+        res[self.fixed] = 0
+        return res
+
+
+def hierarchy(barr, spacing, periodic):
+    '''
+    Return list of levels, finest first.
+    '''
+    levels = [Level(numpy.array(barr, dtype=bool), spacing, periodic)]
+    while True:
+        coarse = levels[-1].coarsen()
+        if coarse is None:
+            break
+        levels.append(coarse)
+    return levels
+
+
+def cycle(levels, ind=0, gamma=1, nu=2, ncoarse=20):
+    '''
+    Apply one multigrid cycle to levels[ind].
+
+    A gamma of 1 gives a V-cycle, 2 gives a W-cycle.  Post-smoothing
+    visits the colors in reverse order of pre-smoothing so the cycle
+    is a symmetric operator.
+    '''
+    lev = levels[ind]
+    if ind+1 == len(levels):
+        lev.smooth(ncoarse, (0, 1))
+        lev.smooth(ncoarse, (1, 0))
+        return
+
+    lev.smooth(nu, (0, 1))
+
+    coarse = levels[ind+1]
+    coarse.src[:] = restrict_adjoint(lev.residual(), lev.axes, lev.periodic)
+    coarse.src[coarse.fixed] = 0
+    coarse.pot[:] = 0
+    for _ in range(gamma):
+        cycle(levels, ind+1, gamma, nu, ncoarse)
+
+    corr = prolong(coarse.pot[coarse.core], lev.axes, lev.shape, lev.periodic)
+    corr[lev.fixed] = 0
+    lev.pot[lev.core] += corr
+
+    lev.smooth(nu, (1, 0))
+
+
+def precondition(levels, res, gamma=1):
+    '''
+    Return approximate solution of apply(x) = res by one cycle.
+    '''
+    top = levels[0]
+    top.pot[:] = 0
+    top.src[:] = -res
+    cycle(levels, gamma=gamma)
+    return numpy.array(top.pot[top.core])
+
+
+def fmg(levels, iarr, ncoarse=20):
+    '''
+    Set the potential of the finest level by full multigrid.
+
+    The initial values and boundary are restricted to every level,
+    the coarsest is relaxed and each finer level starts from the
+    prolonged coarser solution followed by one V-cycle.
+    '''
+    # restrict fixed values as the mean over fixed fine cells
+    values = [numpy.array(iarr, dtype=float)]
+    for lev, coarse in zip(levels[:-1], levels[1:]):
+        fine = values[-1]
+        tot = restrict(fine*lev.fixed, lev.axes, numpy.sum)
+        num = restrict(lev.fixed.astype(float), lev.axes, numpy.sum)
+        avg = restrict(fine, lev.axes)
+        values.append(numpy.where(coarse.fixed, tot/numpy.maximum(num, 1), avg))
+
+    last = levels[-1]
+    last.pot[last.core] = values[-1]
+    last.src[:] = 0
+    last.smooth(ncoarse)
+
+    for ind in range(len(levels)-2, -1, -1):
+        lev = levels[ind]
+        coarse = levels[ind+1]
+        guess = prolong(coarse.pot[coarse.core], lev.axes, lev.shape, lev.periodic)
+        lev.pot[lev.core] = numpy.where(lev.fixed, values[ind], guess)
+        lev.src[:] = 0
+        cycle(levels, ind, ncoarse=ncoarse)
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs,
+          cycle_type="V", spacing=None, convergence=None, mirror=None):
+    '''
+    Solve boundary value problem with multigrid preconditioned
+    conjugate gradient.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iterations per precision check.  Each
+          iteration applies one multigrid cycle.
+
+        - nepochs limits the number of epochs
+
+        - cycle_type is one of "V", "W" or "FMG".  FMG provides the
+          starting potential by full multigrid and then applies V-cycles.
+
+        - spacing gives optional per-dimension grid spacing.
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - mirror edges are not supported and must not be given.
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+    '''
+    if cycle_type not in cycles:
+        raise ValueError(f'unknown multigrid cycle: {cycle_type}')
+    gamma = 2 if cycle_type == "W" else 1
+
+    if spacing is None:
+        spacing = numpy.ones(iarr.ndim)
+    if is_graded(spacing):
+        raise ValueError("multigrid does not support graded spacing")
+    if mirror is not None and any(mirror):
+        raise ValueError("multigrid does not support mirror edges")
+    levels = hierarchy(barr, spacing, periodic)
+    top = levels[0]
+    log.info(f'multigrid: {len(levels)} levels, coarsest {levels[-1].shape}')
+
+    if cycle_type == "FMG":
+        fmg(levels, iarr)
+        arr = numpy.array(top.pot[top.core])
+        arr[top.fixed] = iarr[top.fixed]
+    else:
+        arr = numpy.array(iarr, dtype=float)
+
+    # conjugate gradient on the mutable cells
+    res = -top.apply(arr)
+    z = precondition(levels, res, gamma)
+    step = numpy.array(z)
+    rz = numpy.sum(res*z)
+
+    err = numpy.zeros(iarr.shape)
+    maxerr = None
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        for istep in range(epoch):
+            if rz == 0:
+                log.info('fdm reach exact solution')
+                return (arr.astype(iarr.dtype), numpy.zeros_like(iarr))
+
+            q = top.apply(step)
+            alpha = rz/numpy.sum(step*q)
+            inc = alpha*step
+            arr += inc
+            res -= alpha*q
+
+            if epoch-istep == 1: # last in the epoch
+                err = inc
+                maxerr = numpy.max(numpy.abs(err))
+                if convergence:
+                    maxerr = convergence(arr, err)
+                if prec and maxerr < prec:
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+
+            z = precondition(levels, res, gamma)
+            rz_new = numpy.sum(res*z)
+            step *= rz_new/rz
+            step += z
+            rz = rz_new
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
@@ -3,6 +3,7 @@
 Apply FDM solution to solve Laplace boundary value problem using numba
 '''
 import numba
+from .fdm_generic import weights
 
 @numba.stencil
 def _lap2d(a):
@@ -17,15 +18,35 @@ def _lap3d(a):
         a[0, 1, 0] + a[0, -1, 0] +
         a[1, 0, 0] + a[-1, 0, 0]
     )
+@numba.stencil
+def _wlap2d(a, w0, w1):
+    return (w0 * (a[1, 0] + a[-1, 0]) +
+            w1 * (a[0, 1] + a[0, -1]))
+@numba.stencil
+def _wlap3d(a, w0, w1, w2):
+    return (w0 * (a[1, 0, 0] + a[-1, 0, 0]) +
+            w1 * (a[0, 1, 0] + a[0, -1, 0]) +
+            w2 * (a[0, 0, 1] + a[0, 0, -1]))
 @numba.njit
 def stencil_numba2d_jit(a):
     return _lap2d(a)
 @numba.njit
 def stencil_numba3d_jit(a):
     return _lap3d(a)
+@numba.njit
+def wstencil_numba2d_jit(a, w0, w1):
+    return _wlap2d(a, w0, w1)
+@numba.njit
+def wstencil_numba3d_jit(a, w0, w1, w2):
+    return _wlap3d(a, w0, w1, w2)
 
-def stencil(a):
-    if a.ndim == 2:
+def stencil(a, spacing=None):
+    if spacing is not None:
+        if a.ndim == 2:
+            a = wstencil_numba2d_jit(a, *weights(spacing))
+        else:
+            a = wstencil_numba3d_jit(a, *weights(spacing))
+    elif a.ndim == 2:
         a = stencil_numba2d_jit(a)
     else:
         a = stencil_numba3d_jit(a)
@@ -36,6 +57,9 @@ def stencil(a):
 
 from pochoir.fdm_numpy import solve as solve_numpy
 def solve(iarr, barr, periodic, prec, epoch, nepochs,
-          stencil = stencil):
+          stencil = stencil, convergence = None, accelerate = None,
+          spacing = None, mirror = None):
     return solve_numpy(iarr, barr, periodic, prec, epoch, nepochs,
-                       stencil = stencil)
+                       stencil = stencil, convergence = convergence,
+                       accelerate = accelerate, spacing = spacing,
+                       mirror = mirror)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using numba
+with temporal blocking.
+
+A Jacobi step streams the whole array through memory.  Here the array
+is split into tiles along all its axes, longer along the contiguous
+last axis.  Each tile is copied with a halo of k cells into a local
+window which takes k Jacobi steps before the tile is written back, so
+the array is streamed once per k steps.  The steps in a window are
+done over a shrinking region (a trapezoid) as cells at distance d from
+the open side of the window are only correct for k-d steps.  The
+tiles are independent and run in parallel.  Each thread reuses its
+windows, which are sized to stay in cache, over its tiles and blocks.
+
+The edge conditions are those of the other engines (fixed, periodic
+or mirror) and every cell gets the same operations as in
+fdm_numba_fused.
+'''
+
+import logging
+import time
+import numpy
+import numba
+
+from .fdm_generic import weights
+from .fdm_numba_fused import neighbor_index
+
+log = logging.getLogger(__name__)
+
+# bytes of the windows of one thread
+cache = 2**21
+
+
+def windows(n, tile, halo, periodic, mirror=False):
+    '''
+    Return arrays describing the window of each tile along an axis
+    of n cells.
+
+    Return (index, lo, hi, size, offset, count).  Row t of index
+    gives the cell of each of the size[t] window positions of tile t,
+    wrapping if periodic and else clipped to the axis.  Rows of lo and
+    hi give the window position of the neighbor below and above each
+    position, as by neighbor_index() at an edge of the axis and else
+    the next position, which is the position itself at the open end
+    of the window.  The tile itself has count[t] positions starting at
+    offset[t].
+    '''
+    tiles = list()
+    for beg in range(0, n, tile):
+        end = min(beg + tile, n)
+        if periodic:
+            cells = numpy.arange(beg - halo, end + halo) % n
+            first = beg - halo
+        else:
+            first = max(beg - halo, 0)
+            cells = numpy.arange(first, min(end + halo, n))
+        size = len(cells)
+        pos = numpy.arange(size)
+        lo = numpy.maximum(pos - 1, 0)
+        hi = numpy.minimum(pos + 1, size - 1)
+        if not periodic:
+            elo, ehi = neighbor_index(n, False, mirror)
+            at = cells == 0
+            lo[at] = pos[at] + elo[0]
+            at = cells == n-1
+            hi[at] = pos[at] + ehi[-1] - (n-1)
+        tiles.append((cells, lo, hi, size, beg - first, end - beg))
+
+    width = max([one[3] for one in tiles])
+    ret = [numpy.zeros((len(tiles), width), dtype=numpy.int64) for _ in range(3)]
+    for ind, (cells, lo, hi, size, _, _) in enumerate(tiles):
+        for arr, val in zip(ret, (cells, lo, hi)):
+            arr[ind, :size] = val
+    ret += [numpy.array([one[i] for one in tiles], dtype=numpy.int64)
+            for i in (3, 4, 5)]
+    return ret
+
+
+@numba.njit(cache=True)
+def gather(dst, src, cells):
+    '''
+    Set dst to the values of src at the cells which follow each other,
+    wrapping at the end of src, in contiguous runs.
+    '''
+    n = len(src)
+    k = 0
+    while k < len(dst):
+        run = min(len(dst) - k, n - cells[k])
+        dst[k:k+run] = src[cells[k]:cells[k]+run]
+        k += run
+
+
+@numba.njit(cache=True)
+def scatter(dst, src, cells):
+    '''
+    Set dst at the cells which follow each other, wrapping at the end
+    of dst, to the values of src in contiguous runs.
+    '''
+    n = len(dst)
+    k = 0
+    while k < len(src):
+        run = min(len(src) - k, n - cells[k])
+        dst[cells[k]:cells[k]+run] = src[k:k+run]
+        k += run
+
+
+@numba.njit(parallel=True, cache=True)
+def block(src, dst, prev, mutable, wts, scratch,
+          cells0, lo0, hi0, size0, off0, cnt0,
+          cells1, lo1, hi1, size1, off1, cnt1,
+          cells2, lo2, hi2, size2, off2, cnt2,
+          nsteps, keep, tilemax):
+    '''
+    Write nsteps Jacobi steps of src into dst tile by tile and set
+    the max change of the last step in each tile in tilemax.  If keep,
+    the penultimate step is written to prev.
+
+    Each of the first dimension of scratch does every so many tiles
+    with two windows of values and one of mutable.
+    '''
+    w0 = wts[0]
+    w1 = wts[1]
+    w2 = wts[2]
+    nt1 = len(size1)
+    nt2 = len(size2)
+    ntiles = len(size0)*nt1*nt2
+    nchunks = scratch.shape[0]
+    for chunk in numba.prange(nchunks):
+        a = scratch[chunk, 0]
+        b = scratch[chunk, 1]
+        mwin = scratch[chunk, 2]
+        for t in range(chunk, ntiles, nchunks):
+            t0 = t // (nt1*nt2)
+            t1 = (t // nt2) % nt1
+            t2 = t % nt2
+            m0 = size0[t0]
+            m1 = size1[t1]
+            m2 = size2[t2]
+            c0 = cells0[t0]
+            c1 = cells1[t1]
+            c2 = cells2[t2]
+            for i in range(m0):
+                for j in range(m1):
+                    gather(a[i, j, :m2], src[c0[i], c1[j]], c2[:m2])
+                    gather(mwin[i, j, :m2], mutable[c0[i], c1[j]], c2[:m2])
+
+            big = 0.0
+            for s in range(nsteps):
+                # the region still correct after this step
+                ext = nsteps - 1 - s
+                i0 = max(off0[t0] - ext, 0)
+                i1 = min(off0[t0] + cnt0[t0] + ext, m0)
+                j0 = max(off1[t1] - ext, 0)
+                j1 = min(off1[t1] + cnt1[t1] + ext, m1)
+                k0 = max(off2[t2] - ext, 0)
+                k1 = min(off2[t2] + cnt2[t2] + ext, m2)
+                kc0 = off2[t2]
+                kc1 = off2[t2] + cnt2[t2]
+                last = s == nsteps - 1
+                if last and keep:
+                    for i in range(off0[t0], off0[t0] + cnt0[t0]):
+                        for j in range(off1[t1], off1[t1] + cnt1[t1]):
+                                scatter(prev[c0[i], c1[j]], a[i, j, kc0:kc1], c2[kc0:kc1])
+                for i in range(i0, i1):
+                    for j in range(j0, j1):
+                        below = a[lo0[t0, i], j]
+                        above = a[hi0[t0, i], j]
+                        left = a[i, lo1[t1, j]]
+                        right = a[i, hi1[t1, j]]
+                        row = a[i, j]
+                        out = b[i, j]
+                        mut = mwin[i, j]
+                        center = last and off0[t0] <= i < off0[t0] + cnt0[t0] \
+                            and off1[t1] <= j < off1[t1] + cnt1[t1]
+                        # the ends of the window have their neighbors
+                        # through an edge or are its open ends
+                        for k in (0, m2-1):
+                            if k0 <= k < k1:
+                                dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                                              w2*(row[lo2[t2, k]] + row[hi2[t2, k]]) - row[k])
+                                out[k] = row[k] + dif
+                                if center and kc0 <= k < kc1:
+                                    big = max(big, abs(dif))
+                        for k in range(max(k0, 1), min(k1, m2-1)):
+                            dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                                          w2*(row[k-1] + row[k+1]) - row[k])
+                            out[k] = row[k] + dif
+                            if center and kc0 <= k < kc1:
+                                big = max(big, abs(dif))
+                a, b = b, a
+
+            for i in range(off0[t0], off0[t0] + cnt0[t0]):
+                for j in range(off1[t1], off1[t1] + cnt1[t1]):
+                    scatter(dst[c0[i], c1[j]], a[i, j, kc0:kc1], c2[kc0:kc1])
+            tilemax[t] = big
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, time_block=4,
+          tile=32, threads=None, convergence=None, spacing=None,
+          mirror=None):
+    '''
+    Solve boundary value problem with temporally blocked Jacobi steps.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - time_block gives the number of steps taken by a tile
+          before it is written back (the last block of an epoch may
+          be shorter).
+
+        - tile gives the number of cells along each side of a tile
+          over the first two dimensions (the first of a 2D array).
+          Along the last dimension a tile is longer if the windows of
+          a thread still fit in "cache" bytes.
+
+        - threads limits the number of numba threads (def: all).
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.weights().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Sweeps are done in float32 if iarr is float32, else in float64.
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+
+    The sustained rate of cell updates per second is logged at the end.
+    '''
+    if iarr.ndim not in (2, 3):
+        raise ValueError(f'unsupported dimensions: {iarr.ndim}')
+    if len(periodic) != iarr.ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {iarr.ndim}")
+    if time_block < 1:
+        raise ValueError(f'time block must be at least one step: {time_block}')
+    previous = numba.get_num_threads()
+    if threads:
+        numba.set_num_threads(threads)
+    try:
+        nthreads = numba.get_num_threads()
+        if spacing is None:
+            spacing = [1.0]*iarr.ndim
+        if mirror is None:
+            mirror = [False]*iarr.ndim
+        wts = list(weights(spacing))
+        periodic = list(periodic)
+        mirror = list(mirror)
+
+        # a 2D array is done as 3D with one fixed, unweighted middle cell
+        shape = iarr.shape
+        if iarr.ndim == 2:
+            shape = (shape[0], 1, shape[1])
+            wts.insert(1, 0.0)
+            periodic.insert(1, False)
+            mirror.insert(1, False)
+
+        dtype = numpy.float32 if iarr.dtype == numpy.float32 else numpy.float64
+        bufs = [numpy.array(iarr, dtype=dtype).reshape(shape) for _ in range(2)]
+        prev = numpy.array(bufs[0])
+        mutable = numpy.invert(numpy.asarray(barr, dtype=bool)).astype(dtype).reshape(shape)
+        wts = numpy.array(wts, dtype=dtype)
+        tiles = [windows(n, tile, time_block, per, mir)
+                 for n, per, mir in zip(shape[:2], periodic[:2], mirror[:2])]
+        # the contiguous last axis has tiles as long as the windows of a
+        # thread fit the cache budget
+        rows = tiles[0][3].max()*tiles[1][3].max()
+        tile2 = max(tile, cache//(3*rows*numpy.dtype(dtype).itemsize) - 2*time_block)
+        tiles.append(windows(shape[2], tile2, time_block, periodic[2], mirror[2]))
+        tilemax = numpy.zeros(len(tiles[0][3])*len(tiles[1][3])*len(tiles[2][3]))
+        # the windows of each thread
+        nchunks = min(nthreads, len(tilemax))
+        scratch = numpy.empty((nchunks, 3) + tuple([one[3].max() for one in tiles]),
+                              dtype=dtype)
+        nmutable = int(numpy.count_nonzero(mutable))
+        log.info(f'numba-blocked: {len(tilemax)} tiles, {time_block} steps per block')
+
+        cur = 0
+        nsteps = 0
+        start = None
+        maxerr = None
+        done = False
+        for iepoch in range(nepochs):
+            log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+            for beg in range(0, epoch, time_block):
+                nblock = min(time_block, epoch - beg)
+                block(bufs[cur], bufs[1-cur], prev, mutable, wts, scratch,
+                      *tiles[0], *tiles[1], *tiles[2], nblock, beg + nblock == epoch,
+                      tilemax)
+                cur = 1-cur
+                if start is None:   # exclude JIT compilation
+                    start = time.perf_counter()
+                else:
+                    nsteps += nblock
+            maxerr = tilemax.max()
+            if convergence:
+                arr = bufs[cur].reshape(iarr.shape)
+                maxerr = convergence(arr, arr - prev.reshape(iarr.shape))
+            if prec and maxerr < prec:
+                log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                done = True
+                break
+
+        if nsteps:
+            rate = nsteps*nmutable/(time.perf_counter() - start)
+            log.info(f'numba-blocked: {rate:.3e} cell-updates/s with {nthreads} threads')
+        if not done:
+            log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+        arr = bufs[cur].reshape(iarr.shape)
+        err = arr - prev.reshape(iarr.shape)
+        return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+    finally:
+        numba.set_num_threads(previous)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using a
+fused, allocation-free numba kernel.
+
+One kernel call does a full Jacobi step: it reads one buffer and
+writes the other, applies the stencil, keeps fixed values (their
+change is multiplied by zero) and applies the edge condition.  No
+padding is used.  Instead, the neighbor beyond an edge is found
+through per-axis index arrays which give the same cell as
+edge_condition(): the cell at the other end for a periodic dimension,
+the edge cell itself for a fixed dimension and the cell next to it for
+a mirror dimension.
+
+The outermost axis is split over threads with prange.
+'''
+
+import logging
+import time
+import numpy
+import numba
+
+from .fdm_generic import weights
+
+log = logging.getLogger(__name__)
+
+
+def neighbor_index(n, periodic, mirror=False):
+    '''
+    Return (lo, hi) index arrays giving the neighbor below and above
+    each of n cells along an axis.
+    '''
+    ind = numpy.arange(n)
+    if periodic:
+        return numpy.roll(ind, 1), numpy.roll(ind, -1)
+    if mirror:
+        return numpy.abs(ind-1), n-1 - numpy.abs(n-2 - ind)
+    return numpy.maximum(ind-1, 0), numpy.minimum(ind+1, n-1)
+
+
+@numba.njit(parallel=True, cache=True)
+def step2d(src, dst, mutable, wts, lo0, hi0, lo1, hi1, rowmax):
+    '''
+    Write one Jacobi step of src into dst and return max change.
+    '''
+    n0, n1 = src.shape
+    w0 = wts[0]
+    w1 = wts[1]
+    for i in numba.prange(n0):
+        below = src[lo0[i]]
+        above = src[hi0[i]]
+        row = src[i]
+        out = dst[i]
+        mut = mutable[i]
+        big = 0.0
+        # the ends of the row have neighbors through the edge
+        for j in (0, n1-1):
+            dif = mut[j]*(w0*(below[j] + above[j]) + w1*(row[lo1[j]] + row[hi1[j]]) - row[j])
+            out[j] = row[j] + dif
+            big = max(big, abs(dif))
+        for j in range(1, n1-1):
+            dif = mut[j]*(w0*(below[j] + above[j]) + w1*(row[j-1] + row[j+1]) - row[j])
+            out[j] = row[j] + dif
+            big = max(big, abs(dif))
+        rowmax[i] = big
+    return rowmax.max()
+
+
+@numba.njit(parallel=True, cache=True)
+def step3d(src, dst, mutable, wts, lo0, hi0, lo1, hi1, lo2, hi2, rowmax):
+    '''
+    Write one Jacobi step of src into dst and return max change.
+    '''
+    n0, n1, n2 = src.shape
+    w0 = wts[0]
+    w1 = wts[1]
+    w2 = wts[2]
+    for i in numba.prange(n0):
+        im = lo0[i]
+        ip = hi0[i]
+        big = 0.0
+        for j in range(n1):
+            below = src[im, j]
+            above = src[ip, j]
+            left = src[i, lo1[j]]
+            right = src[i, hi1[j]]
+            row = src[i, j]
+            out = dst[i, j]
+            mut = mutable[i, j]
+            for k in (0, n2-1):
+                dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                              w2*(row[lo2[k]] + row[hi2[k]]) - row[k])
+                out[k] = row[k] + dif
+                big = max(big, abs(dif))
+            for k in range(1, n2-1):
+                dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                              w2*(row[k-1] + row[k+1]) - row[k])
+                out[k] = row[k] + dif
+                big = max(big, abs(dif))
+        rowmax[i] = big
+    return rowmax.max()
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, threads=None,
+          convergence=None, spacing=None, mirror=None):
+    '''
+    Solve boundary value problem with fused numba Jacobi steps.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - threads limits the number of numba threads (def: all).
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.weights().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Sweeps are done in float32 if iarr is float32, else in float64.
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+
+    The sustained rate of cell updates per second is logged at the end.
+    '''
+    if iarr.ndim not in (2, 3):
+        raise ValueError(f'unsupported dimensions: {iarr.ndim}')
+    if len(periodic) != iarr.ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {iarr.ndim}")
+    previous = numba.get_num_threads()
+    if threads:
+        numba.set_num_threads(threads)
+    try:
+        nthreads = numba.get_num_threads()
+
+        # fixed cells have zero change so both buffers keep their values
+        dtype = numpy.float32 if iarr.dtype == numpy.float32 else numpy.float64
+        bufs = [numpy.array(iarr, dtype=dtype) for _ in range(2)]
+        mutable = numpy.invert(numpy.asarray(barr, dtype=bool)).astype(dtype)
+        if spacing is None:
+            spacing = [1.0]*iarr.ndim
+        wts = numpy.array(weights(spacing), dtype=dtype)
+        if mirror is None:
+            mirror = [False]*iarr.ndim
+        index = list()
+        for n, per, mir in zip(iarr.shape, periodic, mirror):
+            index += neighbor_index(n, per, mir)
+        rowmax = numpy.zeros(iarr.shape[0])
+        step = step2d if iarr.ndim == 2 else step3d
+        nmutable = int(numpy.count_nonzero(mutable))
+
+        cur = 0
+        nsteps = 0
+        start = None
+        maxerr = None
+        done = False
+        for iepoch in range(nepochs):
+            log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+            for istep in range(epoch):
+                maxerr = step(bufs[cur], bufs[1-cur], mutable, wts, *index, rowmax)
+                cur = 1-cur
+                if start is None:   # exclude JIT compilation
+                    start = time.perf_counter()
+                else:
+                    nsteps += 1
+            if convergence:
+                maxerr = convergence(bufs[cur], bufs[cur] - bufs[1-cur])
+            if prec and maxerr < prec:
+                log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                done = True
+                break
+
+        if nsteps:
+            rate = nsteps*nmutable/(time.perf_counter() - start)
+            log.info(f'numba-fused: {rate:.3e} cell-updates/s with {nthreads} threads')
+        if not done:
+            log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+        arr = bufs[cur]
+        err = arr - bufs[1-cur]
+        return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+    finally:
+        numba.set_num_threads(previous)
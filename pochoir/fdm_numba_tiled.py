@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using numba
+on an active set of tiles.
+
+The array is split into cubic tiles.  Jacobi steps only update the
+active tiles, in parallel over tiles, and record the max change in
+each.  At the end of each epoch a tile whose change is below a
+fraction of the precision becomes inactive and keeps its values.  An
+inactive tile becomes active again as soon as a neighboring tile
+changes by more than that threshold.
+
+Edge conditions are as in fdm_numba_fused.
+'''
+
+import logging
+import numpy
+import numba
+
+from .fdm_generic import weights
+from .fdm_numba_fused import neighbor_index
+
+log = logging.getLogger(__name__)
+
+
+@numba.njit(parallel=True, cache=True)
+def step2d(src, dst, mutable, wts, lo0, hi0, lo1, hi1, starts, size, tilemax):
+    '''
+    Write one Jacobi step of src into dst on the tiles starting at
+    starts and set the max change of each in tilemax.
+    '''
+    n0, n1 = src.shape
+    w0 = wts[0]
+    w1 = wts[1]
+    for t in numba.prange(starts.shape[0]):
+        j0 = starts[t, 1]
+        j1 = min(j0 + size, n1)
+        # cells with neighbors through the edge are done on their own
+        jlo = max(j0, 1)
+        jhi = min(j1, n1-1)
+        big = 0.0
+        for i in range(starts[t, 0], min(starts[t, 0] + size, n0)):
+            below = src[lo0[i]]
+            above = src[hi0[i]]
+            row = src[i]
+            out = dst[i]
+            mut = mutable[i]
+            for j in range(jlo, jhi):
+                dif = mut[j]*(w0*(below[j] + above[j]) + w1*(row[j-1] + row[j+1]) - row[j])
+                out[j] = row[j] + dif
+                big = max(big, abs(dif))
+            for j in (0, n1-1):
+                if j0 <= j < j1:
+                    dif = mut[j]*(w0*(below[j] + above[j]) + w1*(row[lo1[j]] + row[hi1[j]]) - row[j])
+                    out[j] = row[j] + dif
+                    big = max(big, abs(dif))
+        tilemax[t] = big
+
+
+@numba.njit(parallel=True, cache=True)
+def step3d(src, dst, mutable, wts, lo0, hi0, lo1, hi1, lo2, hi2,
+           starts, size, tilemax):
+    '''
+    Write one Jacobi step of src into dst on the tiles starting at
+    starts and set the max change of each in tilemax.
+    '''
+    n0, n1, n2 = src.shape
+    w0 = wts[0]
+    w1 = wts[1]
+    w2 = wts[2]
+    for t in numba.prange(starts.shape[0]):
+        k0 = starts[t, 2]
+        k1 = min(k0 + size, n2)
+        # cells with neighbors through the edge are done on their own
+        klo = max(k0, 1)
+        khi = min(k1, n2-1)
+        big = 0.0
+        for i in range(starts[t, 0], min(starts[t, 0] + size, n0)):
+            for j in range(starts[t, 1], min(starts[t, 1] + size, n1)):
+                below = src[lo0[i], j]
+                above = src[hi0[i], j]
+                left = src[i, lo1[j]]
+                right = src[i, hi1[j]]
+                row = src[i, j]
+                out = dst[i, j]
+                mut = mutable[i, j]
+                for k in range(klo, khi):
+                    dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                                  w2*(row[k-1] + row[k+1]) - row[k])
+                    out[k] = row[k] + dif
+                    big = max(big, abs(dif))
+                for k in (0, n2-1):
+                    if k0 <= k < k1:
+                        dif = mut[k]*(w0*(below[k] + above[k]) + w1*(left[k] + right[k]) +
+                                      w2*(row[lo2[k]] + row[hi2[k]]) - row[k])
+                        out[k] = row[k] + dif
+                        big = max(big, abs(dif))
+        tilemax[t] = big
+
+
+def grow(tiles, periodic):
+    '''
+    Return bool tile array with True also next to any True tile.
+    '''
+    ret = numpy.array(tiles)
+    for dim, per in enumerate(periodic):
+        if per:
+            ret |= numpy.roll(tiles, 1, axis=dim)
+            ret |= numpy.roll(tiles, -1, axis=dim)
+            continue
+        n = tiles.shape[dim]
+        src = [slice(None)]*tiles.ndim
+        dst = [slice(None)]*tiles.ndim
+        src[dim] = slice(0, n-1)
+        dst[dim] = slice(1, n)
+        ret[tuple(dst)] |= tiles[tuple(src)]
+        ret[tuple(src)] |= tiles[tuple(dst)]
+    return ret
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs,
+          tile=32, fraction=0.1, convergence=None, spacing=None,
+          mirror=None):
+    '''
+    Solve boundary value problem with Jacobi steps on active tiles.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - tile gives the number of cells along each side of a tile.
+
+        - fraction of prec below which the change of a tile in the
+          last step of an epoch makes it inactive.  With no prec all
+          tiles stay active.
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.weights().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration, zero on inactive tiles.
+
+    The fraction of tiles updated in each epoch is logged.
+    '''
+    if iarr.ndim not in (2, 3):
+        raise ValueError(f'unsupported dimensions: {iarr.ndim}')
+    if len(periodic) != iarr.ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {iarr.ndim}")
+
+    dtype = numpy.float32 if iarr.dtype == numpy.float32 else numpy.float64
+    bufs = [numpy.array(iarr, dtype=dtype) for _ in range(2)]
+    mutable = numpy.invert(numpy.asarray(barr, dtype=bool)).astype(dtype)
+    if spacing is None:
+        spacing = [1.0]*iarr.ndim
+    wts = numpy.array(weights(spacing), dtype=dtype)
+    if mirror is None:
+        mirror = [False]*iarr.ndim
+    index = list()
+    for n, per, mir in zip(iarr.shape, periodic, mirror):
+        index += neighbor_index(n, per, mir)
+    step = step2d if iarr.ndim == 2 else step3d
+
+    # tiles holding only fixed cells never need an update
+    ntiles = [(n + tile - 1)//tile for n in iarr.shape]
+    pad = [(0, nt*tile - n) for nt, n in zip(ntiles, iarr.shape)]
+    blocks = numpy.pad(mutable, pad).reshape(
+        sum([(nt, tile) for nt in ntiles], ()))
+    useful = blocks.max(axis=tuple(range(1, 2*iarr.ndim, 2))) > 0
+    active = numpy.array(useful)
+    threshold = fraction*prec if prec else -1
+
+    cur = 0
+    maxerr = None
+    done = False
+    for iepoch in range(nepochs):
+        starts = numpy.argwhere(active)
+        tilemax = numpy.zeros(len(starts))
+        frac = len(starts)/max(numpy.count_nonzero(useful), 1)
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}, {frac:.3f} of tiles updated')
+        starts *= tile
+        for istep in range(epoch):
+            step(bufs[cur], bufs[1-cur], mutable, wts, *index, starts, tile, tilemax)
+            cur = 1-cur
+        maxerr = tilemax.max() if len(tilemax) else 0.0
+
+        # the change of each tile over the last step
+        change = numpy.zeros(ntiles)
+        change[active] = tilemax
+        if convergence:
+            maxerr = convergence(bufs[cur], bufs[cur] - bufs[1-cur])
+        if prec and maxerr < prec:
+            log.info(f'fdm reach max precision: {prec} > {maxerr}')
+            done = True
+            break
+
+        last = active
+        active = useful & grow(active & (change >= threshold), periodic)
+
+        # inactive tiles must hold the same values in both buffers
+        for ind in numpy.argwhere(last & ~active):
+            sel = tuple([slice(i*tile, (i+1)*tile) for i in ind])
+            bufs[1-cur][sel] = bufs[cur][sel]
+
+    if not done:
+        log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    arr = bufs[cur]
+    err = arr - bufs[1-cur]
+    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
@@ -4,9 +4,14 @@ Apply FDM solution to solve Laplace boundary value problem using numpy
 like arrays.  Some things are also called from fdm_cupy.
 '''
 
+import logging
+import math
+import numpy
 from pochoir import arrays
 
-from .fdm_generic import edge_condition, stencil
+from .fdm_generic import edge_condition, edge_condition1, stencil, spaced
+
+log = logging.getLogger(__name__)
     
 def set_core1(dst, src, core):
     dst[core] = src
@@ -14,8 +19,11 @@ def set_core1(dst, src, core):
 def set_core2(dst, src, core):
     dst[core] = src
 
+accelerations = ("chebyshev",)
+
 def solve(iarr, barr, periodic, prec, epoch, nepochs,
-          stencil = stencil):
+          stencil = stencil, convergence = None, accelerate = None,
+          spacing = None, mirror = None):
     '''
     Solve boundary value problem
 
@@ -33,16 +41,46 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
         - nepochs limits the number of epochs
 
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - accelerate optionally names an acceleration of the Jacobi
+          steps, see solve_chebyshev().
+
+        - spacing optionally gives the grid spacing along each
+          dimension which weights the neighbors in the stencil.  The
+          stencil must then accept a spacing keyword argument.
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          edge_condition1().
+
+    The edge condition is applied to the padding before the first
+    step, so every step sees the edges.  A solve split into several
+    calls, each starting from the result of the last, then gives the
+    same result as one call.
+
     Returned arrays "arr" is like iarr with updated solution including
     fixed boundary value elements.  "err" is difference between last
     and penultimate iteration.
     '''
+    if accelerate == "chebyshev":
+        return solve_chebyshev(iarr, barr, periodic, prec, epoch, nepochs,
+                               stencil=stencil, convergence=convergence,
+                               spacing=spacing, mirror=mirror)
+    if accelerate:
+        raise ValueError(f'unknown acceleration: {accelerate}')
+    stencil = spaced(stencil, spacing)
+
     amod = arrays.module(iarr)
 
     err = amod.zeros_like(iarr)
 
     barr = amod.pad(barr, 1)
     iarr = amod.pad(iarr, 1)
+    # the first step must see the edge condition, not the zero padding
+    edge_condition(iarr, *periodic, mirror=mirror)
 
     # Get indices of fixed boundary values and values themselves
     ifixed = barr == True
@@ -51,7 +89,7 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
 
     prev = None
     for iepoch in range(nepochs):
-        print(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
         for istep in range(epoch):
             #print(f'step: {istep}/{epoch}')
             if epoch-istep == 1: # last in the epoch
@@ -60,16 +98,255 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs,
             tmp = stencil(iarr)
             set_core1(iarr, tmp, core)
             set_core2(iarr, fixed, ifixed)
-            edge_condition(iarr, *periodic)
+            edge_condition(iarr, *periodic, mirror=mirror)
             
             if epoch-istep == 1: # last in the epoch
                 err = iarr[core] - prev
                 maxerr = amod.max(amod.abs(err))
+                if convergence:
+                    maxerr = convergence(iarr[core], err)
                 #print(f'maxerr: {maxerr}')
                 if prec and maxerr < prec:
-                    print(f'fdm reach max precision: {prec} > {maxerr}')
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
                     return (iarr[core], err)
 
-    print(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
     return (iarr[core], err)
 
+
+def chebyshev_weights(rho):
+    '''
+    Generate the Chebyshev semi-iterative weights for a Jacobi
+    iteration with spectral radius rho.
+
+    The weights start at 1 and tend to 2/(1+sqrt(1-rho^2)).
+    '''
+    weight = 1.0
+    yield weight
+    weight = 1.0/(1.0 - 0.5*rho*rho)
+    while True:
+        yield weight
+        weight = 1.0/(1.0 - 0.25*rho*rho*weight)
+
+
+def solve_chebyshev(iarr, barr, periodic, prec, epoch, nepochs,
+                    stencil = stencil, convergence = None, nestimate = 2,
+                    spacing = None, mirror = None):
+    '''
+    Solve boundary value problem with Chebyshev accelerated Jacobi
+    steps.
+
+    Arguments and return value are as for solve() and in addition:
+
+        - nestimate gives the number of first epochs of plain Jacobi
+          steps used to estimate the spectral radius.
+
+    Each step is x[k+1] = x[k-1] + w[k+1] (J(x[k]) - x[k-1]) where
+    J(x) is the Jacobi step done by solve() with the same stencil
+    and w[k] are from chebyshev_weights().  Plain Jacobi is w = 1.
+    The spectral radius is estimated from how the RMS increment
+    decays from the end of one estimation epoch to the end of the
+    next.  If that is not below one the steps stay plain Jacobi.
+    '''
+    stencil = spaced(stencil, spacing)
+    amod = arrays.module(iarr)
+
+    err = amod.zeros_like(iarr)
+
+    barr = amod.pad(barr, 1)
+    iarr = amod.pad(iarr, 1)
+    edge_condition(iarr, *periodic, mirror=mirror)
+
+    ifixed = barr == True
+    fixed = iarr[ifixed]
+    core = arrays.core_slices1(iarr)
+
+    # x[k-1], with fixed values and edges already set
+    older = amod.array(iarr)
+
+    weights = None
+    weight = 1.0
+    rms = list()
+    maxerr = None
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        for istep in range(epoch):
+            if weights:
+                weight = next(weights)
+            tmp = stencil(iarr)
+            tmp -= older[core]
+            tmp *= weight
+            older[core] += tmp
+            set_core2(older, fixed, ifixed)
+            edge_condition(older, *periodic, mirror=mirror)
+            iarr, older = older, iarr
+
+        err = iarr[core] - older[core]
+        maxerr = amod.max(amod.abs(err))
+        if convergence:
+            maxerr = convergence(iarr[core], err)
+        if prec and maxerr < prec:
+            log.info(f'fdm reach max precision: {prec} > {maxerr}')
+            return (iarr[core], err)
+
+        if iepoch < nestimate:
+            rms.append(float(amod.sqrt(amod.mean(err*err))))
+        if iepoch+1 == nestimate and len(rms) > 1 and rms[-2] > 0:
+            rho = (rms[-1]/rms[-2])**(1.0/epoch)
+            if 0 < rho < 1:
+                weights = chebyshev_weights(rho)
+                omega = 2.0/(1.0 + math.sqrt(1.0 - rho*rho))
+                log.info(f'chebyshev: rho={rho} omega={omega}')
+            else:
+                log.info(f'chebyshev: rho={rho}, staying with Jacobi')
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (iarr[core], err)
+
+
+def solve_mixed(iarr, barr, periodic, prec, epoch, nepochs,
+                stencil = stencil, convergence = None, spacing = None,
+                mirror = None):
+    '''
+    Solve boundary value problem with float32 sweeps corrected in
+    float64.
+
+    Arguments and return value are as for solve() except that "arr"
+    is float64 and "err" is float32.
+
+    The solution is held in float64.  At the start of each epoch the
+    change one Jacobi step would make to it is found in float64.  The
+    epoch then sweeps a float32 correction which is driven by this
+    change and is zero on fixed values.  Solution plus correction
+    follow the same Jacobi iterations as solve() but the sweeps only
+    move float32 arrays.  At the end of the epoch the correction is
+    added to the solution.
+
+    Besides the float64 solution only float32 arrays of its size are
+    held.  The change is found over slabs of the solution so float64
+    temporaries are limited to one slab.  The peak memory is then a
+    little above that of solve() in float32 and well below float64.
+    '''
+    stencil = spaced(stencil, spacing)
+    amod = arrays.module(iarr)
+
+    barr = amod.pad(barr, 1)
+    sol = amod.zeros(barr.shape, dtype='f8')
+    core = arrays.core_slices1(sol)
+    sol[core] = iarr
+    edge_condition(sol, *periodic, mirror=mirror)
+
+    ifixed = barr == True
+    cfixed = ifixed[core]
+
+    cor = amod.zeros(sol.shape, dtype='f4')
+    res = amod.zeros(cor[core].shape, dtype='f4')
+    src = amod.zeros(res.shape, dtype='f4')
+
+    # slabs are taken along a dimension which is not graded
+    flat = [d for d in range(sol.ndim)
+            if spacing is None or numpy.ndim(spacing[d]) == 0]
+    dim = flat[0] if flat else 0
+    nslab = 8 if flat else 1
+    size = max(1, -(-res.shape[dim]//nslab))
+
+    maxerr = None
+    err = res
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+
+        for beg in range(0, res.shape[dim], size):
+            end = min(beg + size, res.shape[dim])
+            part = [slice(None)]*sol.ndim
+            part[dim] = slice(beg, end)
+            part = tuple(part)
+            padded = [slice(None)]*sol.ndim
+            padded[dim] = slice(beg, end+2)
+            chg = stencil(sol[tuple(padded)])
+            chg -= sol[core][part]
+            src[part] = chg
+        src[cfixed] = 0
+        cor[:] = 0
+
+        for istep in range(epoch):
+            stencil(cor, res)
+            res += src
+            if epoch-istep == 1: # last in the epoch
+                # res is made the increment of this step
+                res -= cor[core]
+                res[cfixed] = 0
+                cor[core] += res
+                maxerr = max(float(res.max()), -float(res.min()))
+            else:
+                set_core1(cor, res, core)
+                set_core2(cor, 0, ifixed)
+            edge_condition(cor, *periodic, mirror=mirror)
+
+        sol += cor
+        if convergence:
+            maxerr = convergence(sol[core], err)
+        if prec and maxerr < prec:
+            log.info(f'fdm reach max precision: {prec} > {maxerr}')
+            return (sol[core], err)
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (sol[core], err)
+
+
+def solve_batch(iarrs, barr, periodic, prec, epoch, nepochs,
+                stencil = stencil, spacing = None, mirror = None):
+    '''
+    Solve a batch of boundary value problems sharing one boundary.
+
+    Return (arrs, errs)
+
+        - iarrs gives arrays of initial values stacked along a
+          leading batch axis (or a sequence of such arrays).
+
+    The other arguments are as for solve() and the precision applies
+    to the largest increment of any problem.  The returned arrays are
+    stacked like iarrs.  Each problem follows the same iterations as
+    it would with solve() but all are swept together so the masks and
+    the per-step overhead are shared.
+    '''
+    stencil = spaced(stencil, spacing)
+    amod = arrays.module(barr)
+    if mirror is None:
+        mirror = [False]*len(periodic)
+
+    iarrs = amod.stack([amod.asarray(one) for one in iarrs])
+    errs = amod.zeros_like(iarrs)
+
+    barr = amod.pad(barr, 1)
+    iarrs = amod.pad(iarrs, [(0,0)] + [(1,1)]*barr.ndim)
+    # the first step must see the edge condition, not the zero padding
+    for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+        edge_condition1(iarrs, dim+1, per, mir)
+
+    ifixed = barr == True
+    fixed = iarrs[:, ifixed]
+    core = (slice(None),) + arrays.core_slices1(barr)
+    tmp = amod.zeros_like(iarrs[core])
+
+    maxerr = None
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        for istep in range(epoch):
+            if epoch-istep == 1: # last in the epoch
+                prev = amod.array(iarrs[core])
+
+            stencil(iarrs, tmp, nbatch=1)
+            iarrs[core] = tmp
+            iarrs[:, ifixed] = fixed
+            for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+                edge_condition1(iarrs, dim+1, per, mir)
+
+            if epoch-istep == 1: # last in the epoch
+                errs = iarrs[core] - prev
+                maxerr = amod.max(amod.abs(errs))
+                if prec and maxerr < prec:
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                    return (iarrs[core], errs)
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (iarrs[core], errs)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using numpy
+in several processes sharing memory.
+
+The padded array is split into slabs along its longest axis and each
+slab is owned by one worker process.  Two padded arrays are held in
+multiprocessing.shared_memory and a Jacobi step reads one and writes
+the other so the one-cell halo of a slab is simply read from the
+neighbor slab.  A barrier between steps makes this the halo exchange.
+
+Every cell is computed with the same operations in the same order as
+by fdm_numpy.solve() so the result is bitwise identical for the same
+number of steps.
+'''
+
+import logging
+import os
+import queue
+import numpy
+import multiprocessing
+from multiprocessing import shared_memory
+
+from .fdm_generic import edge_condition, edge_condition1, stencil, is_graded
+
+log = logging.getLogger(__name__)
+
+
+def slabs(n, nslabs):
+    '''
+    Return list of (lo, hi) padded index ranges splitting the n-2
+    core cells of a padded axis of size n into nslabs.
+    '''
+    bounds = numpy.linspace(1, n-1, nslabs+1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def worker(names, shape, dtype, periodic, mirror, spacing, axis, lo, hi, bslab,
+           fixed, barrier, tasks, results):
+    '''
+    Run Jacobi steps on the slab [lo, hi) of axis as told by tasks.
+
+    Each task is (nsteps, cur) to step from shared array cur.  After
+    the steps the max change of the last step is put to results.  A
+    task of None ends the worker.
+    '''
+    shms = [shared_memory.SharedMemory(name=name) for name in names]
+    bufs = [numpy.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in shms]
+    n = shape[axis]
+
+    def along(beg, end):
+        slc = [slice(None)]*len(shape)
+        slc[axis] = slice(beg, end)
+        return tuple(slc)
+
+    # the slab core cells, the slab with its halo and the whole slab
+    core = [slice(1, s-1) for s in shape]
+    core[axis] = slice(lo, hi)
+    core = tuple(core)
+    halo = along(lo-1, hi+1)
+    mine = along(lo, hi)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        nsteps, cur = task
+        for istep in range(nsteps):
+            src = bufs[cur]
+            dst = bufs[1-cur]
+
+            # ghost planes along the slab axis come from the previous step
+            if lo == 1:
+                edge = along(2, 3) if mirror[axis] else along(1, 2)
+                src[along(0, 1)] = src[along(n-2, n-1) if periodic[axis] else edge]
+            if hi == n-1:
+                edge = along(n-3, n-2) if mirror[axis] else along(n-2, n-1)
+                src[along(n-1, n)] = src[along(1, 2) if periodic[axis] else edge]
+
+            tmp = stencil(src[halo], spacing=spacing)
+            dst[core] = tmp
+            dslab = dst[mine]
+            dslab[bslab] = fixed
+            for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+                if dim != axis:
+                    edge_condition1(dslab, dim, per, mir)
+
+            barrier.wait()
+            cur = 1-cur
+
+        maxerr = numpy.max(numpy.abs(bufs[cur][core] - bufs[1-cur][core]))
+        results.put((lo, maxerr))
+
+    del bufs
+    for shm in shms:
+        shm.close()
+
+
+def gather(results, workers):
+    '''
+    Return the max of one result from each worker.
+    '''
+    got = list()
+    while len(got) < len(workers):
+        try:
+            got.append(results.get(timeout=1)[1])
+        except queue.Empty:
+            dead = [p.exitcode for p, _ in workers if not p.is_alive()]
+            if dead:
+                raise RuntimeError(f'numpy-mp: worker exited with {dead[0]}')
+    return max(got)
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, procs=None,
+          convergence=None, spacing=None, mirror=None):
+    '''
+    Solve boundary value problem with Jacobi steps over slabs owned
+    by worker processes.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - procs gives the number of worker processes (def: number
+          of CPU cores, at most one per core cell of the longest axis).
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.stencil().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+    '''
+    iarr = numpy.pad(numpy.asarray(iarr), 1)
+    barr = numpy.pad(numpy.asarray(barr, dtype=bool), 1)
+    if mirror is None:
+        mirror = [False]*len(periodic)
+    edge_condition(iarr, *periodic, mirror=mirror)
+    core = tuple([slice(1, s-1) for s in iarr.shape])
+
+    # the weights along a graded axis are not split over slabs
+    shape = numpy.array(iarr.shape)
+    if is_graded(spacing):
+        shape[[numpy.ndim(h) > 0 for h in spacing]] = 0
+    axis = int(numpy.argmax(shape))
+    procs = min(procs or os.cpu_count() or 1, iarr.shape[axis]-2)
+    log.info(f'numpy-mp: {procs} processes on slabs along axis {axis}')
+
+    shms = [shared_memory.SharedMemory(create=True, size=iarr.nbytes)
+            for _ in range(2)]
+    bufs = [numpy.ndarray(iarr.shape, dtype=iarr.dtype, buffer=shm.buf)
+            for shm in shms]
+    for buf in bufs:
+        buf[:] = iarr
+
+    # spawn as forking a process which already runs threads may deadlock
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(procs)
+    results = ctx.Queue()
+    workers = list()
+    for lo, hi in slabs(iarr.shape[axis], procs):
+        sel = [slice(None)]*iarr.ndim
+        sel[axis] = slice(lo, hi)
+        bslab = barr[tuple(sel)]
+        fixed = iarr[tuple(sel)][bslab]
+        tasks = ctx.Queue()
+        proc = ctx.Process(target=worker,
+                           args=([shm.name for shm in shms], iarr.shape,
+                                 iarr.dtype, list(periodic), list(mirror), spacing,
+                                 axis, lo, hi, bslab, fixed,
+                                 barrier, tasks, results))
+        proc.start()
+        workers.append((proc, tasks))
+
+    cur = 0
+    maxerr = None
+    try:
+        for iepoch in range(nepochs):
+            log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+            for _, tasks in workers:
+                tasks.put((epoch, cur))
+            cur = (cur + epoch) % 2
+            maxerr = gather(results, workers)
+            if convergence:
+                arr = bufs[cur][core]
+                maxerr = convergence(arr, arr - bufs[1-cur][core])
+            if prec and maxerr < prec:
+                log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                break
+        else:
+            log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+
+        arr = numpy.array(bufs[cur][core])
+        err = arr - bufs[1-cur][core]
+    finally:
+        for proc, tasks in workers:
+            tasks.put(None)
+        for proc, _ in workers:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        del bufs
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return (arr, err)
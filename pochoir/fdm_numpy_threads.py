@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem using numpy
+with the stencil spread over threads.
+
+The core of the padded array is split into slabs along its longest
+axis and a pool of threads applies fdm_generic.stencil() to each slab,
+writing the slab of the output.  Numpy releases the GIL in the adds of
+large arrays so the slabs run in parallel.  The engines of fdm_numpy
+are used otherwise and every cell gets the same operations as there
+so the result is identical.
+'''
+
+import logging
+import os
+import numpy
+from concurrent.futures import ThreadPoolExecutor
+
+from . import arrays
+from .fdm_generic import stencil, is_graded
+from .fdm_numpy_mp import slabs
+from .fdm_numpy import solve as solve_numpy
+from .fdm_numpy import solve_mixed as solve_numpy_mixed
+from .fdm_numpy import solve_batch as solve_numpy_batch
+
+log = logging.getLogger(__name__)
+
+
+class Stencil:
+    '''
+    Apply fdm_generic.stencil() over slabs in a pool of threads.
+
+    Calling is as for fdm_generic.stencil().
+    '''
+
+    def __init__(self, pool, nslabs):
+        self.pool = pool
+        self.nslabs = nslabs
+
+    def __call__(self, array, res=None, nbatch=0, spacing=None):
+        # the weights along a graded axis are not split over slabs
+        shape = numpy.array(array.shape[nbatch:])
+        if is_graded(spacing):
+            shape[[numpy.ndim(h) > 0 for h in spacing]] = 0
+        axis = nbatch + int(numpy.argmax(shape))
+
+        if res is None:
+            amod = arrays.module(array)
+            core = [slice(None)]*nbatch + [slice(1, s-1) for s in array.shape[nbatch:]]
+            res = amod.zeros_like(array[tuple(core)])
+
+        def one(lo, hi):
+            src = [slice(None)]*array.ndim
+            src[axis] = slice(lo-1, hi+1)
+            dst = [slice(None)]*array.ndim
+            dst[axis] = slice(lo-1, hi-1)
+            stencil(array[tuple(src)], res[tuple(dst)], nbatch, spacing)
+
+        nslabs = min(self.nslabs, array.shape[axis]-2)
+        jobs = [self.pool.submit(one, lo, hi)
+                for lo, hi in slabs(array.shape[axis], nslabs)]
+        for job in jobs:
+            job.result()
+        return res
+
+
+def threaded(engine, threads, *args, **kwds):
+    '''
+    Run the fdm_numpy engine with the stencil in a pool of threads.
+    '''
+    threads = threads or os.cpu_count() or 1
+    log.info(f'numpy-threads: {threads} threads')
+    with ThreadPoolExecutor(threads) as pool:
+        return engine(*args, stencil=Stencil(pool, threads), **kwds)
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, threads=None,
+          **kwds):
+    '''
+    Solve boundary value problem as fdm_numpy.solve() with the
+    stencil spread over threads (def: number of CPU cores).
+    '''
+    return threaded(solve_numpy, threads, iarr, barr, periodic,
+                    prec, epoch, nepochs, **kwds)
+
+
+def solve_mixed(iarr, barr, periodic, prec, epoch, nepochs, threads=None,
+                **kwds):
+    '''
+    Solve boundary value problem as fdm_numpy.solve_mixed() with the
+    stencil spread over threads (def: number of CPU cores).
+    '''
+    return threaded(solve_numpy_mixed, threads, iarr, barr, periodic,
+                    prec, epoch, nepochs, **kwds)
+
+
+def solve_batch(iarrs, barr, periodic, prec, epoch, nepochs, threads=None,
+                **kwds):
+    '''
+    Solve a batch of boundary value problems as
+    fdm_numpy.solve_batch() with the stencil spread over threads (def:
+    number of CPU cores).
+    '''
+    return threaded(solve_numpy_batch, threads, iarrs, barr, periodic,
+                    prec, epoch, nepochs, **kwds)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+'''
+Apply red-black successive over-relaxation (SOR) to solve Laplace
+boundary value problem using numpy.
+
+The core of the padded array is split into 2^N strided sublattices
+and each is updated in place.  Sublattices with an even sum of index
+offsets are "red", the others "black".  All neighbors of a red cell
+are black and vice versa, so updating one color only reads values of
+the other.
+'''
+
+import logging
+import math
+import itertools
+import numpy
+
+from .fdm_generic import edge_condition, weights
+
+log = logging.getLogger(__name__)
+
+
+def sublattices(shape):
+    '''
+    Return list of (color, cells, neighbors) for a padded array shape.
+
+    The cells is a tuple of strided slices selecting one sublattice of
+    the core and neighbors is a list of such tuples selecting the
+    neighbor of each cell on either side along each dimension.
+    '''
+    ret = list()
+    for offs in itertools.product((0,1), repeat=len(shape)):
+        cells = [slice(1+o, n-1, 2) for o, n in zip(offs, shape)]
+        if any([c.start >= c.stop for c in cells]):
+            continue
+        neighbors = list()
+        for dim, slc in enumerate(cells):
+            for step in (1, -1):
+                nbr = list(cells)
+                nbr[dim] = slice(slc.start+step, slc.stop+step, 2)
+                neighbors.append(tuple(nbr))
+        ret.append((sum(offs) % 2, tuple(cells), neighbors))
+    return ret
+
+
+def shape_omega(shape, spacing=None):
+    '''
+    Return an initial relaxation factor estimated from the core shape.
+
+    This uses the Jacobi spectral radius of a box with fixed values on
+    its walls.
+    '''
+    if spacing is None:
+        spacing = [1.0]*len(shape)
+    rho = sum([2*w*math.cos(math.pi/(n+1))
+               for n, w in zip(shape, weights(spacing))])
+    return optimal_omega(rho)
+
+
+def optimal_omega(rho):
+    '''
+    Return the optimal SOR factor given Jacobi spectral radius rho.
+    '''
+    return 2.0/(1.0 + math.sqrt(1.0 - rho*rho))
+
+
+def measured_rho(lam, omega):
+    '''
+    Return the Jacobi spectral radius implied by the SOR convergence
+    factor lam measured while using omega, or None if unusable.
+    '''
+    if not 0 < lam < 1:
+        return None
+    rho2 = (lam + omega - 1)**2 / (lam * omega * omega)
+    if not 0 < rho2 < 1:
+        return None
+    return math.sqrt(rho2)
+
+
+class Sweeper:
+    '''
+    Apply red-black SOR sweeps in place to a padded array.
+    '''
+
+    def __init__(self, arr, barr, periodic, omega, spacing=None, mirror=None):
+        self.arr = arr
+        self.periodic = periodic
+        self.mirror = mirror
+        self.norm = 1/(2*arr.ndim)
+        self.weights = None if spacing is None else weights(spacing)
+        self.lattices = list()
+        for color, cells, neighbors in sublattices(arr.shape):
+            mutable = numpy.invert(barr[cells]).astype(arr.dtype)
+            buf = numpy.zeros_like(arr[cells])
+            self.lattices.append((color, cells, neighbors, mutable, buf))
+        self.set_omega(omega)
+
+    def set_omega(self, omega):
+        '''
+        Set the relaxation factor.
+        '''
+        self.omega = omega
+        self.relax = [omega*one[3] for one in self.lattices]
+
+    def __call__(self):
+        '''
+        Apply one red and one black half sweep.
+        '''
+        arr = self.arr
+        for color in (0, 1):
+            for lat, relax in zip(self.lattices, self.relax):
+                lcolor, cells, neighbors, _, buf = lat
+                if lcolor != color:
+                    continue
+                numpy.add(arr[neighbors[0]], arr[neighbors[1]], out=buf)
+                if self.weights is None:
+                    for nbr in neighbors[2:]:
+                        buf += arr[nbr]
+                    buf *= self.norm
+                else:
+                    buf *= self.weights[0]
+                    for dim, wdim in enumerate(self.weights[1:], 1):
+                        buf += wdim*(arr[neighbors[2*dim]] + arr[neighbors[2*dim+1]])
+                buf -= arr[cells]
+                buf *= relax
+                arr[cells] += buf
+            edge_condition(arr, *self.periodic, mirror=self.mirror)
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, omega=None, nadapt=3,
+          convergence=None, spacing=None, mirror=None):
+    '''
+    Solve boundary value problem with red-black SOR.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - omega gives a fixed relaxation factor.  If None, it is
+          estimated from the shape and refined from the convergence
+          rate measured in each of the first nadapt epochs.
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.weights().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+    '''
+    dtype = numpy.result_type(iarr.dtype, numpy.float32)
+    arr = numpy.pad(numpy.asarray(iarr, dtype=dtype), 1)
+    barr = numpy.pad(numpy.asarray(barr, dtype=bool), 1)
+    edge_condition(arr, *periodic, mirror=mirror)
+    core = tuple([slice(1,s-1) for s in arr.shape])
+
+    adapt = omega is None
+    if adapt:
+        omega = shape_omega(iarr.shape, spacing)
+    sweep = Sweeper(arr, barr, periodic, omega, spacing, mirror)
+    log.info(f'sor: omega={omega}')
+
+    # step at which to sample a second increment for measuring the rate
+    mid = epoch//2
+    err = numpy.zeros_like(iarr)
+    maxerr = None
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        measure = adapt and iepoch < nadapt and epoch-mid > 1
+        for istep in range(epoch):
+            if epoch-istep == 1 or (measure and istep == mid):
+                prev = numpy.array(arr[core])
+
+            sweep()
+
+            if measure and istep == mid:
+                midinc = numpy.max(numpy.abs(arr[core] - prev))
+
+            if epoch-istep == 1: # last in the epoch
+                err = arr[core] - prev
+                maxinc = maxerr = numpy.max(numpy.abs(err))
+                if convergence:
+                    maxerr = convergence(arr[core], err)
+                if prec and maxerr < prec:
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                    return (arr[core], err)
+
+        if measure and midinc > 0:
+            lam = (maxinc/midinc)**(1.0/(epoch-1-mid))
+            rho = measured_rho(lam, sweep.omega)
+            if rho is not None:
+                sweep.set_omega(optimal_omega(rho))
+                log.info(f'sor: rate={lam} rho={rho} omega={sweep.omega}')
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (arr[core], err)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+'''
+Solve Laplace boundary value problem with a fast spectral solver of
+the empty box and a capacitance matrix for the fixed cells.
+
+The 5-point (2D) or 7-point (3D) Laplacian of the whole box, with
+edge conditions as given by edge_condition(), is diagonal in a
+discrete cosine (DCT-II) basis along a fixed dimension and in a
+Fourier basis along a periodic dimension.  Solving the empty box with
+a given source then costs a few transforms, O(N log N).
+
+The fixed cells (barr) are then enforced by finding "charges" q on
+the fixed cells only and a constant c such that the potential
+
+    u = G q + c
+
+equals the fixed values there, where G solves the empty box.  As the
+box has no fixed edges its Laplacian has the constant as null space so
+the charges must sum to zero.  The capacitance system restricted to
+the fixed cells is symmetric and is solved with conjugate gradient
+where each product with the capacitance matrix is one spectral solve.
+'''
+
+import logging
+import numpy
+from scipy import fft
+
+from .fdm_generic import is_graded
+
+log = logging.getLogger(__name__)
+
+
+def eigenvalues(shape, periodic, spacing=None):
+    '''
+    Return array of eigenvalues of the box Laplacian for each mode.
+
+    Neighbors along a dimension have weight 1/spacing^2 if spacing is
+    given, else 1.
+    '''
+    if spacing is None:
+        spacing = [1.0]*len(shape)
+    if is_graded(spacing):
+        raise ValueError("spectral solver does not support graded spacing")
+    lam = numpy.zeros(shape)
+    for dim, (n, per, h) in enumerate(zip(shape, periodic, spacing)):
+        k = numpy.arange(n)
+        theta = 2*numpy.pi*k/n if per else numpy.pi*k/n
+        one = (2*numpy.cos(theta) - 2)/(h*h)
+        lam = lam + one.reshape([-1 if d == dim else 1 for d in range(len(shape))])
+    return lam
+
+
+class BoxSolver:
+    '''
+    Apply the pseudo-inverse of the box Laplacian with spectral
+    transforms.
+    '''
+
+    def __init__(self, shape, periodic, spacing=None):
+        self.periodic = list(periodic)
+        self.fixed_axes = [d for d, per in enumerate(periodic) if not per]
+        self.periodic_axes = [d for d, per in enumerate(periodic) if per]
+        lam = eigenvalues(shape, periodic, spacing)
+        # the constant mode is the null space, its amplitude is dropped
+        lam.flat[0] = numpy.inf
+        self.inverse = 1.0/lam
+
+    def forward(self, arr):
+        ret = arr
+        if self.fixed_axes:
+            ret = fft.dctn(ret, type=2, norm="ortho", axes=self.fixed_axes)
+        if self.periodic_axes:
+            ret = fft.fftn(ret, axes=self.periodic_axes, norm="ortho")
+        return ret
+
+    def backward(self, arr):
+        ret = arr
+        if self.periodic_axes:
+            ret = fft.ifftn(ret, axes=self.periodic_axes, norm="ortho").real
+        if self.fixed_axes:
+            ret = fft.idctn(ret, type=2, norm="ortho", axes=self.fixed_axes)
+        return ret
+
+    def __call__(self, source):
+        '''
+        Return zero-mean potential u with Laplacian(u) = source.
+
+        The mean of the source is ignored.
+        '''
+        return self.backward(self.inverse * self.forward(source))
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, convergence=None,
+          spacing=None, mirror=None):
+    '''
+    Solve boundary value problem with a spectral box solver and
+    conjugate gradient on the capacitance system of the fixed cells.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of CG iterations per precision check
+
+        - nepochs limits the number of epochs
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see eigenvalues().
+
+        - mirror edges are not supported and must not be given.
+
+    The initial values of the mutable cells are not used.
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.  The iterations stop early at an exact
+    solution or if the search direction breaks down (p.Ap <= 0), which
+    is reported, and "err" is then the last increment made.
+    '''
+    if len(periodic) != iarr.ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {iarr.ndim}")
+    if mirror is not None and any(mirror):
+        raise ValueError("spectral solver does not support mirror edges")
+    fixed = numpy.asarray(barr, dtype=bool)
+    nfixed = int(numpy.count_nonzero(fixed))
+    if not nfixed:
+        raise ValueError("spectral solver needs fixed cells")
+    log.info(f'spectral: {iarr.size} cells, {nfixed} fixed')
+
+    green = BoxSolver(iarr.shape, periodic, spacing)
+    values = numpy.asarray(iarr, dtype=float)[fixed]
+
+    def project(v):            # to charges summing to zero
+        return v - v.mean()
+
+    def potential(charges):    # full box potential of charges
+        src = numpy.zeros(iarr.shape)
+        src[fixed] = charges
+        return green(src)
+
+    # CG on -P G P q = -P V over the fixed cells.  G is negative
+    # semi-definite so this is positive definite on the projection.
+    field = numpy.zeros(iarr.shape)    # G q, q starting at zero
+    r = -project(values)
+    p = numpy.array(r)
+    rr = numpy.dot(r, r)
+
+    arr = numpy.array(iarr, dtype=float)
+    err = numpy.zeros_like(arr)
+
+    def increment(alpha, pfield):  # full change made by the last step
+        old = numpy.mean(values - (field - alpha*pfield)[fixed])
+        const = numpy.mean(values - field[fixed])
+        return alpha*pfield + (const - old), const
+
+    maxerr = None
+    last = None
+    for iepoch in range(nepochs):
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        for istep in range(epoch):
+            pfield = potential(p)
+            ap = -project(pfield[fixed])
+            pap = numpy.dot(p, ap)
+            if rr == 0 or pap <= 0:
+                if rr == 0:
+                    log.info('fdm reach exact solution')
+                else:
+                    # eg, round off leaving the projection
+                    log.warning(f'spectral: breakdown with p.Ap = {pap}, stopping')
+                if last is None:
+                    const = numpy.mean(values - field[fixed])
+                else:
+                    err, const = increment(*last)
+                if rr == 0:
+                    err[:] = 0
+                arr = field + const
+                arr[fixed] = values
+                err[fixed] = 0
+                return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+            alpha = rr/pap
+            field += alpha*pfield
+            r -= alpha*ap
+            rr_new = numpy.dot(r, r)
+            p *= rr_new/rr
+            p += r
+            rr = rr_new
+            last = (alpha, pfield)
+
+            if epoch-istep == 1: # last in the epoch
+                err, const = increment(alpha, pfield)
+
+        arr = field + const
+        arr[fixed] = values
+        err[fixed] = 0
+        maxerr = numpy.max(numpy.abs(err))
+        if convergence:
+            maxerr = convergence(arr, err)
+        if prec and maxerr < prec:
+            log.info(f'fdm reach max precision: {prec} > {maxerr}')
+            return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
+
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    return (arr.astype(iarr.dtype), err.astype(iarr.dtype))
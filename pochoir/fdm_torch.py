@@ -3,11 +3,14 @@
 Apply FDM solution to solve Laplace boundary value problem with torch.
 '''
 
+import logging
 import numpy
 import torch
 from .arrays import core_slices1
 
-from .fdm_generic import edge_condition, stencil
+from .fdm_generic import edge_condition, stencil, spaced
+
+log = logging.getLogger(__name__)
 
     
 def set_core1(dst, src, core):
@@ -16,7 +19,8 @@ def set_core1(dst, src, core):
 def set_core2(dst, src, core):
     dst[core] = src
 
-def solve(iarr, barr, periodic, prec, epoch, nepochs):
+def solve(iarr, barr, periodic, prec, epoch, nepochs, spacing=None,
+          mirror=None, convergence=None):
     '''
     Solve boundary value problem
 
@@ -34,12 +38,24 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs):
 
         - nepochs limits the number of epochs
 
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.stencil().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
     Returned arrays "arr" is like iarr with updated solution including
     fixed boundary value elements.  "err" is difference between last
     and penultimate iteration.
     '''
 
     err = None
+    step = spaced(stencil, spacing)
     
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     bi_core = torch.tensor(iarr*barr, requires_grad=False).to(device)
@@ -54,23 +70,26 @@ def solve(iarr, barr, periodic, prec, epoch, nepochs):
 
     prev = None
     for iepoch in range(nepochs):
-        print(f'epoch: {iepoch}/{nepochs} x {epoch}')
+        log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
         for istep in range(epoch):
             #print(f'step: {istep}/{epoch}')
             if epoch-istep == 1: # last in the epoch
                 prev = iarr_pad.clone().detach().requires_grad_(False)
 
-            stencil(iarr_pad, tmp_core)
+            step(iarr_pad, tmp_core)
             iarr_pad[core] = bi_core + mutable_core*tmp_core
-            edge_condition(iarr_pad, *periodic)
+            edge_condition(iarr_pad, *periodic, mirror=mirror)
             
             if epoch-istep == 1: # last in the epoch
                 err = iarr_pad[core] - prev[core]
                 maxerr = torch.max(torch.abs(err))
+                if convergence:
+                    maxerr = convergence(iarr_pad[core].cpu().numpy(),
+                                         err.cpu().numpy())
                 #print(f'maxerr: {maxerr}')
                 if prec and maxerr < prec:
-                    print(f'fdm reach max precision: {prec} > {maxerr}')
+                    log.info(f'fdm reach max precision: {prec} > {maxerr}')
                     return (iarr_pad[core].cpu(), err.cpu())
-    print(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+    log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
     return (iarr_pad[core].cpu(), err.cpu())
 
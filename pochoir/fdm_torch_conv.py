@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+'''
+Apply FDM solution to solve Laplace boundary value problem with torch
+using a convolution for the stencil.
+
+The Jacobi step is one conv2d (2D) or conv3d (3D) of the padded array
+with a fixed kernel holding the neighbor weights.  Fixed values are
+restored by a blend with the mutable mask.
+
+The edges are the padding of F.pad in the mode of each dimension:
+circular for periodic, replicate for fixed and reflect for mirror
+edges.  Dimensions sharing a mode are padded by one call so a step
+is one pad (two or three with mixed edges), the convolution and a
+blend written in place into the other of two buffers allocated once.
+No per-epoch copy is needed to measure the increment.  All tensors
+stay on the device.  The step is compiled with torch.compile where
+available and runs eagerly otherwise.  This engine runs on CPU-only
+torch as well as on a GPU.
+'''
+
+import logging
+import numpy
+import torch
+import torch.nn.functional as F
+
+from .fdm_generic import weights
+
+log = logging.getLogger(__name__)
+
+
+def kernel(ndim, spacing=None, dtype=torch.float64, device="cpu"):
+    '''
+    Return the convolution kernel of shape (1, 1, 3, ...) of a Jacobi
+    step with neighbor weights from fdm_generic.weights().
+    '''
+    if spacing is None:
+        spacing = [1.0]*ndim
+    ker = torch.zeros((1, 1) + (3,)*ndim, dtype=dtype, device=device)
+    for dim, wdim in enumerate(weights(spacing)):
+        for side in (0, 2):
+            ind = [0, 0] + [1]*ndim
+            ind[dim+2] = side
+            ker[tuple(ind)] = wdim
+    return ker
+
+
+def padding(periodic, mirror=None):
+    '''
+    Return list of (mode, width) giving the F.pad calls which set the
+    edges of each dimension.
+    '''
+    if mirror is None:
+        mirror = [False]*len(periodic)
+    widths = dict()
+    for dim, (per, mir) in enumerate(zip(periodic, mirror)):
+        if per and mir:
+            raise ValueError("a periodic dimension can not have mirror edges")
+        mode = "circular" if per else ("reflect" if mir else "replicate")
+        # F.pad counts pairs from the last dimension
+        width = widths.setdefault(mode, [0]*(2*len(periodic)))
+        back = len(periodic) - 1 - dim
+        width[2*back:2*back+2] = [1, 1]
+    return [(mode, tuple(width)) for mode, width in widths.items()]
+
+
+def stepper(ker, fixed, mutable, periodic, mirror=None):
+    '''
+    Return function writing one Jacobi step of src into dst.
+
+    The src and dst have shape (1, 1, ...) of the unpadded array.
+    '''
+    conv = F.conv2d if len(periodic) == 2 else F.conv3d
+    pads = padding(periodic, mirror)
+
+    def step(src, dst):
+        for mode, width in pads:
+            src = F.pad(src, width, mode=mode)
+        torch.addcmul(fixed, mutable, conv(src, ker), out=dst)
+
+    return step
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs,
+          convergence=None, spacing=None, mirror=None, threads=None,
+          compiled=True):
+    '''
+    Solve boundary value problem with conv based Jacobi steps.
+
+    Return (arr, err)
+
+        - iarr gives array of initial values
+
+        - barr gives bool array where True indicates value at that
+          index is boundary (imutable).
+
+        - periodic is list of Boolean.  If true, the corresponding
+          dimension is periodic, else it is fixed.
+
+        - epoch is number of iteration per precision check
+
+        - nepochs limits the number of epochs
+
+        - convergence optionally gives a Convergence which measures
+          the value compared to prec at the end of each epoch
+          (def: max absolute increment).
+
+        - spacing optionally gives the grid spacing along each
+          dimension, see fdm_generic.weights().
+
+        - mirror optionally gives a list of Boolean.  If true, the
+          corresponding fixed dimension has mirror edges, see
+          fdm_generic.edge_condition1().
+
+        - threads limits the number of torch CPU threads (def: all).
+
+        - compiled gives the step by torch.compile if available.
+
+    The step is done on the GPU if one is available, else on the CPU,
+    in float32 if iarr is float32, else in float64.
+
+    Returned arrays "arr" is like iarr with updated solution including
+    fixed boundary value elements.  "err" is difference between last
+    and penultimate iteration.
+    '''
+    iarr = numpy.asarray(iarr)
+    if iarr.ndim not in (2, 3):
+        raise ValueError(f'unsupported dimensions: {iarr.ndim}')
+    if len(periodic) != iarr.ndim:
+        raise ValueError(f"dimension mismatch: {len(periodic)} != {iarr.ndim}")
+    previous = torch.get_num_threads()
+    if threads:
+        torch.set_num_threads(threads)
+    try:
+
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        dtype = torch.float32 if iarr.dtype == numpy.float32 else torch.float64
+        shape = (1, 1) + iarr.shape
+        fixedb = numpy.asarray(barr, dtype=bool)
+
+        bufs = [torch.tensor(iarr, dtype=dtype, device=device).reshape(shape)
+                for _ in range(2)]
+        fixed = torch.tensor(iarr*fixedb, dtype=dtype, device=device).reshape(shape)
+        mutable = torch.tensor(~fixedb, dtype=dtype, device=device).reshape(shape)
+        err = torch.zeros(shape, dtype=dtype, device=device)
+        ker = kernel(iarr.ndim, spacing, dtype, device)
+        step = stepper(ker, fixed, mutable, periodic, mirror)
+        log.info(f'torch-conv: {device}, {torch.get_num_threads()} threads')
+
+        if compiled and hasattr(torch, "compile"):
+            fast = torch.compile(step)
+            try:
+                fast(bufs[0], bufs[1])
+                step = fast
+            except Exception as exc:
+                log.warning(f'torch-conv: no torch.compile, running eagerly: {exc}')
+            # the trial step is redone from the initial values
+            bufs[1].copy_(bufs[0])
+
+        cur = 0
+        maxerr = None
+        for iepoch in range(nepochs):
+            log.info(f'epoch: {iepoch}/{nepochs} x {epoch}')
+            with torch.no_grad():
+                for istep in range(epoch):
+                    step(bufs[cur], bufs[1-cur])
+                    cur = 1-cur
+                torch.sub(bufs[cur], bufs[1-cur], out=err)
+                maxerr = float(torch.max(torch.abs(err)))
+            if convergence:
+                maxerr = convergence(bufs[cur][0,0].cpu().numpy(),
+                                     err[0,0].cpu().numpy())
+            if prec and maxerr < prec:
+                log.info(f'fdm reach max precision: {prec} > {maxerr}')
+                break
+        else:
+            log.info(f'fdm reach max epoch {epoch} x {nepochs}, last prec {prec} < {maxerr}')
+
+        arr = bufs[cur][0,0].cpu().numpy().astype(iarr.dtype)
+        return (arr, err[0,0].cpu().numpy().astype(iarr.dtype))
+    finally:
+        torch.set_num_threads(previous)
@@ -23,6 +23,9 @@ class Store:
         self.fp[key] = value
         self.fp[key].attrs.update(attrs)
 
+    def flush(self):
+        self.fp.flush()
+
     def close(self):
         self.fp.close()
         del self.fp
@@ -12,7 +12,7 @@ framework dependency (ie, no click).
 
 from . import persist 
 from . import arrays
-from . domain import Domain
+from . domain import Domain, GradedDomain
 
 from pathlib import Path
 
@@ -34,10 +34,13 @@ class Main:
               given the input store is made readonly.
         '''
         self.instore_path = Path(instore).resolve()
+        self.outstore_path = None
+        self._checkpoints = None
         if outstore is None:
             self.instore = persist.store(instore, 'a')
             self.outstore = self.instore
         else:
+            self.outstore_path = Path(outstore).resolve()
             self.instore = persist.store(instore, 'r')
             self.outstore = persist.store(outstore, 'w')
 
@@ -74,12 +77,37 @@ class Main:
         _, md = self.get(key, True)
         if md is None:
             raise KeyError(f'no domain "{key}"')
+        md = dict(md)           # HDF5 attributes would be deleted by pop
         shape = md.pop("shape")
         spacing = md.pop("spacing")
         origin = md.pop("origin", None)
+        if "coords" in md:
+            return GradedDomain(shape, spacing, origin,
+                                md.pop("axis"), md.pop("coords"))
         dom = Domain(shape, spacing, origin)
         return dom
 
+    def get_interpolator(self, key):
+        '''
+        Return an interpolator of the array at key.
+
+        Values are from the refined patches listed in the "patches"
+        metadata of the array where they hold the point (see the
+        --refine option of the fdm command).  A vector array gives a
+        list of interpolators, one per component.
+        '''
+        from .patch import Composite
+        arr, md = self.get(key, True)
+        dom = self.get_domain(md['domain'])
+        patches = list()
+        for pkey in md.get("patches", ()):
+            parr, pmd = self.get(pkey, True)
+            patches.append((self.get_domain(pmd['domain']), parr))
+        if len(arr.shape) == len(dom.shape):
+            return Composite(dom, arr, patches)
+        return [Composite(dom, arr[ind], [(pdom, parr[ind]) for pdom, parr in patches])
+                for ind in range(arr.shape[0])]
+
     def put_domain(self, key, dom):
         '''
         Put a domain to key in store.
@@ -95,5 +123,54 @@ class Main:
         key = self.key(key)
         return self.outstore.put(key, array, **metadata)
 
+    def close(self):
+        '''
+        Close the stores.
+        '''
+        stores = [self.instore, self.outstore, self._checkpoints]
+        for ind, store in enumerate(stores):
+            if store is not None and store not in stores[:ind]:
+                store.close()
+
+    @property
+    def checkpoints(self):
+        '''
+        The store holding checkpoints.
+
+        This is the input store unless an output store is given.  As
+        the input store is then read only and the output store is
+        recreated, checkpoints are kept in a store of their own next
+        to the output store, eg "out-checkpoint.hdf" for "out.hdf",
+        which is updated in place.
+        '''
+        if self._checkpoints is None:
+            if self.outstore_path is None:
+                self._checkpoints = self.instore
+            else:
+                path = self.outstore_path
+                path = path.with_name(path.stem + "-checkpoint" + path.suffix)
+                self._checkpoints = persist.store(str(path), 'a')
+        return self._checkpoints
+
+    def get_checkpoint(self, key):
+        '''
+        Return tuple (array, metadata) of the checkpoint at key.
+
+        The array is None if there is no checkpoint.
+        '''
+        try:
+            return self.checkpoints.get(self.key(key), True)
+        except KeyError:
+            return None, None
+
+    def put_checkpoint(self, key, array, **metadata):
+        '''
+        Save an array to key in the checkpoint store, replacing any
+        earlier one, and write it through to the file.
+        '''
+        store = self.checkpoints
+        store.put(self.key(key), array, **metadata)
+        store.flush()
+
 
         
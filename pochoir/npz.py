@@ -75,9 +75,11 @@ class Store:
             mp = dp.parent.joinpath(name + self.mdext)
             open(mp.resolve(), 'w').write(json.dumps(attrs, indent=4))
 
+    def flush(self):
+        pass                    # each put writes its files
+
     def close(self):
-        self.fp.close()
-        del self.fp
+        pass
 
 
 def dump(filename, **blocks):
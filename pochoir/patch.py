@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+'''
+Local refinement of an FDM solution with fine patches on a coarse grid.
+
+A composite grid is a coarse global domain and fine patches, each
+refining a box of coarse grid points by an integer ratio.  The boxes
+are found from the boundary array around the surfaces of electrodes.
+
+The solve alternates between the levels.  The coarse solution gives
+the values on the outer faces of each patch by linear interpolation
+and the patch is solved with these fixed.  The fine solution is then
+injected on the coarse points inside the patch which are held fixed
+in the next coarse solve.  This repeats until the patch faces change
+by less than the precision.
+
+The electrodes of a patch are taken from a geometry given on the
+whole coarse domain refined by the ratio (see refined_shape()), eg as
+made again by the generator of the boundary array, so the patch
+resolves their edges more finely.  Without it the electrodes of a
+patch are those of the nearest coarse point and only the solution is
+refined.
+
+The result is sampled through Composite which takes each value from
+the finest patch holding the point.
+'''
+
+import logging
+import numpy
+from scipy import ndimage
+
+from .arrays import resample, rgi
+from .domain import Domain
+from .fdm_generic import is_graded
+
+log = logging.getLogger(__name__)
+
+
+def merge(boxes):
+    '''
+    Return list of boxes with overlapping ones replaced by their union.
+    '''
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i+1, len(boxes)):
+                one, two = boxes[i], boxes[j]
+                if all([a.start < b.stop and b.start < a.stop
+                        for a, b in zip(one, two)]):
+                    boxes[i] = tuple([slice(min(a.start, b.start), max(a.stop, b.stop))
+                                      for a, b in zip(one, two)])
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def flag(barr, margin=2):
+    '''
+    Return list of boxes of coarse grid points to refine.
+
+    Each box is a tuple of slices.  Fixed points next to a mutable
+    point (the surface of an electrode) are flagged and grown by
+    margin points.  A box bounds each connected flagged region and
+    overlapping boxes are merged.
+    '''
+    fixed = numpy.asarray(barr, dtype=bool)
+    surface = fixed & ndimage.binary_dilation(~fixed)
+    if margin:
+        surface = ndimage.binary_dilation(surface, iterations=margin)
+    labels, _ = ndimage.label(surface)
+    boxes = list()
+    for box in ndimage.find_objects(labels):
+        if box is None:
+            continue
+        # a patch needs at least two coarse points along each axis
+        grown = list()
+        for s, n in zip(box, fixed.shape):
+            start = min(s.start, n-2)
+            grown.append(slice(start, max(s.stop, start+2)))
+        boxes.append(tuple(grown))
+    return merge(boxes)
+
+
+def refined_shape(shape, ratio, periodic):
+    '''
+    Return the shape of the coarse grid refined by ratio with which
+    the points of every patch coincide.
+    '''
+    return tuple([n*ratio if per else (n-1)*ratio + 1
+                  for n, per in zip(shape, periodic)])
+
+
+def refined_domain(dom, ratio, periodic):
+    '''
+    Return the Domain of the coarse Domain refined by ratio, see
+    refined_shape().
+    '''
+    return Domain(refined_shape(dom.shape, ratio, periodic),
+                  numpy.array(dom.spacing)/ratio, dom.origin)
+
+
+class Patch:
+    '''
+    A fine grid over a box of coarse grid points.
+
+    Along an axis where the box spans a periodic dimension the patch
+    also wraps and has ratio points per coarse point.  Otherwise it
+    holds the coarse points of the box and ratio-1 points between
+    each pair.
+    '''
+
+    def __init__(self, box, ratio, shape, periodic):
+        self.box = tuple(box)
+        self.ratio = int(ratio)
+        self.cshape = tuple(shape)
+        self.spans = [s.start == 0 and s.stop == n for s, n in zip(box, shape)]
+        self.periodic = [span and per for span, per in zip(self.spans, periodic)]
+        self.shape = tuple([(s.stop-s.start)*ratio if per
+                            else (s.stop-s.start-1)*ratio + 1
+                            for s, per in zip(box, self.periodic)])
+
+        # fine points in units of coarse index
+        self.points = [s.start + numpy.arange(n)/ratio
+                       for s, n in zip(box, self.shape)]
+
+        # faces which take coarse values, where the box is inside
+        self.outer = numpy.zeros(self.shape, dtype=bool)
+        for dim, span in enumerate(self.spans):
+            if span:
+                continue
+            face = [slice(None)]*len(self.shape)
+            face[dim] = [0, -1]
+            self.outer[tuple(face)] = True
+
+    def domain(self, dom):
+        '''
+        Return the fine Domain of this patch in the coarse Domain.
+        '''
+        lo = [s.start for s in self.box]
+        return Domain(self.shape, numpy.array(dom.spacing)/self.ratio,
+                      dom.point(lo))
+
+    def sample(self, arr):
+        '''
+        Return coarse array linearly interpolated onto the patch.
+        '''
+        arr = numpy.asarray(arr, dtype=float)
+        points = list()
+        for dim, per in enumerate(self.periodic):
+            n = arr.shape[dim]
+            if per:     # extend by the first plane one index beyond
+                arr = numpy.concatenate([arr, numpy.take(arr, [0], axis=dim)], axis=dim)
+                n += 1
+            points.append(numpy.arange(n))
+        return resample(arr, points, self.points)
+
+    def nearest(self, arr):
+        '''
+        Return coarse array sampled at the nearest coarse point.
+        '''
+        ind = list()
+        for pts, n, per in zip(self.points, self.cshape, self.periodic):
+            near = numpy.floor(pts + 0.5).astype(int)
+            ind.append(near % n if per else numpy.clip(near, 0, n-1))
+        return numpy.asarray(arr)[numpy.ix_(*ind)]
+
+    def crop(self, arr):
+        '''
+        Return the patch of an array on the refined grid, see
+        refined_shape().
+        '''
+        return numpy.asarray(arr)[tuple([slice(s.start*self.ratio, s.start*self.ratio + n)
+                                         for s, n in zip(self.box, self.shape)])]
+
+    def inside(self):
+        '''
+        Return (coarse, fine) slices of the coarse points held fixed
+        from the patch and of the coincident fine points.
+        '''
+        coarse = list()
+        fine = list()
+        for s, span, n in zip(self.box, self.spans, self.shape):
+            skip = 0 if span else 1
+            coarse.append(slice(s.start + skip, s.stop - skip))
+            fine.append(slice(skip*self.ratio, n - skip*self.ratio, self.ratio))
+        return tuple(coarse), tuple(fine)
+
+
+def solve(iarr, barr, periodic, prec, epoch, nepochs, engine,
+          ratio=2, margin=2, ncycles=10, spacing=None, geometry=None,
+          convergence=None, **kwds):
+    '''
+    Solve boundary value problem on a composite grid.
+
+    Return (arr, err, patches)
+
+        - iarr, barr, periodic, prec, epoch and nepochs are as for an
+          fdm engine and are passed to it for the coarse and each
+          patch solve.
+
+        - engine is the fdm solve function.
+
+        - ratio is the number of fine cells per coarse cell.
+
+        - margin is the number of coarse points around flagged
+          electrode surfaces, see flag().
+
+        - ncycles limits the number of coarse/fine alternations.
+
+        - spacing optionally gives the coarse spacing along each
+          dimension, divided by ratio for the patches.  Graded
+          spacing is not supported.
+
+        - geometry optionally gives (iarr, barr) on the refined grid
+          (see refined_shape()) from which the fixed points of each
+          patch and their values are taken.  Else they are those of
+          the nearest coarse point.
+
+        - convergence optionally gives a Convergence (or Telemetry)
+          of the coarse problem passed to each coarse solve.  The
+          patch solves compare the max absolute increment to prec.
+
+    Other keyword arguments are passed to the engine.
+
+    The "arr" and "err" are from the last coarse solve and patches
+    is a list of (patch, arr, err) from the last solve of each patch.
+    '''
+    if is_graded(spacing):
+        raise ValueError("patches of graded spacing are not supported")
+    iarr = numpy.asarray(iarr)
+    barr = numpy.asarray(barr, dtype=bool)
+    patches = [Patch(box, ratio, iarr.shape, periodic)
+               for box in flag(barr, margin)]
+    log.info(f'patch: {len(patches)} patches with {ratio}x refinement')
+    if geometry is not None:
+        giarr, gbarr = geometry
+        want = refined_shape(iarr.shape, ratio, periodic)
+        if tuple(giarr.shape) != want or tuple(gbarr.shape) != want:
+            raise ValueError(f'geometry shape {giarr.shape} is not the refined shape {want}')
+    ckwds = dict(kwds)
+    if spacing is not None:
+        ckwds["spacing"] = spacing
+        kwds["spacing"] = list(numpy.array(spacing)/ratio)
+    if convergence is not None:
+        ckwds["convergence"] = convergence
+
+    arr, err = engine(iarr, barr, periodic, prec, epoch, nepochs, **ckwds)
+
+    fine = list()
+    for patch in patches:
+        if geometry is None:
+            fbarr = patch.nearest(barr)
+            fiarr = patch.nearest(iarr)
+        else:
+            fbarr = numpy.asarray(patch.crop(gbarr), dtype=bool)
+            fiarr = patch.crop(giarr)
+        finit = numpy.where(fbarr, fiarr, patch.sample(arr))
+        fine.append((finit.astype(iarr.dtype), fbarr | patch.outer))
+
+    faces = [None]*len(patches)
+    results = list()
+    for icycle in range(ncycles):
+        log.info(f'patch: cycle {icycle}/{ncycles}')
+        results = list()
+        change = 0.0
+        for ind, (patch, (finit, fbarr)) in enumerate(zip(patches, fine)):
+            face = patch.sample(arr)[patch.outer]
+            if faces[ind] is not None and face.size:
+                change = max(change, numpy.max(numpy.abs(face - faces[ind])))
+            faces[ind] = face
+            finit[patch.outer] = face
+            farr, ferr = engine(finit, fbarr, patch.periodic,
+                                prec, epoch, nepochs, **kwds)
+            fine[ind] = (numpy.array(farr), fbarr)
+            results.append((patch, farr, ferr))
+
+        if icycle and change < prec:
+            log.info(f'patch: faces changed by {change} < {prec}')
+            break
+
+        # hold the coarse points inside patches at the fine solution
+        carr = numpy.array(arr)
+        cbarr = numpy.array(barr)
+        for patch, farr, _ in results:
+            coarse, crop = patch.inside()
+            carr[coarse] = numpy.where(barr[coarse], carr[coarse], farr[crop])
+            cbarr[coarse] = True
+        arr, err = engine(carr, cbarr, periodic, prec, epoch, nepochs, **ckwds)
+        log.info(f'patch: faces changed by {change}')
+
+    return (arr, err, results)
+
+
+class Composite:
+    '''
+    Interpolate a scalar field given on a coarse domain and patches.
+
+    Calling with an array of points of shape (..., N) returns values
+    of shape (...) like a regular grid interpolator.  Each value is
+    from the last given patch holding the point, else from the coarse
+    domain.
+    '''
+
+    def __init__(self, domain, arr, patches=()):
+        '''
+        The patches is a sequence of (Domain, array).
+        '''
+        self.levels = [(None, rgi(domain.linspaces, arr))]
+        for pdom, parr in patches:
+            self.levels.append((pdom.bb, rgi(pdom.linspaces, parr)))
+
+    def __call__(self, points):
+        points = numpy.asarray(points, dtype=float)
+        flat = points.reshape(-1, points.shape[-1])
+        ret = numpy.array(self.levels[0][1](flat))
+        for (lo, hi), interp in self.levels[1:]:
+            inside = numpy.all((flat >= lo) & (flat <= hi), axis=1)
+            if numpy.any(inside):
+                ret[inside] = interp(flat[inside])
+        return ret.reshape(points.shape[:-1])
@@ -18,11 +18,7 @@ class Simple:
         '''
         The vfield give vector feild on domain.
         '''
-        points = list()
-        for num, spacing, origin in zip(domain.shape, domain.spacing, domain.origin):
-            start = origin
-            stop  = origin + num * spacing
-            points.append(np.arange(start, stop, spacing))
+        points = domain.linspaces
         self.interp =[RGI(points, coord) for coord in vfield]
 
     def __call__(self, tick, tpoint):
@@ -6,7 +6,6 @@ A "block" here means a Numpy-like object with a name.  The name is
 used to locate the block in a persistent store.
 '''
 
-from . import hdf
 from . import npz
 
 def backend(filename, fmt=None):
@@ -25,6 +24,8 @@ def store(filename, mode="a", fmt=None):
     '''
     fmt = backend(filename, fmt)
     if 'hdf' in fmt:
+        # imported here so h5py is only needed by HDF5 stores
+        from . import hdf
         return hdf.Store(filename, mode)
     if 'npz' in fmt or 'json' in fmt:
         return npz.Store(filename, mode)
@@ -41,6 +42,7 @@ def tempstore(prefix="pochoir-store", fmt='npz'):
     if 'hdf' in fmt:
         fd, fname = mkstemp(suffix='.hdf', prefix=prefix)
         os.close(fd)
+        from . import hdf
         store = hdf.Store(fname, 'a')
     elif 'npz' in fmt:
         fname = mkdtemp(prefix=prefix)
@@ -22,6 +22,10 @@ extras = {
     "numba":[                   # JIT for CPU/GPU
         "numba",
     ],
+    "sparse":[                  # krylov and spectral FDM engines, refine patches
+        "scipy",
+        "pyamg",                # optional AMG preconditioner
+    ],
     "gencfg": [                 # for gencfg command
         "jsonnet",
         "anyconfig"
@@ -1,5 +1,5 @@
 import numpy
-from pochoir.arrays import core1, pad1, fromstr1
+from pochoir.arrays import core1, pad1, fromstr1, resample
 
 def test_fromstr1():
 
@@ -25,4 +25,18 @@ def test_pad1():
     assert 0 == numpy.sum(p[:,-1])
     assert 0 == numpy.sum(p[-1,:])
     assert (p[1:-1,1:-1] == a).all()
-    
+
+
+def test_resample():
+    x = numpy.linspace(0, 4, 5)
+    y = numpy.linspace(-1, 1, 3)
+    a = numpy.add.outer(2*x, 3*y)      # linear is reproduced exactly
+    nx = numpy.linspace(0, 4, 9)
+    ny = numpy.linspace(-1, 1, 7)
+    r = resample(a, (x, y), (nx, ny))
+    assert r.shape == (9, 7)
+    assert numpy.allclose(r, numpy.add.outer(2*nx, 3*ny))
+
+    r = resample(a, (x, y), (numpy.array([-1.0, 5.0]), y))
+    assert (r[0] == a[0]).all()
+    assert (r[1] == a[-1]).all()
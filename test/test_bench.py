@@ -0,0 +1,56 @@
+import numpy
+from pochoir import bench
+
+def test_problem():
+    for name in bench.problems:
+        for shape in ((24,20), (8,10,6)):
+            iarr, barr, periodic = bench.problem(name, shape)
+            assert iarr.shape == shape
+            assert barr.shape == shape
+            assert len(periodic) == len(shape)
+            assert barr.any() and not barr.all()
+
+def test_bench():
+    results = bench.bench(["sor", "numpy"], ["numpy"], ["wires"],
+                          [(24,20), (8,10,6)], sweeps=10, precision=1e-2,
+                          epoch=10, nepochs=20, timeout=300)
+    assert len(results) == 6
+    for one in results:
+        assert "error" not in one
+        assert one["rate"] > 0
+        assert one["peak_memory"] >= 0
+        if one["engine"] == "numpy":
+            assert one["speedup"] == 1.0
+        else:
+            assert one["speedup"] > 0
+    text = bench.table(results)
+    assert "sor" in text and "drift" in text
+
+def test_choose(tmp_path):
+    import json
+    from pochoir import calibrate
+    assert calibrate.candidates(["procs"]) == ["numpy-mp"]
+    assert "numpy" in calibrate.candidates([], "_batch")
+    assert "numba" not in calibrate.candidates([], "_mixed")
+    assert "numpy" in calibrate.candidates(["graded", "mirror"])
+    for engine in ("numba", "numba-fused", "numba-blocked", "torch-conv"):
+        assert engine not in calibrate.candidates(["graded"])
+    assert calibrate.key((20,30), "float64", "", ["numpy"], 2) != \
+        calibrate.key((20,30), "float64", "", ["numpy"])
+    assert calibrate.choose((20,30), needs=["procs"]) == "numpy-mp"
+
+    filename = str(tmp_path / "engines.json")
+    shape = (40,30)
+    engine = calibrate.choose(shape, "float32", filename=filename, sweeps=5)
+    assert engine in calibrate.candidates()
+
+    # a kept choice is used as is until the versions change
+    data = json.load(open(filename))
+    node, = data
+    name, = data[node]["choices"]
+    data[node]["choices"][name]["engine"] = "kept"
+    json.dump(data, open(filename, "w"))
+    assert calibrate.choose(shape, "float32", filename=filename) == "kept"
+    data[node]["versions"]["numpy"] = "0.0"
+    json.dump(data, open(filename, "w"))
+    assert calibrate.choose(shape, "float32", filename=filename, sweeps=5) != "kept"
@@ -0,0 +1,180 @@
+import numpy
+from click.testing import CliRunner
+from pochoir.__main__ import cli
+from pochoir.main import Main
+from pochoir.domain import Domain, GradedDomain
+
+def make_store(store, dom=None):
+    main = Main(store)
+    main.put_domain("dom", dom or Domain((20,30), 1.0))
+    iarr = numpy.zeros((20,30))
+    iarr[2,:] = 1000
+    iarr[-3,:] = -1000
+    iarr[8:12,10] = 500
+    main.put("iva", iarr, taxon="initial", domain="dom")
+    main.put("bva", iarr != 0, taxon="boundary", domain="dom")
+    main.close()
+
+def fdm(stores, *args, pot="pot"):
+    got = CliRunner().invoke(cli, list(stores) + ["fdm", "-i", "iva", "-b", "bva",
+                                                  "-e", "fixed,periodic",
+                                                  "--epoch", "10", "-P", pot,
+                                                  "-I", pot + "-inc"] + list(args))
+    assert got.exit_code == 0, got.output
+    return got.output
+
+def potential(store, key="pot"):
+    main = Main(store, None)
+    arr = numpy.array(main.get(key))
+    main.close()
+    return arr
+
+def test_checkpoint(tmp_path):
+    for ext in ("", ".hdf"):
+        store = str(tmp_path / f'st{ext}')
+        make_store(store)
+        fdm(["-s", store], "-n", "4")
+        want = potential(store)
+
+        for split in (False, True):
+            stores = ["-s", store]
+            out = store
+            if split:
+                out = str(tmp_path / f'out{ext}')
+                stores += ["-o", out]
+            ck = f'ck{int(split)}'
+            # as if stopped after two epochs
+            text = fdm(stores, "-n", "2", "--checkpoint", ck, "--resume",
+                       pot=f'part{int(split)}')
+            assert f'no checkpoint {ck}' in text
+            text = fdm(stores, "-n", "4", "--checkpoint", ck, "--resume",
+                       pot=f'pot{int(split)}')
+            assert f'resume from {ck} after 2 epochs' in text
+            assert numpy.array_equal(potential(out, f'pot{int(split)}'), want)
+
+def test_refine(tmp_path):
+    import json
+    store = str(tmp_path / "st")
+    make_store(store)
+    cfg = str(tmp_path / "sandh.json")
+    plane = lambda height, potential: dict(axis=0, height=height, thick=1.0,
+                                           potential=potential)
+    strips = dict(plane(9.5, 0.5), strips=dict(paxis=1, pitch=10.0, gap=2.0, offset=0.0))
+    json.dump(dict(planes=[plane(1, 0.0), plane(18, 1.0), strips]), open(cfg, "w"))
+    got = CliRunner().invoke(cli, ["-s", store, "gen", "-d", "dom", "-g", "sandh",
+                                   "-I", "iva", "-B", "bva", cfg])
+    assert got.exit_code == 0, got.output
+
+    tel = str(tmp_path / "tel.json")
+    fdm(["-s", store], "-n", "5", "--refine", "2", "--precision", "1e-3",
+        "--criterion", "residual", "-H", "hist", "--telemetry", tel)
+    main = Main(store)
+    arr, md = main.get("pot", True)
+    assert md["refine_geometry"] == "sandh"
+    assert md["patches"]
+    hist = main.get("hist")
+    records = [json.loads(line) for line in open(tel)]
+    assert len(records) == len(hist)
+    assert all([r["cells"] == arr.size for r in records])
+
+def test_options(tmp_path):
+    store = str(tmp_path / "st")
+    make_store(store)
+    for engine, option in (("numpy", ["--cycle", "V"]),
+                           ("numpy", ["--threads", "2"]),
+                           ("sor", ["--precond", "ilu"]),
+                           ("numba-fused", ["--tile-fraction", "0.1"]),
+                           ("numpy", ["--max-memory", "1G"])):
+        got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                       "-e", "fixed,periodic", "--engine", engine,
+                                       "-P", "pot", "-I", "inc"] + option)
+        assert got.exit_code != 0
+        assert f'option {option[0]} not supported by engine {engine}' in got.output
+    fdm(["-s", store], "--engine", "numpy-threads", "--threads", "1")
+    fdm(["-s", store], "--engine", "multigrid", "--cycle", "W", "--epoch", "2")
+
+def test_quiet(tmp_path, monkeypatch):
+    import json
+    import scipy.sparse
+    from pochoir import fdm_krylov
+    store = str(tmp_path / "st")
+    make_store(store)
+    args = ["-s", store, "fdm", "-i", "iva", "-b", "bva", "-e", "fixed,periodic",
+            "--epoch", "10", "-P", "pot", "-I", "inc"]
+
+    # the progress goes to stderr, out of the telemetry on stdout
+    got = CliRunner().invoke(cli, args + ["-n", "3", "--telemetry", "-"])
+    assert got.exit_code == 0, got.output
+    records = [json.loads(line) for line in got.stdout.splitlines()]
+    assert [r["epoch"] for r in records] == [0, 1, 2]
+    assert "epoch:" in got.stderr
+    assert "epoch:" not in fdm(["-s", store], "-n", "3", "--quiet")
+
+    # warnings are kept
+    laplacian = fdm_krylov.laplacian
+    def shifted(*args, **kwds):
+        A, rhs, mutable = laplacian(*args, **kwds)
+        return A - 1.5*scipy.sparse.identity(A.shape[0], format="csr"), rhs, mutable
+    monkeypatch.setattr(fdm_krylov, "laplacian", shifted)
+    text = fdm(["-s", store], "--engine", "krylov", "--precond", "none", "--quiet")
+    assert "breakdown" in text and "epoch:" not in text
+
+def test_graded(tmp_path, monkeypatch):
+    store = str(tmp_path / "st")
+    coords = numpy.cumsum(numpy.linspace(1, 2, 20))
+    make_store(store, GradedDomain((20,30), 1.0, axis=0, coords=coords))
+    got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                   "-e", "fixed,periodic", "--engine", "numba-fused",
+                                   "-P", "pot", "-I", "inc"])
+    assert got.exit_code != 0
+    assert 'graded spacing not supported by engine numba-fused' in got.output
+    got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                   "-e", "fixed,periodic", "--refine", "2",
+                                   "-P", "pot", "-I", "inc"])
+    assert got.exit_code != 0
+    assert 'refine does not support graded spacing' in got.output
+
+    monkeypatch.setenv("POCHOIR_CACHE", str(tmp_path / "engines.json"))
+    text = fdm(["-s", store], "--engine", "auto", "--quiet")
+    engine = text.split("automatic engine ")[1].split()[0]
+    assert "calibrate:" not in text and "epoch:" not in text
+    assert engine in ("numpy", "numpy-threads", "numpy-mp", "torch", "cupy")
+
+    # the ragged spacing and the mirror edges are not put to HDF5 attributes
+    store = str(tmp_path / "st.hdf")
+    make_store(store, GradedDomain((20,30), 1.0, axis=0, coords=coords))
+    got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                   "-e", "fixed,mirror", "-n", "2", "--epoch", "10",
+                                   "-P", "pot", "-I", "inc"])
+    assert got.exit_code == 0, got.output
+    main = Main(store, None)
+    arr, md = main.get("pot", True)
+    assert "spacing" not in md and "mirror" not in md
+    assert md["edges"] == "fixed,mirror"
+    main.close()
+
+def test_memmap(tmp_path):
+    store = str(tmp_path / "st")
+    make_store(store)
+    got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                   "-e", "fixed,periodic", "--engine", "memmap",
+                                   "-P", "pot", "-I", "inc"])
+    assert got.exit_code != 0
+    assert 'iva is read whole' in got.output
+
+    store = str(tmp_path / "st.hdf")
+    make_store(store)
+    fdm(["-s", store], "-n", "4")
+    want = potential(store)
+    got = CliRunner().invoke(cli, ["-s", store, "fdm", "-i", "iva", "-b", "bva",
+                                   "-e", "fixed,periodic", "--engine", "memmap",
+                                   "--warm-start", "pot", "-P", "pot2", "-I", "inc2"])
+    assert got.exit_code != 0
+    assert 'not supported by engine memmap' in got.output
+
+    fdm(["-s", store], "--engine", "memmap", "-n", "2", "--checkpoint", "ck",
+        pot="part")
+    text = fdm(["-s", store], "--engine", "memmap", "-n", "4", "--checkpoint", "ck",
+               "--resume", pot="pot1")
+    assert 'resume from ck after 2 epochs' in text
+    assert numpy.array_equal(potential(store, "pot1"), want)
@@ -12,3 +12,51 @@ def test_domain_creation():
         assert md == md2
 
 
+
+def test_graded_domain():
+    import numpy
+    from pochoir.domain import GradedDomain
+    coords = [0.0, 0.1, 0.2, 0.4, 0.8, 1.6]
+    dom = GradedDomain([4,6], [0.5, 1.0], [10.0, 0.0], 1, coords)
+    assert dom.origin[1] == 0.0
+    assert numpy.all(dom.linspaces[1] == coords)
+    assert numpy.all(dom.linspaces[0] == [10.0, 10.5, 11.0, 11.5])
+    assert numpy.all(dom.point((1, 3)) == [10.5, 0.4])
+    assert numpy.allclose(dom.point((0, 3.5)), [10.0, 0.6])
+    assert dom.index((11.0, 0.75)) == (2, 4)
+    assert numpy.all(dom.gaps[1] == numpy.diff(coords))
+    assert dom.gaps[0] == 0.5
+
+    # a linear field has exact gradient on the graded points
+    x, y = dom.meshgrid
+    grad = dom.gradient(2*x + 3*y)
+    assert numpy.allclose(grad[0], 2) and numpy.allclose(grad[1], 3)
+
+    with tempstore("test-domain") as s:
+        s.put("test-key", (), **dom.asdict)
+        arr, md = s.get("test-key", True)
+        assert md == dom.asdict
+
+
+def test_unfold():
+    import numpy
+    from pochoir.arrays import unfold
+    from pochoir.domain import GradedDomain
+    dom = Domain([3,4], [0.5, 1.0], [10.0, 0.0])
+    lo = dom.unfold(0)
+    assert numpy.allclose(lo.linspaces[0], [9.0, 9.5, 10.0, 10.5, 11.0])
+    hi = dom.unfold(1, high=True)
+    assert numpy.allclose(hi.linspaces[1], numpy.arange(7))
+
+    x, y = dom.meshgrid
+    arr = unfold(x + y, 0)
+    assert arr.shape == tuple(lo.shape)
+    assert numpy.allclose(arr, numpy.abs(lo.meshgrid[0] - 10) + 10 + lo.meshgrid[1])
+    anti = unfold(y, 1, high=True, sign=-1)
+    assert numpy.all(anti[:,4:] == -y[:,2::-1])
+    assert numpy.all(anti[:,3] == 0)
+
+    graded = GradedDomain([3,4], [0.5, 1.0], [10.0, 0.0], 1, [0.0, 0.1, 0.3, 0.7])
+    lo = graded.unfold(1)
+    assert numpy.allclose(lo.linspaces[1], [-0.7, -0.3, -0.1, 0.0, 0.1, 0.3, 0.7])
+    assert numpy.allclose(graded.unfold(0).linspaces[1], graded.coords)
@@ -1,7 +1,7 @@
 import numpy
 from pochoir import arrays
 from pochoir.fdm_numpy import solve
-from pochoir.fdm_generic import edge_condition
+from pochoir.fdm_generic import edge_condition, stencil, Convergence, Telemetry
 
 def test_edge():
     a = numpy.array(range(12)).reshape((3,4))
@@ -14,6 +14,31 @@ def test_edge():
     assert(a[:,0] == a[:,-2]).all()
     assert(a[:,1] == a[:,-1]).all()    
 
+def test_edge_first():
+    a = numpy.zeros((30,40))
+    a[2,:] = 1000
+    a[10:20,5] = 500
+    a[-3,:] = -1000
+    b = a != 0
+    a[0,:] = 300                # mutable cells on the edges
+    a[:,-1] = -200
+    edges = (False,True)
+
+    # the first step sees the edges and not the zero padding
+    c,e = solve(a, b, edges, 0, 1, 1)
+    p = arrays.pad1(a)
+    edge_condition(p, *edges)
+    want = stencil(p)
+    want[b] = a[b]
+    assert numpy.array_equal(c, want)
+
+    # so a split solve is the same as one
+    want,wante = solve(a, b, edges, 0, 10, 2)
+    c,e = solve(a, b, edges, 0, 10, 1)
+    c,e = solve(c, b, edges, 0, 10, 1)
+    assert numpy.array_equal(c, want)
+    assert numpy.array_equal(e, wante)
+
 def test_fdm():
     a = numpy.zeros((30,40))
     a[2,:] = 1000
@@ -49,3 +74,624 @@ def test_fdm():
         plt.colorbar()
         pdf.savefig()
 
+
+def caps_problem():
+    a = numpy.zeros((30,40))
+    a[2,:] = 1000
+    a[-3,:] = -1000
+    a[10:20,5] = 500
+    a[10:20,-6] = -500
+    b = a != 0
+    return a, b
+
+def test_multigrid():
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+    edges = (False,True)
+
+    c,e = solve_multigrid(a, b, edges, 1e-8, 1, 50)
+    assert c.shape == a.shape
+    assert (c[b] == a[b]).all()
+
+    # a converged solution is a fixed point of the Jacobi stencil
+    p = arrays.pad1(c)
+    edge_condition(p, *edges)
+    r = stencil(p) - c
+    assert numpy.max(numpy.abs(r[~b])) < 1e-6
+
+    for cycle_type in ("W", "FMG"):
+        c2,e2 = solve_multigrid(a, b, edges, 1e-8, 1, 50, cycle_type=cycle_type)
+        assert numpy.max(numpy.abs(c2-c)) < 1e-5
+
+def test_multigrid_thin():
+    '''
+    Thin electrodes move on coarse levels and must still converge.
+    '''
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a = numpy.zeros((512, 320))
+    a[:,2] = 1
+    a[236:276,106] = 1
+    b = a != 0
+    b[:,-3] = True
+    b[::7,160] = True
+    edges = (False,True)
+
+    c,e = solve_multigrid(a, b, edges, 1e-8, 1, 20)
+    assert numpy.max(numpy.abs(e)) < 1e-8
+
+    p = arrays.pad1(c)
+    edge_condition(p, *edges)
+    r = stencil(p) - c
+    assert numpy.max(numpy.abs(r[~b])) < 1e-7
+
+def test_sor():
+    from pochoir.fdm_sor import solve as solve_sor
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+    edges = (False,True)
+
+    want,_ = solve_multigrid(a, b, edges, 1e-8, 1, 50)
+    for omega in (None, 1.5):
+        c,e = solve_sor(a, b, edges, 1e-8, 50, 100, omega=omega)
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(c-want)) < 1e-5
+
+def test_krylov():
+    from pochoir.fdm_krylov import solve as solve_krylov
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+
+    for edges in ((False,True), (False,False)):
+        want,_ = solve_multigrid(a, b, edges, 1e-8, 1, 50)
+        for precond in ("amg", "ilu", "jacobi"):
+            c,e = solve_krylov(a, b, edges, 1e-8, 10, 50, precond=precond)
+            assert (c[b] == a[b]).all()
+            assert numpy.max(numpy.abs(c-want)) < 1e-5
+
+def test_krylov_stop(monkeypatch, caplog):
+    import logging
+    import scipy.sparse
+    from pochoir import fdm_krylov
+    a, b = caps_problem()
+    edges = (False,True)
+
+    caplog.set_level(logging.INFO, logger="pochoir")
+    c,e = fdm_krylov.solve(numpy.zeros_like(a), b, edges, 0, 10, 5)
+    assert 'reach exact solution' in caplog.text
+    assert (c == 0).all() and (e == 0).all()
+
+    # an indefinite operator breaks down after some steps
+    laplacian = fdm_krylov.laplacian
+    def shifted(*args, **kwds):
+        A, rhs, mutable = laplacian(*args, **kwds)
+        return A - 1.5*scipy.sparse.identity(A.shape[0], format="csr"), rhs, mutable
+    monkeypatch.setattr(fdm_krylov, "laplacian", shifted)
+    caplog.clear()
+    c,e = fdm_krylov.solve(a, b, edges, 0, 10, 5, precond="none")
+    warned = [r.message for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warned) == 1 and 'breakdown' in warned[0]
+    assert 'exact' not in caplog.text
+    assert (e[b] == 0).all()
+    assert numpy.max(numpy.abs(e)) > 0
+
+def test_spectral():
+    from pochoir.fdm_spectral import solve as solve_spectral
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+
+    for edges in ((False,True), (True,False), (False,False)):
+        want,_ = solve_multigrid(a, b, edges, 1e-10, 1, 50)
+        c,e = solve_spectral(a, b, edges, 1e-10, 10, 50)
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(c-want)) < 1e-8
+
+    a3 = numpy.zeros((12,14,16))
+    a3[2,:,:] = 1
+    b3 = a3 != 0
+    b3[-3,:,:] = True
+    c,e = solve_spectral(a3, b3, (False,True,True), 1e-10, 10, 20)
+    assert numpy.max(numpy.abs(c[2:-2] - numpy.linspace(1,0,8)[:,None,None])) < 1e-8
+
+def test_spectral_stop(monkeypatch, caplog):
+    import logging
+    from pochoir import fdm_spectral
+    a, b = caps_problem()
+    edges = (False,True)
+
+    caplog.set_level(logging.INFO, logger="pochoir")
+    c,e = fdm_spectral.solve(numpy.zeros_like(a), b, edges, 0, 10, 5)
+    assert 'reach exact solution' in caplog.text
+    assert (c == 0).all() and (e == 0).all()
+
+    # a Green function turning positive breaks down after some steps
+    green = fdm_spectral.BoxSolver.__call__
+    calls = []
+    def flipped(self, source):
+        calls.append(None)
+        sign = 1 if len(calls) < 4 else -1
+        return sign*green(self, source)
+    monkeypatch.setattr(fdm_spectral.BoxSolver, "__call__", flipped)
+    caplog.clear()
+    c,e = fdm_spectral.solve(a, b, edges, 0, 10, 5)
+    warned = [r.message for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warned) == 1 and 'breakdown' in warned[0]
+    assert 'exact' not in caplog.text
+    assert len(calls) == 4
+    assert (c[b] == a[b]).all()
+    assert (e[b] == 0).all()
+    assert numpy.max(numpy.abs(e)) > 0
+
+def test_numba_fused():
+    from pochoir.fdm_numba_fused import solve as solve_fused
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+
+    for edges in ((False,True), (True,False)):
+        want,_ = solve_multigrid(a, b, edges, 1e-10, 1, 50)
+        c,e = solve_fused(a, b, edges, 1e-9, 1000, 20)
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(c-want)) < 1e-5
+
+    a3 = numpy.zeros((12,14,16))
+    a3[2,:,:] = 1
+    b3 = a3 != 0
+    b3[-3,:,:] = True
+    c,e = solve_fused(a3, b3, (False,True,True), 1e-9, 100, 20)
+    assert numpy.max(numpy.abs(c[2:-2] - numpy.linspace(1,0,8)[:,None,None])) < 1e-6
+
+def test_numba_threads(monkeypatch):
+    import numba
+    from pochoir.fdm_numba_fused import solve as solve_fused
+    a, b = caps_problem()
+    previous = numba.get_num_threads()
+    calls = list()
+    monkeypatch.setattr(numba, "set_num_threads", calls.append)
+    solve_fused(a, b, (False,True), 0, 10, 1, threads=1)
+    assert calls == [1, previous]
+
+    from pochoir.fdm_numba_blocked import solve as solve_blocked
+    calls.clear()
+    solve_blocked(a, b, (False,True), 0, 10, 1, threads=1)
+    assert calls == [1, previous]
+
+def test_chebyshev():
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+
+    for edges in ((False,True), (True,False)):
+        want,_ = solve_multigrid(a, b, edges, 1e-10, 1, 50)
+        c,e = solve(a, b, edges, 1e-9, 20, 200, accelerate="chebyshev")
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(e)) < 1e-9
+        assert numpy.max(numpy.abs(c-want)) < 1e-6
+
+def test_numba_tiled():
+    from pochoir.fdm_numba_tiled import solve as solve_tiled
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+
+    for edges in ((False,True), (True,False)):
+        want,_ = solve_multigrid(a, b, edges, 1e-10, 1, 50)
+        c,e = solve_tiled(a, b, edges, 1e-9, 1000, 20, tile=8)
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(c-want)) < 1e-5
+
+    a3 = numpy.zeros((12,14,16))
+    a3[2,:,:] = 1
+    b3 = a3 != 0
+    b3[-3,:,:] = True
+    c,e = solve_tiled(a3, b3, (False,True,True), 1e-9, 100, 20, tile=5)
+    assert numpy.max(numpy.abs(c[2:-2] - numpy.linspace(1,0,8)[:,None,None])) < 1e-6
+
+def test_numba_tiled_skip(caplog):
+    import re
+    import logging
+    from pochoir.fdm_numba_tiled import solve as solve_tiled
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    # start from the solution except near a small electrode so the
+    # far field is converged and its tiles go inactive until woken
+    a = numpy.zeros((64,64))
+    a[:] = numpy.linspace(1,0,64)[:,None]
+    b = numpy.zeros((64,64), dtype=bool)
+    b[0] = b[-1] = True
+    b[30:34,30:34] = True
+    a[30:34,30:34] += 0.01
+    edges = (False,True)
+
+    want,_ = solve_multigrid(a, b, edges, 1e-12, 1, 50)
+    full,_ = solve_tiled(a, b, edges, 1e-9, 10, 2000, tile=8, fraction=0)
+    caplog.set_level(logging.INFO, logger="pochoir")
+    c,e = solve_tiled(a, b, edges, 1e-9, 10, 2000, tile=8)
+    out = caplog.text
+    fracs = [float(f) for f in re.findall(r'([0-9.]+) of tiles updated', out)]
+    assert fracs[0] == 1.0
+    assert min(fracs) < 0.5
+    assert fracs[-1] == 1.0     # woken as the change spreads
+    assert 'fdm reach max precision' in out
+    assert (c[b] == a[b]).all()
+    assert numpy.max(numpy.abs(c-want)) < 1e-5
+    assert numpy.max(numpy.abs(c-full)) < 1e-7
+
+def test_numpy_mp():
+    from pochoir.fdm_numpy_mp import solve as solve_mp
+    a, b = caps_problem()
+    a = a.astype('f4')
+
+    for edges in ((False,True), (True,False)):
+        want,wante = solve(a, b, edges, 0, 10, 3)
+        for procs in (1, 3):
+            c,e = solve_mp(a, b, edges, 0, 10, 3, procs=procs)
+            assert c.dtype == want.dtype
+            assert (c == want).all()
+            assert (e == wante).all()
+
+def test_dtype():
+    from pochoir.fdm_numpy import solve_mixed
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    a, b = caps_problem()
+    edges = (False,True)
+
+    p = arrays.pad1(a.astype('f4'))
+    assert stencil(p).dtype == p.dtype
+
+    c,e = solve(a.astype('f4'), b, edges, 0, 10, 1)
+    assert c.dtype == numpy.float32
+
+    want,_ = solve_multigrid(a, b, edges, 1e-10, 1, 50)
+    c,e = solve_mixed(a.astype('f4'), b, edges, 1e-7, 100, 100)
+    assert c.dtype == numpy.float64
+    assert (c[b] == a[b]).all()
+    # well beyond float32 resolution of values near 1000
+    assert numpy.max(numpy.abs(c-want)) < 1e-5
+
+    import tracemalloc
+    peak = dict()
+    for name, func, arr in (("f8", solve, a), ("mixed", solve_mixed, a.astype('f4'))):
+        tracemalloc.start()
+        func(arr, b, edges, 0, 10, 2)
+        peak[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    assert peak["mixed"] < 0.75*peak["f8"]
+
+def test_convergence():
+    a, b = caps_problem()
+    edges = (False,True)
+
+    conv = Convergence(a, b, edges, "relative")
+    c,e = solve(a, b, edges, 1e-3, 100, 50, convergence=conv)
+    hist = conv.array
+    assert hist.shape[1] == 3
+    assert hist[-1,2] < 1e-3
+    assert numpy.all(hist[:-1,2] >= 1e-3)
+    assert numpy.isclose(hist[-1,0], numpy.max(numpy.abs(e)))
+
+    # the residual is that left by a Jacobi step
+    p = arrays.pad1(c)
+    edge_condition(p, *edges)
+    r = (stencil(p) - c)[~b]
+    assert numpy.isclose(hist[-1,1], numpy.sqrt(numpy.mean(r*r)))
+
+def test_telemetry():
+    import io
+    import json
+    from pochoir.fdm_memmap import solve as solve_memmap
+    a, b = caps_problem()
+    edges = (False,True)
+
+    conv = Convergence(a, b, edges, "residual")
+    stream = io.StringIO()
+    tel = Telemetry(100, conv, stream)
+    c,e = solve(a, b, edges, 1e-4, 100, 50, convergence=tel)
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records == tel.records
+    assert len(records) == len(conv.history)
+    assert [r["epoch"] for r in records] == list(range(len(records)))
+    assert records[-1]["value"] == conv.history[-1][1] < 1e-4
+    assert numpy.isclose(records[-1]["max_increment"], numpy.max(numpy.abs(e)))
+    assert numpy.isclose(records[-1]["rms_increment"], numpy.sqrt(numpy.mean(e*e)))
+    assert all([r["rate"] > 0 and r["resident"] > 0 for r in records])
+    summary = tel.summary
+    assert summary["epochs"] == len(records)
+    assert summary["max_increment"] == records[-1]["max_increment"]
+
+    tel = Telemetry(10)
+    c,e = solve_memmap(a, b, edges, 0, 10, 3, convergence=tel)
+    assert len(tel.records) == 3
+    assert tel.records[-1]["value"] == numpy.max(numpy.abs(e))
+
+    # the rate counts only the mutable cells
+    mutable = int(numpy.count_nonzero(~b))
+    tel = Telemetry(10, mutable=mutable)
+    c,e = solve(a, b, edges, 0, 10, 2, convergence=tel)
+    for r in tel.records:
+        assert numpy.isclose(r["rate"], 10*mutable/r["seconds"])
+
+def test_batch():
+    from pochoir.fdm_numpy import solve_batch
+    a, b = caps_problem()
+    edges = (False,True)
+
+    iarrs = [a, -a, numpy.where(b, a, 7.0)]
+    cs,es = solve_batch(iarrs, b, edges, 0, 20, 3)
+    assert cs.shape == (3,) + a.shape
+    for iarr, c, e in zip(iarrs, cs, es):
+        want,wante = solve(iarr, b, edges, 0, 20, 3)
+        assert (c == want).all()
+        assert (e == wante).all()
+
+def test_spacing():
+    from pochoir.fdm_krylov import solve as solve_krylov
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    from pochoir.fdm_numba import solve as solve_numba
+    from pochoir.fdm_numba_fused import solve as solve_fused
+    from pochoir.fdm_numba_tiled import solve as solve_tiled
+    from pochoir.fdm_sor import solve as solve_sor
+    from pochoir.fdm_spectral import solve as solve_spectral
+    a, b = caps_problem()
+    edges = (False,True)
+    spacing = [1.0, 3.0]
+
+    want,_ = solve_krylov(a, b, edges, 1e-10, 10, 50, spacing=spacing)
+    iso,_ = solve_krylov(a, b, edges, 1e-10, 10, 50)
+    assert numpy.max(numpy.abs(want-iso)) > 1e-2
+
+    # the weighted neighbors of one Jacobi step vanish at the solution
+    pad = arrays.pad1(want)
+    edge_condition(pad, *edges)
+    res = stencil(pad, spacing=spacing) - want
+    assert numpy.max(numpy.abs(res[~b])) < 1e-8
+
+    got = [
+        solve(a, b, edges, 1e-10, 100, 100, spacing=spacing)[0],
+        solve(a, b, edges, 1e-10, 20, 100, spacing=spacing,
+              accelerate="chebyshev")[0],
+        solve_numba(a, b, edges, 1e-10, 100, 100, spacing=spacing)[0],
+        solve_fused(a, b, edges, 1e-10, 100, 100, spacing=spacing)[0],
+        solve_tiled(a, b, edges, 1e-10, 100, 100, tile=8, spacing=spacing)[0],
+        solve_sor(a, b, edges, 1e-10, 20, 100, spacing=spacing)[0],
+        solve_multigrid(a, b, edges, 1e-10, 1, 50, spacing=spacing)[0],
+        solve_spectral(a, b, edges, 1e-10, 10, 50, spacing=spacing)[0],
+    ]
+    for c in got:
+        assert (c[b] == a[b]).all()
+        assert numpy.max(numpy.abs(c-want)) < 1e-6
+
+def test_graded():
+    from pochoir.fdm_krylov import solve as solve_krylov
+    from pochoir.fdm_numpy_mp import solve as solve_mp
+    coords = numpy.cumsum(numpy.linspace(0.1, 2.0, 20))
+    spacing = [1.0, numpy.diff(coords)]
+    a = numpy.zeros((6, 20))
+    a[:,0] = 1
+    b = numpy.zeros_like(a, dtype=bool)
+    b[:,0] = b[:,-1] = True
+    edges = (True, False)
+
+    # the potential between two planes is linear in the coordinate
+    want = 1 - (coords - coords[0])/(coords[-1] - coords[0])
+    for c in [
+            solve(a, b, edges, 1e-12, 1000, 100, spacing=spacing)[0],
+            solve_mp(a, b, edges, 1e-12, 1000, 100, procs=2, spacing=spacing)[0],
+            solve_krylov(a, b, edges, 1e-12, 10, 10, spacing=spacing)[0]]:
+        assert numpy.max(numpy.abs(c - want[None,:])) < 1e-8
+
+    # and not in the index as without grading
+    c,e = solve(a, b, edges, 1e-12, 1000, 100)
+    assert numpy.max(numpy.abs(c - want[None,:])) > 1e-2
+
+def test_patch():
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    from pochoir.patch import solve as solve_patch, Patch, Composite
+    from pochoir.domain import Domain
+    a = numpy.zeros((40, 60))
+    b = numpy.zeros_like(a, dtype=bool)
+    a[:,1] = 1
+    b[:,1] = b[:,-2] = True
+    b[18:23, 29:32] = True
+    a[18:23, 29:32] = 0.7
+    edges = (True, False)
+    dom = Domain(a.shape, 1.0)
+
+    c, e, patches = solve_patch(a, b, edges, 1e-8, 1, 50, solve_multigrid, ratio=4)
+    assert len(patches) == 3
+    assert (c[b] == a[b]).all()
+    got = Composite(dom, c, [(p.domain(dom), pc) for p, pc, _ in patches])
+
+    # compare with the whole domain refined
+    whole = Patch((slice(0, 40), slice(0, 60)), 4, a.shape, edges)
+    fine = solve_multigrid(whole.nearest(a), whole.nearest(b), whole.periodic,
+                           1e-10, 1, 50)[0]
+    want = Composite(whole.domain(dom), fine)
+    coarse = Composite(dom, solve_multigrid(a, b, edges, 1e-10, 1, 50)[0])
+
+    pts = numpy.stack(numpy.meshgrid(numpy.linspace(5, 35, 61),
+                                     numpy.linspace(3, 56, 107),
+                                     indexing='ij'), axis=-1)
+    assert got(pts).shape == pts.shape[:-1]
+    patched = numpy.max(numpy.abs(got(pts) - want(pts)))
+    unpatched = numpy.max(numpy.abs(coarse(pts) - want(pts)))
+    assert patched < 0.1*unpatched
+
+    # electrodes of patches from a fine geometry, convergence on the
+    # coarse solves only
+    from pochoir.patch import refined_shape
+    ga, gb = whole.nearest(a), whole.nearest(b)
+    assert ga.shape == refined_shape(a.shape, 4, edges)
+    gb[18*4-3, 29*4:31*4+1] = True      # nearer a mutable coarse point
+    ga[18*4-3, 29*4:31*4+1] = 0.7
+    conv = Convergence(a, b, edges, "residual")
+    c, e, patches = solve_patch(a, b, edges, 1e-8, 1, 50, solve_multigrid,
+                                ratio=4, geometry=(ga, gb), convergence=conv)
+    assert conv.history
+    nfixed = 0
+    for p, pc, _ in patches:
+        fixed = p.crop(gb)
+        assert (pc[fixed] == p.crop(ga)[fixed]).all()
+        nfixed += numpy.count_nonzero(fixed & ~p.nearest(b))
+    assert nfixed == 9
+
+    import pytest
+    with pytest.raises(ValueError):
+        solve_patch(a, b, edges, 1e-8, 1, 5, solve_multigrid,
+                    spacing=[numpy.linspace(1, 2, a.shape[0]-1), 1.0])
+
+def test_mirror():
+    from pochoir.fdm_numba import solve as solve_numba
+    from pochoir.fdm_numba_fused import solve as solve_fused
+    from pochoir.fdm_numba_tiled import solve as solve_tiled
+    from pochoir.fdm_numpy_mp import solve as solve_mp
+    from pochoir.fdm_sor import solve as solve_sor
+    from pochoir.fdm_krylov import solve as solve_krylov
+    from pochoir.fdm_multigrid import solve as solve_multigrid
+    from pochoir.fdm_generic import residual
+
+    # periodic strips symmetric about rows 0 and 20
+    a = numpy.zeros((40, 16))
+    b = numpy.zeros_like(a, dtype=bool)
+    a[:,1] = 1
+    b[:,1] = b[:,-2] = True
+    for row in (38, 39, 0, 1, 2):
+        b[row, 8] = True
+        a[row, 8] = 0.5
+    full = solve_multigrid(a, b, (True, False), 1e-12, 1, 50)[0]
+    want = arrays.unfold(full[:21], 0)
+
+    # the half between the symmetry planes
+    a, b = a[:21], b[:21]
+    edges = (False, False)
+    mirror = (True, False)
+    for c in [
+            solve(a, b, edges, 1e-10, 100, 200, mirror=mirror)[0],
+            solve(a, b, edges, 1e-10, 20, 200, accelerate="chebyshev",
+                  mirror=mirror)[0],
+            solve_numba(a, b, edges, 1e-10, 100, 200, mirror=mirror)[0],
+            solve_fused(a, b, edges, 1e-10, 100, 200, mirror=mirror)[0],
+            solve_tiled(a, b, edges, 1e-10, 100, 200, tile=8, mirror=mirror)[0],
+            solve_mp(a, b, edges, 1e-10, 100, 200, procs=2, mirror=mirror)[0],
+            solve_sor(a, b, edges, 1e-10, 20, 100, mirror=mirror)[0],
+            solve_krylov(a, b, edges, 1e-10, 10, 20, mirror=mirror)[0]]:
+        assert (c[b] == a[b]).all()
+        assert residual(c, b, edges, mirror=mirror) < 1e-9
+        assert numpy.max(numpy.abs(arrays.unfold(c, 0) - want)) < 1e-7
+
+    # fixed edges put the symmetry plane half a cell off
+    c,e = solve(a, b, edges, 1e-10, 100, 200)
+    assert numpy.max(numpy.abs(arrays.unfold(c, 0) - want)) > 1e-4
+
+def test_torch_conv():
+    import pytest
+    pytest.importorskip("torch")
+    from pochoir.fdm_torch_conv import solve as solve_conv
+    a = numpy.zeros((30,40))
+    a[2,:] = 1
+    a[10:20,5] = 0.5
+    b = a != 0
+    b[-3,:] = True
+    for edges, mirror in [((False, True), None), ((False, False), (True, False))]:
+        want,_ = solve(a, b, edges, 0, 100, 3, mirror=mirror)
+        for compiled in (False, True):
+            got,_ = solve_conv(a, b, edges, 0, 100, 3, mirror=mirror,
+                               compiled=compiled)
+            assert numpy.max(numpy.abs(got - want)) < 1e-10
+
+    a3 = numpy.zeros((12,14,16))
+    a3[:,:,2] = 1
+    a3[4:8,5:9,7] = 0.5
+    b3 = a3 != 0
+    edges = (True, False, False)
+    mirror = (False, True, False)
+    want,wante = solve(a3, b3, edges, 0, 7, 2, mirror=mirror)
+    got,gote = solve_conv(a3, b3, edges, 0, 7, 2, mirror=mirror, compiled=False)
+    assert numpy.max(numpy.abs(got - want)) < 1e-10
+    assert numpy.max(numpy.abs(gote - wante)) < 1e-10
+
+    # the thread count is restored
+    import torch
+    previous = torch.get_num_threads()
+    solve_conv(a, b, (False, True), 0, 10, 1, threads=previous+1, compiled=False)
+    assert torch.get_num_threads() == previous
+
+def test_numpy_threads():
+    from pochoir.fdm_numpy import solve_batch
+    from pochoir.fdm_numpy_threads import solve as solve_threads
+    from pochoir.fdm_numpy_threads import solve_batch as solve_threads_batch
+    a = numpy.zeros((30,40))
+    a[2,:] = 1
+    a[10:20,5] = 0.5
+    b = a != 0
+    b[-3,:] = True
+    coords = numpy.cumsum(numpy.linspace(0.5, 2.0, 29))
+    for spacing in (None, [1.0, 2.0], [coords, 1.0]):
+        want,_ = solve(a, b, (False,True), 0, 50, 2, spacing=spacing)
+        got,_ = solve_threads(a, b, (False,True), 0, 50, 2, threads=3,
+                              spacing=spacing)
+        assert numpy.array_equal(got, want)
+
+    want,_ = solve_batch([a, 2*a], b, (False,True), 0, 50, 2)
+    got,_ = solve_threads_batch([a, 2*a], b, (False,True), 0, 50, 2, threads=3)
+    assert numpy.array_equal(got, want)
+
+def test_numba_blocked(monkeypatch):
+    from pochoir.fdm_numba_fused import solve as solve_fused
+    from pochoir import fdm_numba_blocked
+    from pochoir.fdm_numba_blocked import solve as solve_blocked
+    a, b = caps_problem()
+
+    # with no cache budget the last axis has tiles of the tile size
+    for cache in (fdm_numba_blocked.cache, 0):
+        monkeypatch.setattr(fdm_numba_blocked, "cache", cache)
+        for edges, mirror in (((False,True), None), ((True,False), None),
+                              ((False,False), (True,False)), ((False,False), (False,True))):
+            want,wante = solve_fused(a, b, edges, 0, 10, 3, mirror=mirror)
+            c,e = solve_blocked(a, b, edges, 0, 10, 3, time_block=3, tile=8,
+                                mirror=mirror)
+            assert numpy.array_equal(c, want)
+            assert numpy.array_equal(e, wante)
+
+        a3 = numpy.zeros((12,14,16))
+        a3[2,:,:] = 1
+        b3 = a3 != 0
+        b3[-3,:,:] = True
+        for mirror in (None, (False,True,False)):
+            want,_ = solve_fused(a3, b3, (False,False,True), 0, 7, 2, mirror=mirror)
+            c,e = solve_blocked(a3, b3, (False,False,True), 0, 7, 2, time_block=3,
+                                tile=5, mirror=mirror)
+            assert numpy.array_equal(c, want)
+
+def test_memmap():
+    from pochoir.fdm_memmap import solve as solve_memmap, parse_size
+    assert parse_size("4G") == 4*1024**3
+    a, b = caps_problem()
+
+    for edges, mirror in (((False,True), None), ((True,False), None),
+                          ((True,False), (False,True))):
+        want,wante = solve(a, b, edges, 0, 10, 3, mirror=mirror)
+        for time_block in (1, 3, 20):
+            c,e = solve_memmap(a, b, edges, 0, 10, 3, time_block=time_block,
+                               mirror=mirror)
+            assert numpy.array_equal(c, want)
+            assert numpy.array_equal(e, wante)
+
+    a3 = numpy.zeros((12,14,16))
+    a3[:,:,2] = 1
+    a3[4:8,5:9,7] = 0.5
+    b3 = a3 != 0
+    b3[:,:,-3] = True
+    spacing = [1.0, 2.0, numpy.linspace(0.5, 1.5, 15).tolist()]
+    want,_ = solve(a3, b3, (True,False,False), 0, 7, 2, spacing=spacing)
+    c,e = solve_memmap(a3, b3, (True,False,False), 0, 7, 2, spacing=spacing,
+                       max_memory=20000)
+    assert numpy.array_equal(c, want)
+
+    # the planes in memory are within the footprint, up to bookkeeping
+    import tracemalloc
+    from pochoir.fdm_memmap import footprint
+    a = numpy.zeros((10,200,100))
+    a[2] = 1
+    b = a != 0
+    for spacing in (None, [1.0, 2.0, 1.0]):
+        tracemalloc.start()
+        solve_memmap(a, b, (False,True,False), 0, 4, 2, time_block=4, spacing=spacing)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak <= footprint((200,100), a.dtype, 4) + 2**16
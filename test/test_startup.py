@@ -0,0 +1,31 @@
+import sys
+import time
+import subprocess
+
+heavy = ("matplotlib", "scipy", "torch", "numba", "cupy", "h5py", "pyevtk")
+
+def python(code):
+    start = time.perf_counter()
+    got = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True)
+    return got.stdout, time.perf_counter() - start
+
+def test_import():
+    out, seconds = python(f'''
+import sys
+import pochoir, pochoir.fdm, pochoir.drift, pochoir.main
+print(",".join([m for m in {heavy!r} if m in sys.modules]))
+''')
+    print(f'import pochoir: {seconds:.3f} s')
+    assert out.strip() == ""
+
+def test_cli():
+    python("import pochoir.__main__")  # warm the bytecode cache
+    seconds = min([python('''
+import sys
+from pochoir.__main__ import cli
+sys.argv = ["pochoir", "version"]
+cli(obj=None, standalone_mode=False)
+''')[1] for _ in range(3)])
+    print(f'pochoir version: {seconds:.3f} s')
+    assert seconds < 2.0